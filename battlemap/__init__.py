@@ -1,5 +1,11 @@
+from .profiling import disable_tracing, enable_tracing, get_tracer, profile_render
+from .render.quality import RenderQuality
 from .render.sprite import SpriteRenderer
 from .types.battle_map import BattleMap
 from .types.token import Token, TokenId, OwnerId
+from .types.occupancy import TokenOccupancyIndex
+from .types.token_registry import TokenRegistry
+from .types.vision import VisionEngine
+from .sprites.animated_sprite import AnimatedSprite, load_animation
 from .sprites.map_tile import MapTileSprite
 from .sprites.token_tile import TokenSize
\ No newline at end of file
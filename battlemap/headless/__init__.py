@@ -0,0 +1,3 @@
+from .batch import SceneResult, iter_render_batch, render_batch, render_scene_file
+from .description import SceneDescription, TextureSource, build_scene, load_scene_description, render_description, scale_output
+from .server import RenderQueueFullError, RenderServer
@@ -0,0 +1,181 @@
+"""
+Модуль реализует пакетный рендеринг описаний сцен в пуле процессов.
+
+Каждый процесс пула держит свой `TextureSource`, поэтому общие для сцен изображения
+(тайлы, токены, фоны) декодируются в нем один раз. Готовые изображения сохраняет
+сам процесс-исполнитель, а вызывающему возвращается только `SceneResult` с путями
+и временем этапов - результаты выдаются по мере готовности, без накопления в памяти.
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from .description import TextureSource, load_scene_description, render_description
+
+# Загрузчик текстур процесса-исполнителя (создается инициализатором пула или при первом вызове)
+_worker_textures: Optional[TextureSource] = None
+
+
+class SceneResult:
+    """
+    Результат рендера одной сцены.
+
+    Атрибуты:
+        source (str): Путь к файлу описания.
+        output (Optional[str]): Путь сохраненного изображения (None при ошибке).
+        timings (Dict[str, float]): Время этапов в секундах: "load", "render", "save".
+        size (Optional[tuple]): Размер сохраненного изображения.
+        error (Optional[str]): Текст ошибки, если рендер не удался.
+    """
+
+    def __init__(self, source: str, output: Optional[str] = None, timings: Optional[Dict[str, float]] = None,
+                 size: Optional[tuple] = None, error: Optional[str] = None):
+        self.source: str = source
+        self.output: Optional[str] = output
+        self.timings: Dict[str, float] = timings or {}
+        self.size: Optional[tuple] = size
+        self.error: Optional[str] = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.timings.values())
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "source": self.source, "output": self.output, "ok": self.ok,
+            "timings": {k: round(v, 6) for k, v in self.timings.items()},
+            "total": round(self.total_time, 6), "size": list(self.size) if self.size else None,
+            "error": self.error,
+            }
+
+    def __repr__(self) -> str:
+        status = "ok" if self.ok else f"error={self.error!r}"
+        return f"<SceneResult(source='{self.source}', {status}, total={self.total_time:.3f}s)>"
+
+
+def _init_worker(max_cached_images: int):
+    global _worker_textures
+    _worker_textures = TextureSource(max_cached_images)
+
+
+def _output_subdir(source: str, input_root: Optional[str]) -> str:
+    """Каталог описания относительно корня входных файлов (для описаний вне корня - его полный путь)."""
+    directory = os.path.dirname(os.path.abspath(source))
+    root = os.path.abspath(input_root if input_root is not None else os.getcwd())
+    try:
+        relative = os.path.relpath(directory, root)
+    except ValueError:  # Windows: другой диск
+        relative = os.pardir
+    if relative == os.curdir:
+        return ""
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        relative = os.path.splitdrive(directory)[1].lstrip("\\/")
+    return relative
+
+
+def render_scene_file(source: str, output_dir: Optional[str] = None, max_cached_images: int = 256,
+                      input_root: Optional[str] = None) -> SceneResult:
+    """
+    Рендерит одну сцену из файла описания и сохраняет результат (атомарно, через уникальный
+    временный файл в каталоге результата). Ошибки не выбрасываются, а возвращаются в `SceneResult.error`.
+
+    Если задан output_dir, результат кладется в output_dir с сохранением каталога описания
+    относительно input_root (по умолчанию - текущего каталога): a/scene.json и b/scene.json
+    дают output_dir/a/scene.png и output_dir/b/scene.png.
+    """
+    global _worker_textures
+    if _worker_textures is None:
+        _worker_textures = TextureSource(max_cached_images)
+    timings: Dict[str, float] = {}
+    output: Optional[str] = None
+    try:
+        started = time.perf_counter()
+        description = load_scene_description(source)
+        output = description.output_path(output_dir, _output_subdir(source, input_root))
+        timings["load"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        image = render_description(description, _worker_textures)
+        timings["render"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        output_format = description.output_format
+        if output_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(output)}.", suffix=".tmp", dir=directory or ".")
+        os.close(fd)
+        try:
+            image.save(tmp_path, format=output_format)
+            os.replace(tmp_path, output)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        timings["save"] = time.perf_counter() - started
+        return SceneResult(source, output, timings, image.size)
+    except Exception as e:  # Одна некорректная сцена не должна останавливать пакет
+        return SceneResult(source, None, timings, error=f"{type(e).__name__}: {e}")
+
+
+def iter_render_batch(
+        sources: Iterable[str],
+        output_dir: Optional[str] = None,
+        workers: Optional[int] = None,
+        max_cached_images: int = 256,
+        max_in_flight: Optional[int] = None,
+        input_root: Optional[str] = None
+        ) -> Iterator[SceneResult]:
+    """
+    Рендерит сцены в пуле процессов и выдает результаты по мере готовности (порядок не сохраняется).
+
+    Args:
+        sources (Iterable[str]): Пути к файлам описаний (читаются лениво).
+        output_dir (Optional[str], optional): Каталог для результатов вместо "output.path" описаний.
+        workers (Optional[int], optional): Число процессов; 1 - рендер в текущем процессе.
+                                           По умолчанию os.cpu_count().
+        max_cached_images (int, optional): Размер кэша декодированных изображений в каждом процессе.
+        max_in_flight (Optional[int], optional): Максимум одновременно отправленных в пул сцен.
+                                                 По умолчанию 4 на процесс.
+        input_root (Optional[str], optional): Корень входных файлов: с output_dir результаты сохраняют
+                                              каталоги описаний относительно него. По умолчанию текущий каталог.
+
+    Raises:
+        ValueError: Если workers не положительный.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("Число процессов должно быть положительным.")
+    if workers == 1:
+        for source in sources:
+            yield render_scene_file(source, output_dir, max_cached_images, input_root)
+        return
+
+    limit = max_in_flight or workers * 4
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(max_cached_images,)) as pool:
+        pending: Set[Future] = set()
+        for source in sources:
+            pending.add(pool.submit(render_scene_file, source, output_dir, max_cached_images, input_root))
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def render_batch(sources: Iterable[str], output_dir: Optional[str] = None, workers: Optional[int] = None,
+                 max_cached_images: int = 256, max_in_flight: Optional[int] = None,
+                 input_root: Optional[str] = None) -> List[SceneResult]:
+    """Рендерит все сцены (см. `iter_render_batch`) и возвращает список результатов."""
+    return list(iter_render_batch(sources, output_dir, workers, max_cached_images, max_in_flight, input_root))
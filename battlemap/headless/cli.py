@@ -0,0 +1,93 @@
+"""
+Командная строка пакетного рендеринга без GUI:
+
+    python -m battlemap.headless scenes/*.json -o previews -j 8 --report report.jsonl
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import Iterator, List, Optional, Sequence
+
+from .batch import iter_render_batch
+
+SCENE_EXTENSIONS = (".json", ".toml")
+
+
+def _expand_sources(patterns: Sequence[str]) -> Iterator[str]:
+    """Раскрывает шаблоны и каталоги (в каталоге берутся все .json/.toml, рекурсивно)."""
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for name in sorted(files):
+                    if name.lower().endswith(SCENE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            yield from matches if matches else [pattern]
+
+
+def _input_root(patterns: Sequence[str]) -> str:
+    """Общий каталог входных шаблонов: от него отсчитываются подкаталоги результатов в --output-dir."""
+    bases = []
+    for pattern in patterns:
+        base = pattern
+        while glob.has_magic(base):
+            base = os.path.dirname(base)
+        if base == pattern and not os.path.isdir(pattern):
+            base = os.path.dirname(pattern)
+        bases.append(os.path.abspath(base or os.curdir))
+    try:
+        return os.path.commonpath(bases)
+    except ValueError:  # Windows: шаблоны на разных дисках
+        return os.getcwd()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+            prog="python -m battlemap.headless",
+            description="Пакетный рендер описаний сцен (JSON/TOML) в изображения без GUI."
+            )
+    parser.add_argument("scenes", nargs="+", help="Файлы описаний, шаблоны или каталоги.")
+    parser.add_argument("-o", "--output-dir",
+                        help="Каталог результатов (вместо output.path описаний); подкаталоги входных "
+                             "описаний сохраняются.")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Число процессов (по умолчанию - число CPU; 1 - без пула).")
+    parser.add_argument("--cache-images", type=int, default=256,
+                        help="Размер кэша декодированных изображений в каждом процессе.")
+    parser.add_argument("--report", help="Файл отчета JSON Lines (по строке на сцену).")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Не печатать строку на каждую сцену.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа CLI. Возвращает код выхода: 0 - все сцены отрисованы, 1 - были ошибки."""
+    args = build_parser().parse_args(argv)
+    started = time.perf_counter()
+    rendered = failed = 0
+    report = open(args.report, "w", encoding="utf-8") if args.report else None
+    try:
+        for result in iter_render_batch(_expand_sources(args.scenes), args.output_dir, args.workers,
+                                        args.cache_images, input_root=_input_root(args.scenes)):
+            if result.ok:
+                rendered += 1
+                if not args.quiet:
+                    phases = ", ".join(f"{name} {seconds:.3f}" for name, seconds in result.timings.items())
+                    print(f"[ok] {result.source} -> {result.output} {result.total_time:.3f} s ({phases})")
+            else:
+                failed += 1
+                print(f"[error] {result.source}: {result.error}", file=sys.stderr)
+            if report is not None:
+                report.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+                report.flush()
+    finally:
+        if report is not None:
+            report.close()
+    elapsed = time.perf_counter() - started
+    total = rendered + failed
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Готово: {rendered} из {total} сцен за {elapsed:.2f} s ({rate:.1f} сцен/с), ошибок: {failed}.")
+    return 1 if failed else 0
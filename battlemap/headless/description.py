@@ -0,0 +1,383 @@
+"""
+Модуль описывает сцены для пакетного рендеринга без GUI: чтение описаний из JSON/TOML
+и сборку по ним рендерера (карта, тайлы, токены, слои, оверлеи).
+
+Пример описания (JSON; в TOML - те же ключи):
+
+    {
+      "map": {"width": 20, "height": 15, "default_tile": "tiles/grass.png",
+              "tiles": [{"rows": [0, 1], "cols": [0, 20], "image": "tiles/wall.png"}],
+              "blocking": [{"rows": [0, 1], "cols": [0, 20]}]},
+      "layers": [{"name": "effects", "z_index": 15}],
+      "tokens": [{"image": "tokens/orc.png", "size": "2x2", "col": 3, "row": 4, "owners": [1]}],
+      "overlays": [{"type": "fog", "viewers": [1], "radius": 8},
+                   {"type": "arrow", "from": [245, 315], "to": [455, 385]}],
+      "output": {"path": "previews/{name}.png", "width": 640, "draw_grid": true, "quality": "final"}
+    }
+
+Вместо сетки тайлов карта может быть одним изображением: {"map": {"image": "maps/cave.jpg"}}
+(тогда сетка нужна только для привязки токенов и тумана и задается размером изображения).
+Относительные пути отсчитываются от каталога файла описания.
+"""
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ..io.image_loader import decode_image
+from ..render.arrow import create_arrow_image
+from ..render.quality import RenderQuality
+from ..render.sprite import SpriteRenderer
+from ..sprites.base_sprite import BaseSprite
+from ..sprites.map_tile import MapTileSprite
+from ..sprites.texture_registry import get_texture_registry
+from ..sprites.token_tile import TokenSize, TokenTileSprite
+from ..types.battle_map import BattleMap
+from ..types.token import OwnerId, Token, TokenId
+from ..types.vision import VisionEngine
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: описания TOML недоступны
+    tomllib = None
+
+MAP_LAYER: str = "map"
+TOKENS_LAYER: str = "tokens"
+OVERLAYS_LAYER: str = "overlays"
+
+OUTPUT_FORMATS: Dict[str, str] = {"png": "PNG", "webp": "WEBP", "jpg": "JPEG", "jpeg": "JPEG"}
+
+
+class SceneDescription:
+    """
+    Описание сцены для пакетного рендеринга.
+
+    Атрибуты:
+        name (str): Имя сцены (по умолчанию - имя файла без расширения).
+        base_dir (str): Каталог, от которого отсчитываются относительные пути.
+        data (Dict[str, Any]): Разобранное описание.
+        source (Optional[str]): Путь к файлу описания, если оно загружено из файла.
+    """
+
+    def __init__(self, data: Dict[str, Any], base_dir: str = ".", name: str = "scene", source: Optional[str] = None):
+        if not isinstance(data, dict):
+            raise ValueError("Описание сцены должно быть объектом (словарем).")
+        self.data: Dict[str, Any] = data
+        self.base_dir: str = base_dir
+        self.name: str = str(data.get("name", name))
+        self.source: Optional[str] = source
+
+    def resolve(self, path: str) -> str:
+        """Возвращает путь относительно каталога описания."""
+        return os.path.normpath(os.path.join(self.base_dir, os.path.expanduser(path)))
+
+    @property
+    def output(self) -> Dict[str, Any]:
+        return self.data.get("output", {})
+
+    @property
+    def quality(self) -> RenderQuality:
+        return RenderQuality(self.output.get("quality", RenderQuality.FINAL.value))
+
+    @property
+    def output_format(self) -> str:
+        """Формат Pillow для сохранения (по "format" или расширению "path", по умолчанию PNG)."""
+        fmt = self.output.get("format")
+        if fmt is None:
+            fmt = os.path.splitext(self.output.get("path", ""))[1].lstrip(".") or "png"
+        try:
+            return OUTPUT_FORMATS[fmt.lower()]
+        except KeyError:
+            raise ValueError(f"Неподдерживаемый формат вывода: '{fmt}'.") from None
+
+    def output_path(self, output_dir: Optional[str] = None, subdir: str = "") -> str:
+        """
+        Возвращает путь результата: в output_dir/subdir (если output_dir задан) под именем сцены,
+        иначе "output.path" описания (поддерживает подстановку {name}) или <имя>.<формат> рядом с описанием.
+        subdir - каталог описания относительно корня входных файлов: одноименные сцены из разных
+        каталогов не должны попадать в один файл результата.
+        """
+        extension = "jpg" if self.output_format == "JPEG" else self.output_format.lower()
+        if output_dir is not None:
+            return os.path.join(output_dir, subdir, f"{self.name}.{extension}")
+        path = self.output.get("path")
+        if path is None:
+            return self.resolve(f"{self.name}.{extension}")
+        return self.resolve(path.format(name=self.name))
+
+    def __repr__(self) -> str:
+        return f"<SceneDescription(name='{self.name}', source={self.source!r})>"
+
+
+def load_scene_description(path: str | os.PathLike) -> SceneDescription:
+    """
+    Читает описание сцены из файла .json или .toml.
+
+    Raises:
+        ValueError: Если формат файла не поддерживается или содержимое некорректно.
+    """
+    path = os.fspath(path)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    elif extension == ".toml":
+        if tomllib is None:
+            raise ValueError("Описания TOML требуют Python 3.11+ (модуль tomllib).")
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    else:
+        raise ValueError(f"Неподдерживаемый формат описания сцены: '{extension}' (ожидается .json или .toml).")
+    name = os.path.splitext(os.path.basename(path))[0]
+    return SceneDescription(data, base_dir=os.path.dirname(os.path.abspath(path)), name=name, source=path)
+
+
+class TextureSource:
+    """
+    Загрузчик изображений сцен с кэшем: каждый файл декодируется один раз (пока не изменится),
+    а подготовленные текстуры токенов и тайлов переиспользуются между сценами,
+    поэтому спрайты создаются с `shared_texture=True` без копий и ресайзов.
+
+    Атрибуты:
+        max_images (int): Максимум декодированных файлов в кэше (LRU).
+    """
+
+    def __init__(self, max_images: int = 256):
+        self.max_images: int = max_images
+        self._images: "OrderedDict[Tuple[str, str], Tuple[int, Image.Image]]" = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def _cached(self, path: str, kind: str, prepare) -> Image.Image:
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+        key = (path, kind)
+        cached = self._images.get(key)
+        if cached is not None and cached[0] == mtime:
+            self._images.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        image = prepare(path)
+        self._images[key] = (mtime, image)
+        while len(self._images) > self.max_images:
+            self._images.popitem(last=False)
+        return image
+
+    def image(self, path: str) -> Image.Image:
+        """Возвращает декодированное RGBA изображение файла."""
+        return self._cached(path, "image", decode_image)
+
+    def token_texture(self, path: str) -> Image.Image:
+        """
+        Возвращает общую текстуру токена наибольшего подготовленного размера
+        (`TokenTileSprite.PREPARED_SIZES`); токен готовит из нее остальные размеры.
+        """
+        size = max(TokenTileSprite.PREPARED_SIZES, key=lambda s: s[0] * s[1])
+        # Арт токена декодируется сразу в этом размере, полноразмерная копия не кэшируется
+        return self._cached(path, "token",
+                            lambda p: get_texture_registry().intern(decode_image(p, exact_size=size), size))
+
+    def tile_texture(self, path: str) -> Image.Image:
+        """Возвращает общую текстуру тайла (`MapTileSprite.prepare_texture`)."""
+        return self._cached(path, "tile", lambda p: MapTileSprite.prepare_texture(
+                decode_image(p, exact_size=MapTileSprite.TARGET_SIZE)))
+
+    def clear(self):
+        self._images.clear()
+
+
+def _parse_token_size(value: Any) -> TokenSize:
+    """Принимает 'SIZE_2x2', '2x2' или 2."""
+    if isinstance(value, int):
+        value = f"{value}x{value}"
+    name = str(value)
+    if not name.startswith("SIZE_"):
+        name = f"SIZE_{name}"
+    try:
+        return TokenSize[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный размер токена: '{value}'.") from None
+
+
+def _span(entry: Dict[str, Any], axis: str, single: str) -> Tuple[int, int]:
+    """Диапазон [start, end) из "rows"/"cols" ([start, end]) или одной ячейки "row"/"col"."""
+    if axis in entry:
+        start, end = entry[axis]
+        return int(start), int(end)
+    index = int(entry[single])
+    return index, index + 1
+
+
+def _build_battle_map(description: SceneDescription, map_data: Dict[str, Any], textures: TextureSource,
+                      default_size: Optional[Tuple[int, int]]) -> Optional[BattleMap]:
+    width = map_data.get("width")
+    height = map_data.get("height")
+    if width is None or height is None:
+        if default_size is None:
+            return None
+        width = default_size[0] // MapTileSprite.TILE_WIDTH
+        height = default_size[1] // MapTileSprite.TILE_HEIGHT
+        if width <= 0 or height <= 0:
+            return None
+    battle_map = BattleMap(int(width), int(height))
+
+    def palette_id(path: str) -> int:
+        # Индекс не кэшируется: текстура кэшируется загрузчиком, и палитра вернет ее текущий индекс
+        return battle_map.add_palette_texture(textures.tile_texture(description.resolve(path)), prepared=True)
+
+    if "default_tile" in map_data:
+        battle_map.fill_region(0, 0, battle_map.map_height_tiles, battle_map.map_width_tiles,
+                               palette_id(map_data["default_tile"]))
+    for tile in map_data.get("tiles", []):
+        row_start, row_end = _span(tile, "rows", "row")
+        col_start, col_end = _span(tile, "cols", "col")
+        battle_map.fill_region(row_start, col_start, row_end, col_end, palette_id(tile["image"]))
+    for cell in map_data.get("blocking", []):
+        if isinstance(cell, dict):
+            row_start, row_end = _span(cell, "rows", "row")
+            col_start, col_end = _span(cell, "cols", "col")
+            battle_map.set_blocking_region(row_start, col_start, row_end, col_end)
+        else:
+            battle_map.set_blocking(int(cell[0]), int(cell[1]))
+    return battle_map
+
+
+def _fog_image(battle_map: BattleMap, tokens: List[Token], overlay: Dict[str, Any]) -> Image.Image:
+    """Туман войны: ячейки, которые не видит ни один из зрителей, закрашиваются цветом тумана."""
+    viewers = [TokenId(v) for v in overlay.get("viewers", [int(t.token_id) for t in tokens])]
+    radius = overlay.get("radius")
+    engine = VisionEngine(battle_map, int(radius) if radius is not None else None)
+    engine.update([t for t in tokens if t.token_id in viewers])
+    visible = engine.combined_mask(viewers)
+    color = np.array(overlay.get("color", (0, 0, 0, 200)), dtype=np.uint8)
+    cells = np.zeros(visible.shape + (4,), dtype=np.uint8)
+    cells[~visible] = color
+    return Image.fromarray(cells, "RGBA").resize(
+            (battle_map.total_pixel_width, battle_map.total_pixel_height), Image.Resampling.NEAREST
+            )
+
+
+def build_scene(description: SceneDescription, textures: Optional[TextureSource] = None) -> SpriteRenderer:
+    """
+    Собирает рендерер по описанию сцены.
+
+    Слои по умолчанию: "map" (z=0), "tokens" (z=10), "overlays" (z=20); описание может
+    добавить свои слои или переопределить z_index/видимость стандартных.
+
+    Args:
+        description (SceneDescription): Описание сцены.
+        textures (Optional[TextureSource], optional): Общий загрузчик текстур (для переиспользования
+                                                      между сценами). По умолчанию - новый.
+
+    Returns:
+        SpriteRenderer: Готовый к рендеру рендерер.
+
+    Raises:
+        ValueError: Если описание некорректно.
+    """
+    textures = textures if textures is not None else TextureSource()
+    data = description.data
+    map_data = data.get("map", {})
+    canvas = data.get("canvas", {})
+
+    background: Optional[Image.Image] = None
+    if "image" in map_data:
+        background = textures.image(description.resolve(map_data["image"]))
+    battle_map = _build_battle_map(description, map_data, textures, background.size if background else None)
+
+    if "width" in canvas and "height" in canvas:
+        size = (int(canvas["width"]), int(canvas["height"]))
+    elif background is not None:
+        size = background.size
+    elif battle_map is not None:
+        size = (battle_map.total_pixel_width, battle_map.total_pixel_height)
+    else:
+        raise ValueError(f"Сцена '{description.name}': не задан размер (нужна карта или canvas.width/height).")
+
+    renderer = SpriteRenderer(size[0], size[1], background_color=tuple(canvas.get("background", (0, 0, 0, 255))))
+    if battle_map is not None and background is None:
+        renderer.add_battle_map_layer(MAP_LAYER, battle_map, z_index=0)
+    else:
+        renderer.add_layer(MAP_LAYER, z_index=0)
+    renderer.add_layer(TOKENS_LAYER, z_index=10)
+    renderer.add_layer(OVERLAYS_LAYER, z_index=20)
+    for layer in data.get("layers", []):
+        # Для существующего слоя (в том числе стандартного) меняются только z_index и видимость
+        renderer.add_layer(layer["name"], int(layer.get("z_index", 0)), layer.get("visible", True))
+    if background is not None:
+        renderer.add_sprite(MAP_LAYER, BaseSprite(background, 0, 0, "map_background", shared_texture=True))
+
+    tokens: List[Token] = []
+    for index, entry in enumerate(data.get("tokens", [])):
+        token_size = _parse_token_size(entry.get("size", "1x1"))
+        token = Token(
+                textures.token_texture(description.resolve(entry["image"])),
+                token_size,
+                TokenId(int(entry.get("id", index + 1))),
+                owner_ids=[OwnerId(int(o)) for o in entry.get("owners", [])],
+                initially_visible=entry.get("visible", True),
+                name=entry.get("name", f"token_{index + 1}"),
+                shared_texture=True
+                )
+        if "col" in entry and "row" in entry:
+            token.set_grid_position(int(entry["col"]), int(entry["row"]))
+        else:
+            token.set_position(int(entry.get("x", 0)), int(entry.get("y", 0)))
+        renderer.add_sprite(entry.get("layer", TOKENS_LAYER), token)
+        tokens.append(token)
+
+    for overlay in data.get("overlays", []):
+        kind = overlay.get("type", "image")
+        layer_name = overlay.get("layer", OVERLAYS_LAYER)
+        if kind == "image":
+            image = textures.image(description.resolve(overlay["image"]))
+            renderer.add_sprite(layer_name, BaseSprite(image, int(overlay.get("x", 0)), int(overlay.get("y", 0)),
+                                                       overlay.get("name", "overlay"), shared_texture=True))
+        elif kind == "arrow":
+            arrow_kwargs = {"color": tuple(overlay["color"])} if "color" in overlay else {}
+            arrow_image, (x, y) = create_arrow_image(tuple(overlay["from"]), tuple(overlay["to"]), **arrow_kwargs)
+            if arrow_image is not None:
+                renderer.add_sprite(layer_name, BaseSprite(arrow_image, x, y, "arrow", shared_texture=True))
+        elif kind == "fog":
+            if battle_map is None:
+                raise ValueError(f"Сцена '{description.name}': для тумана нужна сетка карты.")
+            renderer.add_sprite(layer_name, BaseSprite(_fog_image(battle_map, tokens, overlay), 0, 0, "fog",
+                                                       shared_texture=True))
+        else:
+            raise ValueError(f"Сцена '{description.name}': неизвестный тип оверлея '{kind}'.")
+    return renderer
+
+
+def scale_output(image: Image.Image, width: Optional[int], height: Optional[int],
+                 quality: RenderQuality = RenderQuality.FINAL) -> Image.Image:
+    """
+    Масштабирует готовый кадр до width x height (если задано одно из измерений -
+    с сохранением пропорций; если не задано ни одного - возвращает кадр как есть).
+    """
+    if width is None and height is None:
+        return image
+    if width is None:
+        width = max(1, round(image.width * int(height) / image.height))
+    if height is None:
+        height = max(1, round(image.height * int(width) / image.width))
+    target = (int(width), int(height))
+    if target == image.size:
+        return image
+    scale = min(target[0] / image.width, target[1] / image.height)
+    return image.resize(target, quality.display_resample(scale))
+
+
+def render_description(description: SceneDescription, textures: Optional[TextureSource] = None) -> Image.Image:
+    """
+    Собирает и рендерит сцену; при заданных output.width/height результат масштабируется
+    (см. `scale_output`).
+    """
+    renderer = build_scene(description, textures)
+    quality = description.quality
+    image = renderer.render(draw_grid=bool(description.output.get("draw_grid", False)), quality=quality)
+    renderer.release_textures()
+    return scale_output(image, description.output.get("width"), description.output.get("height"), quality)
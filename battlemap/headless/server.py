@@ -0,0 +1,558 @@
+"""
+Модуль реализует локальный HTTP-сервер рендеринга на стандартной библиотеке.
+
+Сервер держит "теплые" сцены в памяти (собранные по описаниям, см. `description`),
+принимает изменения сцен и запросы рендера. Рендер выполняется в ограниченном пуле
+потоков: запросы сверх лимита очереди сразу отклоняются (503, Retry-After), ожидание
+ограничено таймаутом (504), а запросы, простоявшие в очереди дольше таймаута,
+не рендерятся вовсе. Метрики (задержки, глубина очереди, отказы) - GET /metrics.
+
+API (JSON, кроме изображений):
+    POST   /scenes                                   {"id"?: str, "description": {...}} -> {"id": ...}
+    GET    /scenes                                   -> {"scenes": [...]}
+    DELETE /scenes/<id>
+    POST   /scenes/<id>/tokens/<token_id>/move       {"x", "y"} | {"col", "row"} | {"dx", "dy"}
+    POST   /scenes/<id>/layers/<layer>               {"visible": bool, "z_index"?: int}
+    GET    /scenes/<id>/render?format=png&quality=draft&grid=1&width=640&height=...
+    GET    /metrics
+    GET    /health
+"""
+import argparse
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from ..render.quality import RenderQuality
+from ..render.sprite import SpriteRenderer
+from ..types.token import Token, TokenId
+from ..types.token_registry import TokenRegistry
+from .description import OUTPUT_FORMATS, SceneDescription, TextureSource, build_scene, scale_output
+
+CONTENT_TYPES: Dict[str, str] = {"PNG": "image/png", "WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+
+class RenderQueueFullError(RuntimeError):
+    """Очередь рендера заполнена: запрос отклонен без ожидания (сброс нагрузки)."""
+
+
+class _WarmScene:
+    """Сцена, удерживаемая сервером: рендерер, реестр токенов и блокировка изменений."""
+
+    def __init__(self, scene_id: str, renderer: SpriteRenderer):
+        self.scene_id: str = scene_id
+        self.renderer: SpriteRenderer = renderer
+        self.lock = threading.Lock()
+        self.version: int = 0
+        self.tokens = TokenRegistry()
+        for layer_data in renderer.layers.values():
+            for sprite in layer_data['sprites']:
+                if isinstance(sprite, Token):
+                    self.tokens.add(sprite)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "id": self.scene_id, "version": self.version,
+            "size": [self.renderer.width, self.renderer.height],
+            "layers": {name: {"z_index": data['z_index'], "visible": data['visible']}
+                       for name, data in self.renderer.layers.items()},
+            "tokens": len(self.tokens),
+            }
+
+
+class _LatencyWindow:
+    """Скользящее окно последних замеров задержки (секунды) с перцентилями."""
+
+    def __init__(self, size: int = 1024):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+
+        def percentile(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000.0, 3)
+
+        return {"count": len(samples), "p50_ms": percentile(0.50), "p95_ms": percentile(0.95),
+                "p99_ms": percentile(0.99), "max_ms": round(samples[-1] * 1000.0, 3)}
+
+
+class RenderServer:
+    """
+    Локальный сервер рендеринга теплых сцен.
+
+    Методы сцен (`create_scene`, `move_token`, `set_layer`, `render`, ...) можно вызывать
+    и напрямую, без HTTP; HTTP-обработчик лишь переводит запросы в эти вызовы.
+
+    Атрибуты:
+        workers (int): Размер пула потоков рендера.
+        max_queue (int): Максимум запросов, ожидающих свободного потока (сверх - отказ).
+        render_timeout (float): Максимальное время ответа на запрос рендера, в секундах.
+        max_scenes (int): Максимум одновременно удерживаемых сцен.
+    """
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            workers: int = 2,
+            max_queue: int = 8,
+            render_timeout: float = 10.0,
+            asset_root: str = ".",
+            max_scenes: int = 64
+            ):
+        """
+        Инициализирует RenderServer (порт 0 - выбрать свободный; см. `address`).
+
+        Raises:
+            ValueError: Если workers не положительный, max_queue отрицательный
+                        или render_timeout не положительный.
+        """
+        if workers < 1 or max_queue < 0 or render_timeout <= 0:
+            raise ValueError("Некорректные параметры пула рендера.")
+        self.workers: int = workers
+        self.max_queue: int = max_queue
+        self.render_timeout: float = render_timeout
+        self.asset_root: str = asset_root
+        self.max_scenes: int = max_scenes
+
+        self._scenes: Dict[str, _WarmScene] = {}
+        self._scenes_lock = threading.Lock()
+        self._scenes_building: int = 0  # Сцены, собираемые сейчас (уже заняли место в лимите)
+        self._textures = TextureSource()
+        self._textures_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="battlemap-render")
+
+        self._metrics_lock = threading.Lock()
+        self._queued: int = 0
+        self._running: int = 0
+        self._counters: Dict[str, int] = {"requests": 0, "rendered": 0, "rejected": 0, "timeouts": 0,
+                                          "expired": 0, "errors": 0, "mutations": 0}
+        self._queue_wait = _LatencyWindow()
+        self._render_time = _LatencyWindow()
+        self._total_latency = _LatencyWindow()
+
+        self._httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.render_server = self
+        self._serve_thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """(host, port), на которых слушает сервер."""
+        return self._httpd.server_address[:2]
+
+    @property
+    def url(self) -> str:
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        """Обслуживает запросы в текущем потоке (до KeyboardInterrupt); затем вызовите `stop`."""
+        self._httpd.serve_forever()
+
+    def start(self) -> "RenderServer":
+        """Запускает обслуживание запросов в фоновом потоке."""
+        if self._serve_thread is None:
+            self._serve_thread = threading.Thread(target=self._httpd.serve_forever, name="battlemap-http", daemon=True)
+            self._serve_thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает прием запросов и пул рендера."""
+        if self._serve_thread is not None:
+            self._httpd.shutdown()
+            self._serve_thread.join()
+            self._serve_thread = None
+        self._httpd.server_close()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "RenderServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # --- Сцены ---
+
+    def _scene(self, scene_id: str) -> _WarmScene:
+        with self._scenes_lock:
+            scene = self._scenes.get(scene_id)
+        if scene is None:
+            raise KeyError(f"Сцена '{scene_id}' не найдена.")
+        return scene
+
+    def create_scene(self, description: Dict[str, Any], scene_id: Optional[str] = None) -> str:
+        """
+        Собирает сцену по описанию (пути - относительно asset_root) и держит ее в памяти.
+
+        Returns:
+            str: ID сцены.
+
+        Raises:
+            ValueError: Если описание некорректно.
+            RenderQueueFullError: Если достигнут лимит сцен.
+        """
+        scene_id = scene_id or uuid.uuid4().hex[:12]
+        # Лимит проверяется до сборки: заполненный сервер не декодирует сцену ради отказа
+        with self._scenes_lock:
+            reserved = scene_id not in self._scenes
+            if reserved and len(self._scenes) + self._scenes_building >= self.max_scenes:
+                raise RenderQueueFullError(f"Достигнут лимит сцен ({self.max_scenes}).")
+            self._scenes_building += reserved
+        replaced = None
+        try:
+            with self._textures_lock:
+                renderer = build_scene(SceneDescription(description, base_dir=self.asset_root, name=scene_id),
+                                       self._textures)
+            with self._scenes_lock:
+                replaced = self._scenes.get(scene_id)
+                self._scenes[scene_id] = _WarmScene(scene_id, renderer)
+        finally:
+            with self._scenes_lock:
+                self._scenes_building -= reserved
+        if replaced is not None:
+            self._release_scene(replaced)
+        return scene_id
+
+    @staticmethod
+    def _release_scene(scene: _WarmScene):
+        """Освобождает текстуры сцены, удаленной или замененной новой сценой с тем же ID."""
+        with scene.lock:
+            scene.tokens.clear()
+            scene.renderer.release_textures()
+
+    def delete_scene(self, scene_id: str):
+        with self._scenes_lock:
+            scene = self._scenes.pop(scene_id, None)
+        if scene is None:
+            raise KeyError(f"Сцена '{scene_id}' не найдена.")
+        self._release_scene(scene)
+
+    def list_scenes(self) -> List[Dict[str, Any]]:
+        with self._scenes_lock:
+            scenes = list(self._scenes.values())
+        return [scene.info() for scene in scenes]
+
+    def move_token(self, scene_id: str, token_id: int, x: Optional[int] = None, y: Optional[int] = None,
+                   col: Optional[int] = None, row: Optional[int] = None,
+                   dx: Optional[int] = None, dy: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Перемещает токен: в пиксели (x, y), в ячейку (col, row) или на смещение (dx, dy).
+
+        Raises:
+            KeyError: Если сцена или токен не найдены.
+            ValueError: Если не заданы координаты.
+        """
+        scene = self._scene(scene_id)
+        with scene.lock:
+            token = scene.tokens.get(TokenId(int(token_id)))
+            if token is None:
+                raise KeyError(f"Токен {token_id} не найден в сцене '{scene_id}'.")
+            if col is not None and row is not None:
+                token.set_grid_position(int(col), int(row))
+            elif x is not None and y is not None:
+                token.set_position(int(x), int(y))
+            elif dx is not None or dy is not None:
+                token.move(int(dx or 0), int(dy or 0))
+            else:
+                raise ValueError("Нужны координаты: x/y, col/row или dx/dy.")
+            scene.version += 1
+            result = {"token": int(token.token_id), "x": token.x, "y": token.y, "version": scene.version}
+        self._count("mutations")
+        return result
+
+    def set_layer(self, scene_id: str, layer_name: str, visible: Optional[bool] = None,
+                  z_index: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Меняет видимость и/или z_index слоя.
+
+        Raises:
+            KeyError: Если сцена или слой не найдены.
+        """
+        scene = self._scene(scene_id)
+        with scene.lock:
+            layer = scene.renderer.layers.get(layer_name)
+            if layer is None:
+                raise KeyError(f"Слой '{layer_name}' не найден в сцене '{scene_id}'.")
+            if visible is not None:
+                layer['visible'] = bool(visible)
+            if z_index is not None:
+                layer['z_index'] = int(z_index)
+            scene.version += 1
+            result = {"layer": layer_name, "visible": layer['visible'], "z_index": layer['z_index'],
+                      "version": scene.version}
+        self._count("mutations")
+        return result
+
+    # --- Рендер ---
+
+    def render(self, scene_id: str, output_format: str = "PNG", quality: RenderQuality = RenderQuality.FINAL,
+               draw_grid: bool = False, width: Optional[int] = None, height: Optional[int] = None) -> bytes:
+        """
+        Рендерит сцену в пуле и возвращает закодированное изображение.
+
+        Снимок сцены (`SpriteRenderer.snapshot`) берется в момент запроса, поэтому
+        изменения, пришедшие во время рендера, не смешиваются с кадром.
+
+        Raises:
+            KeyError: Если сцена не найдена.
+            RenderQueueFullError: Если очередь заполнена (запрос сброшен сразу).
+            TimeoutError: Если кадр не готов за render_timeout секунд.
+        """
+        scene = self._scene(scene_id)
+        requested = time.perf_counter()
+        with self._metrics_lock:
+            self._counters["requests"] += 1
+            # Свободные потоки заберут запросы сразу; сверх них в очереди ждут не больше max_queue
+            if self._queued >= self.max_queue + max(0, self.workers - self._running):
+                self._counters["rejected"] += 1
+                raise RenderQueueFullError("Очередь рендера заполнена.")
+            self._queued += 1
+        deadline = requested + self.render_timeout
+        try:
+            with scene.lock:
+                snapshot = scene.renderer.snapshot()
+            future = self._pool.submit(self._render_job, snapshot, output_format, quality, draw_grid,
+                                       width, height, requested, deadline)
+        except Exception:
+            # Задача не попала в пул: возвращаем место в очереди
+            with self._metrics_lock:
+                self._queued -= 1
+            self._count("errors")
+            raise
+        try:
+            data = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except FutureTimeoutError:
+            if future.cancel():
+                # Задача так и не начиналась: снимаем ее со счетчика очереди
+                with self._metrics_lock:
+                    self._queued -= 1
+            self._count("timeouts")
+            raise TimeoutError(f"Рендер не завершился за {self.render_timeout} с.") from None
+        except Exception:
+            self._count("errors")
+            raise
+        self._total_latency.add(time.perf_counter() - requested)
+        return data
+
+    def _render_job(self, snapshot: SpriteRenderer, output_format: str, quality: RenderQuality, draw_grid: bool,
+                    width: Optional[int], height: Optional[int], requested: float, deadline: float) -> bytes:
+        started = time.perf_counter()
+        with self._metrics_lock:
+            self._queued -= 1
+            self._running += 1
+        self._queue_wait.add(started - requested)
+        try:
+            if started >= deadline:
+                # Клиент уже получил таймаут - рендерить незачем
+                self._count("expired")
+                raise TimeoutError("Запрос простоял в очереди дольше таймаута.")
+            try:
+                image = snapshot.render(draw_grid=draw_grid, quality=quality)
+            finally:
+                snapshot.release_textures()
+            image = scale_output(image, width, height, quality)
+            if output_format == "JPEG" and image.mode != "RGB":
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, format=output_format)
+            self._render_time.add(time.perf_counter() - started)
+            self._count("rendered")
+            return buffer.getvalue()
+        finally:
+            with self._metrics_lock:
+                self._running -= 1
+
+    # --- Метрики ---
+
+    def _count(self, name: str):
+        with self._metrics_lock:
+            self._counters[name] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            counters = dict(self._counters)
+            queued, running = self._queued, self._running
+        with self._scenes_lock:
+            scenes = len(self._scenes)
+        return {
+            "queue_depth": queued, "in_flight": running, "workers": self.workers, "max_queue": self.max_queue,
+            "scenes": scenes, **counters,
+            "queue_wait": self._queue_wait.summary(),
+            "render_time": self._render_time.summary(),
+            "latency": self._total_latency.summary(),
+            }
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Переводит HTTP-запросы в вызовы `RenderServer`."""
+    server_version = "BattleMapRender/1.0"
+    protocol_version = "HTTP/1.1"
+
+    _ROUTES = [
+        ("GET", re.compile(r"^/health$"), "_health"),
+        ("GET", re.compile(r"^/metrics$"), "_metrics"),
+        ("GET", re.compile(r"^/scenes$"), "_list_scenes"),
+        ("POST", re.compile(r"^/scenes$"), "_create_scene"),
+        ("DELETE", re.compile(r"^/scenes/(?P<scene_id>[^/]+)$"), "_delete_scene"),
+        ("POST", re.compile(r"^/scenes/(?P<scene_id>[^/]+)/tokens/(?P<token_id>\d+)/move$"), "_move_token"),
+        ("POST", re.compile(r"^/scenes/(?P<scene_id>[^/]+)/layers/(?P<layer>[^/]+)$"), "_set_layer"),
+        ("GET", re.compile(r"^/scenes/(?P<scene_id>[^/]+)/render$"), "_render"),
+        ]
+
+    @property
+    def render_server(self) -> RenderServer:
+        return self.server.render_server
+
+    def log_message(self, format: str, *args):
+        pass  # Журнал запросов не пишется в stderr; см. /metrics
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        parts = urlsplit(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        handler_name = None
+        try:
+            for route_method, pattern, handler_name in self._ROUTES:
+                match = pattern.match(parts.path)
+                if match and route_method == method:
+                    getattr(self, handler_name)(**match.groupdict())
+                    return
+            self._send_json(404, {"error": "Неизвестный путь."})
+        except KeyError as e:
+            self._send_json(404, {"error": str(e.args[0]) if e.args else "Не найдено."})
+        except FileNotFoundError as e:
+            # Описание сцены ссылается на отсутствующий ассет - ошибка запроса
+            self._send_json(400, {"error": f"Файл не найден: {e.filename or e}"})
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+        except RenderQueueFullError as e:
+            self._send_json(503, {"error": str(e)}, {"Retry-After": "1"})
+        except TimeoutError as e:
+            self._send_json(504, {"error": str(e)})
+        except Exception as e:
+            # Любая другая ошибка - ответ 500 вместо разрыва соединения без ответа
+            if handler_name != "_render":  # Ошибки рендера уже учтены в RenderServer.render
+                self.render_server._count("errors")
+            self._send_json(500, {"error": f"Внутренняя ошибка: {type(e).__name__}: {e}"})
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length).decode("utf-8"))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Некорректный JSON: {e}") from None
+        if not isinstance(body, dict):
+            raise ValueError("Тело запроса должно быть JSON-объектом.")
+        return body
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        if status >= 400:
+            self.close_connection = True  # Тело запроса могло остаться непрочитанным
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                   "application/json; charset=utf-8", headers)
+
+    # --- Обработчики ---
+
+    def _health(self):
+        self._send_json(200, {"status": "ok"})
+
+    def _metrics(self):
+        self._send_json(200, self.render_server.metrics())
+
+    def _list_scenes(self):
+        self._send_json(200, {"scenes": self.render_server.list_scenes()})
+
+    def _create_scene(self):
+        body = self._read_json()
+        description = body.get("description")
+        if description is None:
+            raise ValueError("Нужно поле 'description'.")
+        scene_id = self.render_server.create_scene(description, body.get("id"))
+        self._send_json(201, {"id": scene_id})
+
+    def _delete_scene(self, scene_id: str):
+        self.render_server.delete_scene(scene_id)
+        self._send_json(200, {"deleted": scene_id})
+
+    def _move_token(self, scene_id: str, token_id: str):
+        body = self._read_json()
+        allowed = {k: body[k] for k in ("x", "y", "col", "row", "dx", "dy") if k in body}
+        self._send_json(200, self.render_server.move_token(scene_id, int(token_id), **allowed))
+
+    def _set_layer(self, scene_id: str, layer: str):
+        body = self._read_json()
+        self._send_json(200, self.render_server.set_layer(scene_id, layer, body.get("visible"), body.get("z_index")))
+
+    def _render(self, scene_id: str):
+        query = self.query
+        fmt = query.get("format", "png").lower()
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат: '{fmt}'.")
+        output_format = OUTPUT_FORMATS[fmt]
+        quality = RenderQuality(query.get("quality", RenderQuality.FINAL.value))
+        width = int(query["width"]) if "width" in query else None
+        height = int(query["height"]) if "height" in query else None
+        draw_grid = query.get("grid", "0").lower() in ("1", "true", "yes")
+        data = self.render_server.render(scene_id, output_format, quality, draw_grid, width, height)
+        self._send(200, data, CONTENT_TYPES[output_format])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Запускает сервер: python -m battlemap.headless.server --port 8765 --assets ./assets"""
+    parser = argparse.ArgumentParser(prog="python -m battlemap.headless.server",
+                                     description="Локальный HTTP-сервер рендеринга сцен BattleMap.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="Потоков рендера.")
+    parser.add_argument("--max-queue", type=int, default=8, help="Запросов в очереди сверх свободных потоков.")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Таймаут запроса рендера, с.")
+    parser.add_argument("--assets", default=".", help="Каталог, от которого отсчитываются пути описаний.")
+    args = parser.parse_args(argv)
+    server = RenderServer(args.host, args.port, args.workers, args.max_queue, args.timeout, args.assets)
+    print(f"Сервер рендеринга: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,3 @@
+from .image_loader import ImageLoader, decode_image, get_image_loader, load_image
+from .map_import import ChunkStore, import_large_map
+from .scene_file import Scene, load_scene, save_scene
@@ -0,0 +1,192 @@
+"""
+Модуль реализует загрузку исходных изображений (карт, токенов, тайлов) с уменьшенным
+декодированием и кэшем результатов.
+
+Если нужен размер меньше исходного, изображение уменьшается как можно раньше:
+    1. JPEG декодируется сразу в уменьшенном масштабе (`Image.draft`: 1/2, 1/4 или 1/8),
+       не распаковывая полное разрешение. Остальные кодеки (PNG, WEBP и др.)
+       декодируются целиком - уменьшенного декодирования они не поддерживают.
+    2. Целочисленное уменьшение `Image.reduce` (усреднение блоков) до размера не более
+       чем вдвое больше целевого.
+    3. Финальный ресайз выбранным фильтром (по умолчанию LANCZOS) - уже с небольшого изображения.
+Преобразование в RGBA выполняется после уменьшения, когда пикселей уже мало.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from PIL import Image
+
+# Режимы, для которых доступен Image.reduce; остальные (P, 1, CMYK, I;16 ...) сначала приводятся к целевому
+_REDUCIBLE_MODES = ("RGB", "RGBA", "L", "LA")
+
+
+def fit_size(source_size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """Размер, вписанный в max_size с сохранением пропорций (не больше исходного)."""
+    width, height = source_size
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    if scale >= 1.0:
+        return width, height
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def decode_image(
+        source: str | os.PathLike | bytes | BinaryIO,
+        max_size: Optional[Tuple[int, int]] = None,
+        exact_size: Optional[Tuple[int, int]] = None,
+        mode: str = "RGBA",
+        resample: Image.Resampling = Image.Resampling.LANCZOS
+        ) -> Image.Image:
+    """
+    Декодирует изображение сразу в нужном размере (без кэша).
+
+    Args:
+        source: Путь, байты или файловый объект.
+        max_size (Optional[Tuple[int, int]], optional): Вписать в этот размер с сохранением пропорций.
+        exact_size (Optional[Tuple[int, int]], optional): Привести ровно к этому размеру
+                                                         (приоритетнее max_size).
+        mode (str, optional): Режим результата. По умолчанию "RGBA".
+        resample (Image.Resampling, optional): Фильтр финального ресайза. По умолчанию LANCZOS.
+
+    Returns:
+        Image.Image: Новое изображение, не связанное с файлом.
+    """
+    if isinstance(source, os.PathLike):
+        source = os.fspath(source)
+    stream = io.BytesIO(source) if isinstance(source, bytes) else source
+    with Image.open(stream) as opened:
+        if exact_size is not None:
+            target = (int(exact_size[0]), int(exact_size[1]))
+        elif max_size is not None:
+            target = fit_size(opened.size, max_size)
+        else:
+            target = opened.size
+
+        image = opened
+        if target != opened.size:
+            # Для JPEG декодер сразу выдаст ближайший масштаб не меньше целевого; для других форматов - no-op
+            opened.draft(None, target)
+        image.load()
+        if image.mode not in _REDUCIBLE_MODES:
+            image = image.convert(mode)
+
+        if image.size != target:
+            factor = min(image.width // target[0], image.height // target[1]) // 2
+            if factor >= 2 and resample != Image.Resampling.NEAREST:
+                image = image.reduce(factor)
+            image = image.resize(target, resample)
+        if image.mode != mode:
+            image = image.convert(mode)
+        if image is opened:
+            image = opened.copy()  # Открытый файл закрывается при выходе из with
+    return image
+
+
+class ImageLoader:
+    """
+    Загрузчик исходных изображений с LRU-кэшем результатов.
+
+    Ключ кэша - путь, время изменения и размер файла, а также целевой размер, режим и фильтр,
+    поэтому повторная загрузка того же ресурса с тем же размером почти бесплатна,
+    а измененный на диске файл декодируется заново. Возвращаемые изображения общие
+    для всех вызывающих - не изменяйте их на месте (при необходимости используйте `copy()`).
+    Потокобезопасен.
+
+    Атрибуты:
+        budget_bytes (int): Бюджет памяти кэша в байтах.
+        used_bytes (int): Текущий объем закэшированных пикселей в байтах.
+        hits (int): Количество попаданий.
+        misses (int): Количество декодирований.
+    """
+
+    def __init__(self, budget_bytes: int = 256 * 1024 * 1024):
+        if budget_bytes < 0:
+            raise ValueError("Бюджет памяти кэша изображений не может быть отрицательным.")
+        self.budget_bytes: int = budget_bytes
+        self.used_bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: "OrderedDict[tuple, Image.Image]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _nbytes(image: Image.Image) -> int:
+        return image.width * image.height * len(image.getbands())
+
+    def load(
+            self,
+            path: str | os.PathLike,
+            max_size: Optional[Tuple[int, int]] = None,
+            exact_size: Optional[Tuple[int, int]] = None,
+            mode: str = "RGBA",
+            resample: Image.Resampling = Image.Resampling.LANCZOS
+            ) -> Image.Image:
+        """
+        Загружает изображение файла в нужном размере (см. `decode_image`), используя кэш.
+
+        Raises:
+            OSError: Если файл не найден или не является изображением.
+        """
+        path = os.path.abspath(os.fspath(path))
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size,
+               tuple(max_size) if max_size else None, tuple(exact_size) if exact_size else None,
+               mode, int(resample))
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+        image = decode_image(path, max_size, exact_size, mode, resample)
+        with self._lock:
+            self.misses += 1
+            if key not in self._entries:
+                self._entries[key] = image
+                self.used_bytes += self._nbytes(image)
+                self._trim()
+        return image
+
+    def _trim(self):
+        while self.used_bytes > self.budget_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.used_bytes -= self._nbytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.used_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает статистику кэша: записи, объем, бюджет, попадания и промахи."""
+        with self._lock:
+            return {"entries": len(self._entries), "used_bytes": self.used_bytes,
+                    "budget_bytes": self.budget_bytes, "hits": self.hits, "misses": self.misses}
+
+    def __repr__(self) -> str:
+        return (f"<ImageLoader(entries={len(self._entries)}, used={self.used_bytes}, "
+                f"budget={self.budget_bytes}, hits={self.hits}, misses={self.misses})>")
+
+
+_default_loader = ImageLoader()
+
+
+def get_image_loader() -> ImageLoader:
+    """Возвращает общий для процесса загрузчик изображений."""
+    return _default_loader
+
+
+def load_image(
+        path: str | os.PathLike,
+        max_size: Optional[Tuple[int, int]] = None,
+        exact_size: Optional[Tuple[int, int]] = None,
+        mode: str = "RGBA",
+        resample: Image.Resampling = Image.Resampling.LANCZOS
+        ) -> Image.Image:
+    """Загружает изображение через общий загрузчик процесса (см. `ImageLoader.load`)."""
+    return _default_loader.load(path, max_size, exact_size, mode, resample)
@@ -0,0 +1,521 @@
+"""
+Модуль реализует импорт больших фоновых карт (например, экспортов 20000x20000 px)
+без уменьшения: изображение нарезается на фрагменты (chunks), выровненные по сетке
+тайлов 70x70, которые сохраняются в дисковое хранилище `ChunkStore` и/или
+становятся текстурами тайлов `BattleMap`.
+
+Изображение читается полосами высотой в один ряд фрагментов, и рабочий набор ограничен:
+    - несжатые форматы с построчной раскладкой (BMP, PPM/PGM, несжатый TIFF, TGA без RLE)
+      читаются с нужного смещения файла;
+    - PNG без чересстрочной развертки с 8 битами на канал (L, LA, RGB, RGBA, палитра)
+      распаковывается последовательно: поток IDAT разжимается по мере чтения полос,
+      а каждая полоса декодируется отдельно от предыдущей.
+Остальные форматы (JPEG, WEBP, сжатый TIFF, чересстрочный или 16-битный PNG) Pillow
+умеет декодировать только целиком: такое изображение декодируется один раз полностью
+(ширина x высота x 4 байта, для 20000x20000 - около 1.6 ГБ) и должно помещаться
+в max_working_bytes. Большие карты в этих форматах сначала преобразуйте в PNG или
+несжатый BMP/TIFF. Полосы обрабатываются параллельно в пуле потоков
+(декодирование, ресайз и сжатие PNG в Pillow отпускают GIL).
+"""
+import json
+import math
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from ..sprites.map_tile import MapTileSprite
+from ..types.battle_map import BattleMap
+
+# Байт на пиксель для сырых (несжатых) раскладок, которые можно читать полосами
+_RAW_BYTES_PER_PIXEL: Dict[str, int] = {
+    "L": 1, "P": 1, "LA": 2, "RGB": 3, "BGR": 3, "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4,
+    }
+
+ProgressCallback = Callable[[int, int], None]
+
+_PNG_SIGNATURE: bytes = b"\x89PNG\r\n\x1a\n"
+# Режимы строк PNG, которые декодируются полосами: байт на пиксель (8 бит на канал)
+_PNG_BAND_BYTES_PER_PIXEL: Dict[str, int] = {"L": 1, "LA": 2, "RGB": 3, "RGBA": 4, "P": 1}
+
+
+def _raw_layout(image: Image.Image) -> Optional[Tuple[int, int, int]]:
+    """
+    Возвращает (смещение данных, шаг строки, ориентация) для изображения из одного
+    сырого блока строк, или None, если полосами его читать нельзя.
+    """
+    if len(image.tile) != 1:
+        return None
+    codec, extents, offset, args = image.tile[0]
+    if codec != "raw" or tuple(extents) != (0, 0, image.width, image.height):
+        return None
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    if not args or args[0] not in _RAW_BYTES_PER_PIXEL:
+        return None
+    rawmode = args[0]
+    stride = args[1] if len(args) > 1 else 0
+    orientation = args[2] if len(args) > 2 else 1
+    if orientation not in (1, -1):
+        return None
+    if not stride:
+        stride = image.width * _RAW_BYTES_PER_PIXEL[rawmode]
+    return offset, stride, orientation
+
+
+def _retile(entry, extents: Tuple[int, int, int, int], offset: int):
+    if hasattr(entry, "_replace"):
+        return entry._replace(extents=extents, offset=offset)
+    return (entry[0], extents, offset, entry[3])
+
+
+# Image.MAX_IMAGE_PIXELS - глобальная настройка Pillow: меняется только на время открытия файла
+_pixel_limit_lock = threading.Lock()
+
+
+def _open_image(path: str, max_pixels: Optional[int]) -> Image.Image:
+    """
+    Открывает изображение (читает только заголовок) с ограничением числа пикселей.
+
+    Args:
+        path (str): Путь к изображению.
+        max_pixels (Optional[int]): Максимум пикселей. None - ограничение Pillow (`Image.MAX_IMAGE_PIXELS`).
+
+    Raises:
+        ValueError: Если изображение больше ограничения.
+    """
+    with _pixel_limit_lock:
+        default_limit = Image.MAX_IMAGE_PIXELS
+        limit = default_limit if max_pixels is None else max_pixels
+        Image.MAX_IMAGE_PIXELS = limit
+        try:
+            image = Image.open(path)
+        except Image.DecompressionBombError:
+            image = None
+        finally:
+            Image.MAX_IMAGE_PIXELS = default_limit
+    if image is None or (limit is not None and image.width * image.height > limit):
+        if image is not None:
+            image.close()
+        raise ValueError(f"Изображение '{path}' больше ограничения в {limit} пикселей; для импорта большой "
+                         f"карты передайте max_pixels не меньше ширины x высоты изображения.")
+    return image
+
+
+def _png_rawmode(image: Image.Image) -> Optional[str]:
+    """Возвращает режим строк PNG, который можно декодировать полосами, или None."""
+    if image.format != "PNG" or len(image.tile) != 1 or image.info.get("interlace"):
+        return None
+    codec, extents, _, args = image.tile[0]
+    rawmode = args if isinstance(args, str) else args[0]
+    if codec != "zip" or tuple(extents) != (0, 0, image.width, image.height) \
+            or rawmode not in _PNG_BAND_BYTES_PER_PIXEL or image.mode != rawmode:
+        return None
+    return rawmode
+
+
+class _PngBandDecoder:
+    """
+    Последовательно декодирует PNG полосами строк.
+
+    Поток IDAT разжимается `zlib` по мере чтения. Фильтры строк PNG ссылаются на предыдущую
+    строку, поэтому полоса декодируется декодером Pillow отдельно: перед ее отфильтрованными
+    строками ставится последняя строка предыдущей полосы без фильтра. Полосы декодируются
+    по порядку; полосы, запрошенные раньше предыдущих (потоками пула), ждут в `_ahead`.
+    """
+
+    def __init__(self, path: str, image: Image.Image, rawmode: str):
+        self.path: str = path
+        self.size: Tuple[int, int] = image.size
+        self.mode: str = image.mode
+        self.rawmode: str = rawmode
+        self._palette = image.palette.copy() if image.mode == "P" and image.palette is not None else None
+        self._transparency = image.info.get("transparency")
+        self._row_bytes: int = image.width * _PNG_BAND_BYTES_PER_PIXEL[rawmode] + 1  # байт фильтра + строка
+        # начало -> (декодированные строки, еще не выданные строки)
+        self._ahead: Dict[int, List] = {}
+        self._lock = threading.Lock()
+        self._restart()
+
+    def _restart(self):
+        self._chunks = self._idat_chunks()
+        self._inflate = zlib.decompressobj()
+        self._filtered = bytearray()
+        self._previous_row: Optional[bytes] = None
+        self._next_row: int = 0
+
+    def _idat_chunks(self):
+        with open(self.path, "rb") as f:
+            if f.read(len(_PNG_SIGNATURE)) != _PNG_SIGNATURE:
+                raise ValueError(f"Файл '{self.path}' не является PNG.")
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return
+                length, chunk_type = struct.unpack(">I4s", header)
+                if chunk_type == b"IEND":
+                    return
+                if chunk_type != b"IDAT":
+                    f.seek(length + 4, os.SEEK_CUR)
+                    continue
+                remaining = length
+                while remaining:
+                    data = f.read(min(remaining, 1 << 20))
+                    if not data:
+                        return
+                    remaining -= len(data)
+                    yield data
+                f.seek(4, os.SEEK_CUR)  # CRC
+
+    def _decode(self, rows: int) -> Image.Image:
+        """Декодирует следующие rows строк."""
+        needed = rows * self._row_bytes
+        while len(self._filtered) < needed:
+            data = next(self._chunks, None)
+            if data is None:
+                raise ValueError(f"Данные PNG '{self.path}' обрываются на строке {self._next_row}.")
+            self._filtered += self._inflate.decompress(data)
+        seeded = self._previous_row is not None
+        # zlib без сжатия (stored): декодер Pillow лишь снимает фильтры строк
+        stored = zlib.compressobj(0)
+        data = stored.compress(b"\0" + self._previous_row) if seeded else b""
+        with memoryview(self._filtered) as filtered:
+            data += stored.compress(filtered[:needed])
+        data += stored.flush()
+        del self._filtered[:needed]
+        width, height = self.size[0], rows + seeded
+        band = Image.new(self.mode, (width, height))
+        decoder = Image._getdecoder(self.mode, "zip", self.rawmode, (0,))
+        try:
+            decoder.setimage(band.im, (0, 0, width, height))
+            _, error = decoder.decode(data)
+        finally:
+            decoder.cleanup()
+        del data
+        if error < 0:
+            raise ValueError(f"Ошибка декодирования PNG '{self.path}' (код {error}).")
+        if seeded:
+            band = band.crop((0, 1, width, height))
+        self._previous_row = band.crop((0, rows - 1, width, rows)).tobytes("raw", self.rawmode)
+        self._next_row += rows
+        if self._palette is not None:
+            band.putpalette(self._palette)
+        if self._transparency is not None:
+            band.info["transparency"] = self._transparency
+        return band
+
+    def read(self, y0: int, y1: int) -> Image.Image:
+        """Возвращает полосу строк [y0, y1) в режиме PNG."""
+        with self._lock:
+            for start, entry in self._ahead.items():
+                segment, left = entry
+                if start <= y0 and y1 <= start + segment.height:
+                    entry[1] = left - (y1 - y0)
+                    if entry[1] <= 0:
+                        del self._ahead[start]
+                    return segment.crop((0, y0 - start, segment.width, y1 - start))
+            if y0 < self._next_row:
+                # Повторное чтение уже выданных строк: распаковка с начала файла
+                self._restart()
+                self._ahead.clear()
+            if y0 > self._next_row:
+                skipped = y0 - self._next_row
+                self._ahead[self._next_row] = [self._decode(skipped), skipped]
+            return self._decode(y1 - y0)
+
+    def close(self):
+        with self._lock:
+            self._chunks.close()
+            self._ahead.clear()
+
+
+class _BandReader:
+    """Читает горизонтальные полосы изображения: потоково, если формат позволяет, иначе из полного декода."""
+
+    def __init__(self, path: str, max_pixels: Optional[int] = None):
+        self.path: str = path
+        self.max_pixels: Optional[int] = max_pixels
+        self._png: Optional[_PngBandDecoder] = None
+        with _open_image(path, max_pixels) as image:
+            self.size: Tuple[int, int] = image.size
+            rawmode = _png_rawmode(image)
+            if rawmode is not None:
+                self._png = _PngBandDecoder(path, image, rawmode)
+            self.streaming: bool = self._png is not None or _raw_layout(image) is not None
+        self._full: Optional[Image.Image] = None
+        self._lock = threading.Lock()
+
+    def read(self, y0: int, y1: int) -> Image.Image:
+        """Возвращает RGBA полосу строк [y0, y1) полной ширины."""
+        if self._png is not None:
+            return self._png.read(y0, y1).convert("RGBA")
+        if self.streaming:
+            with _open_image(self.path, self.max_pixels) as image:
+                offset, stride, orientation = _raw_layout(image)
+                file_row = y0 if orientation == 1 else image.height - y1
+                image.tile = [_retile(image.tile[0], (0, 0, image.width, y1 - y0), offset + file_row * stride)]
+                image._size = (image.width, y1 - y0)
+                if hasattr(image, "_tile_size"):  # TIFF создает буфер декодирования по своему размеру
+                    image._tile_size = image._size
+                image.load()
+                return image.convert("RGBA")
+        with self._lock:
+            if self._full is None:
+                with _open_image(self.path, self.max_pixels) as image:
+                    self._full = image.convert("RGBA")
+        return self._full.crop((0, y0, self.size[0], y1))
+
+    def close(self):
+        self._full = None
+        if self._png is not None:
+            self._png.close()
+
+
+class ChunkStore:
+    """
+    Дисковое хранилище карты, нарезанной на фрагменты по chunk_tiles x chunk_tiles тайлов.
+
+    Каталог содержит index.json (размеры карты, тайла и фрагмента) и PNG файлы
+    фрагментов r<ряд>_c<столбец>.png. Фрагменты на правом и нижнем краю меньше,
+    если карта не кратна размеру фрагмента; пиксели за краем исходного изображения прозрачны.
+
+    Атрибуты:
+        directory (str): Каталог хранилища.
+        image_size (Tuple[int, int]): Размер исходного изображения в пикселях.
+        tile_size (Tuple[int, int]): Размер тайла в пикселях.
+        chunk_tiles (int): Сторона фрагмента в тайлах.
+        map_size_tiles (Tuple[int, int]): Размер сетки карты (столбцы, ряды).
+    """
+    INDEX_FILE = "index.json"
+
+    def __init__(self, directory: str | os.PathLike, image_size: Tuple[int, int],
+                 tile_size: Tuple[int, int] = (MapTileSprite.TILE_WIDTH, MapTileSprite.TILE_HEIGHT),
+                 chunk_tiles: int = 8, cache_chunks: int = 16):
+        if chunk_tiles < 1:
+            raise ValueError("Размер фрагмента должен быть не меньше одного тайла.")
+        self.directory: str = os.fspath(directory)
+        self.image_size: Tuple[int, int] = (int(image_size[0]), int(image_size[1]))
+        self.tile_size: Tuple[int, int] = (int(tile_size[0]), int(tile_size[1]))
+        self.chunk_tiles: int = chunk_tiles
+        self.map_size_tiles: Tuple[int, int] = (math.ceil(self.image_size[0] / self.tile_size[0]),
+                                                math.ceil(self.image_size[1] / self.tile_size[1]))
+        self._cache: "OrderedDict[Tuple[int, int], Image.Image]" = OrderedDict()
+        self._cache_chunks: int = cache_chunks
+        self._lock = threading.Lock()
+
+    @property
+    def chunk_pixel_size(self) -> Tuple[int, int]:
+        return self.chunk_tiles * self.tile_size[0], self.chunk_tiles * self.tile_size[1]
+
+    @property
+    def grid_size(self) -> Tuple[int, int]:
+        """Количество фрагментов (столбцы, ряды)."""
+        return (math.ceil(self.map_size_tiles[0] / self.chunk_tiles),
+                math.ceil(self.map_size_tiles[1] / self.chunk_tiles))
+
+    def chunk_path(self, chunk_row: int, chunk_col: int) -> str:
+        return os.path.join(self.directory, f"r{chunk_row}_c{chunk_col}.png")
+
+    def chunk_box(self, chunk_row: int, chunk_col: int) -> Tuple[int, int, int, int]:
+        """Пиксельная область фрагмента на карте (по сетке тайлов, может выходить за исходное изображение)."""
+        chunk_w, chunk_h = self.chunk_pixel_size
+        map_w = self.map_size_tiles[0] * self.tile_size[0]
+        map_h = self.map_size_tiles[1] * self.tile_size[1]
+        x0, y0 = chunk_col * chunk_w, chunk_row * chunk_h
+        return x0, y0, min(x0 + chunk_w, map_w), min(y0 + chunk_h, map_h)
+
+    def write_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        index = {"image_size": list(self.image_size), "tile_size": list(self.tile_size),
+                 "chunk_tiles": self.chunk_tiles, "map_size_tiles": list(self.map_size_tiles)}
+        tmp_path = os.path.join(self.directory, f"{self.INDEX_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, os.path.join(self.directory, self.INDEX_FILE))
+
+    @classmethod
+    def open(cls, directory: str | os.PathLike, cache_chunks: int = 16) -> "ChunkStore":
+        """Открывает существующее хранилище по его index.json."""
+        with open(os.path.join(os.fspath(directory), cls.INDEX_FILE), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        return cls(directory, tuple(index["image_size"]), tuple(index["tile_size"]), index["chunk_tiles"],
+                   cache_chunks)
+
+    def write_chunk(self, chunk_row: int, chunk_col: int, image: Image.Image):
+        path = self.chunk_path(chunk_row, chunk_col)
+        image.save(f"{path}.tmp", format="PNG", compress_level=1)
+        os.replace(f"{path}.tmp", path)
+
+    def read_chunk(self, chunk_row: int, chunk_col: int) -> Image.Image:
+        """Читает фрагмент (с небольшим LRU-кэшем; не изменяйте результат на месте)."""
+        key = (chunk_row, chunk_col)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        with Image.open(self.chunk_path(chunk_row, chunk_col)) as opened:
+            image = opened.convert("RGBA")
+        with self._lock:
+            self._cache[key] = image
+            while len(self._cache) > self._cache_chunks:
+                self._cache.popitem(last=False)
+        return image
+
+    def tile_image(self, row: int, col: int) -> Image.Image:
+        """Возвращает текстуру тайла (row, col) карты."""
+        tile_w, tile_h = self.tile_size
+        chunk = self.read_chunk(row // self.chunk_tiles, col // self.chunk_tiles)
+        x = (col % self.chunk_tiles) * tile_w
+        y = (row % self.chunk_tiles) * tile_h
+        return chunk.crop((x, y, x + tile_w, y + tile_h))
+
+    def read_region(self, box: Tuple[int, int, int, int]) -> Image.Image:
+        """Собирает произвольную пиксельную область карты из фрагментов (например, для видимой части)."""
+        x0, y0, x1, y1 = box
+        region = Image.new("RGBA", (x1 - x0, y1 - y0), (0, 0, 0, 0))
+        chunk_w, chunk_h = self.chunk_pixel_size
+        grid_cols, grid_rows = self.grid_size
+        for chunk_row in range(max(0, y0 // chunk_h), min(grid_rows, math.ceil(y1 / chunk_h))):
+            for chunk_col in range(max(0, x0 // chunk_w), min(grid_cols, math.ceil(x1 / chunk_w))):
+                cx, cy, _, _ = self.chunk_box(chunk_row, chunk_col)
+                region.paste(self.read_chunk(chunk_row, chunk_col), (cx - x0, cy - y0))
+        return region
+
+    def __repr__(self) -> str:
+        return (f"<ChunkStore(directory='{self.directory}', image={self.image_size}, "
+                f"chunks={self.grid_size}, chunk_tiles={self.chunk_tiles})>")
+
+
+def _cut_band(reader: _BandReader, store: ChunkStore, chunk_row: int) -> Tuple[int, List[Image.Image]]:
+    """Читает полосу одного ряда фрагментов и режет ее на фрагменты (с прозрачным дополнением по краям)."""
+    _, y0, _, y1 = store.chunk_box(chunk_row, 0)
+    image_w, image_h = reader.size
+    band = reader.read(y0, min(y1, image_h))
+    map_w = store.map_size_tiles[0] * store.tile_size[0]
+    if band.size != (map_w, y1 - y0):
+        padded = Image.new("RGBA", (map_w, y1 - y0), (0, 0, 0, 0))
+        padded.paste(band, (0, 0))
+        band = padded
+    chunks = []
+    for chunk_col in range(store.grid_size[0]):
+        x0, _, x1, _ = store.chunk_box(chunk_row, chunk_col)
+        chunks.append(band.crop((x0, 0, x1, y1 - y0)))
+    return chunk_row, chunks
+
+
+def import_large_map(
+        path: str | os.PathLike,
+        store_dir: Optional[str | os.PathLike] = None,
+        battle_map: Optional[BattleMap] = None,
+        chunk_tiles: int = 8,
+        workers: Optional[int] = None,
+        max_working_bytes: int = 512 * 1024 * 1024,
+        progress: Optional[ProgressCallback] = None,
+        max_pixels: Optional[int] = None
+        ) -> Tuple[Optional[ChunkStore], Optional[BattleMap]]:
+    """
+    Импортирует большое изображение карты без уменьшения: нарезает его на фрагменты по сетке 70x70
+    и пишет их в `ChunkStore` (store_dir) и/или в тайлы `BattleMap` (одинаковые тайлы получают
+    одну текстуру палитры).
+
+    Args:
+        path: Путь к изображению.
+        store_dir (optional): Каталог дискового хранилища фрагментов. None - не сохранять на диск.
+        battle_map (Optional[BattleMap], optional): Карта для тайлов; должна вмещать сетку изображения.
+            Если не задана и store_dir не указан, создается новая карта по размеру изображения.
+        chunk_tiles (int, optional): Сторона фрагмента в тайлах (полоса чтения - один ряд фрагментов).
+        workers (Optional[int], optional): Потоков обработки полос. По умолчанию os.cpu_count().
+        max_working_bytes (int, optional): Ограничение рабочего набора: число одновременно
+            обрабатываемых полос уменьшается, чтобы уложиться в него. Форматы, которые нельзя читать
+            полосами (JPEG, WEBP, сжатый TIFF, чересстрочный или 16-битный PNG; см. описание модуля),
+            декодируются целиком, поэтому их полный RGBA декод (ширина x высота x 4 байта) тоже
+            должен в него помещаться - большие карты в этих форматах сначала преобразуйте
+            в PNG или несжатый BMP/TIFF.
+        progress (Optional[Callable[[int, int], None]], optional): Вызывается с (готово полос, всего полос).
+        max_pixels (Optional[int], optional): Максимум пикселей изображения (явное разрешение на
+            большие карты: 20000x20000 больше ограничения Pillow от "бомб декомпрессии").
+            По умолчанию None (ограничение Pillow, `Image.MAX_IMAGE_PIXELS`).
+
+    Returns:
+        Tuple[Optional[ChunkStore], Optional[BattleMap]]: Хранилище и карта (если были назначением).
+
+    Raises:
+        ValueError: Если изображение больше max_pixels, если его нельзя читать полосами, а полный
+                    декод не помещается в max_working_bytes, или если battle_map меньше сетки изображения.
+    """
+    path = os.fspath(path)
+    reader = _BandReader(path, max_pixels)
+    full_decode_bytes = reader.size[0] * reader.size[1] * 4
+    if not reader.streaming and full_decode_bytes > max_working_bytes:
+        raise ValueError(
+                f"Формат '{path}' читается только целиком: RGBA декод займет {full_decode_bytes} байт, "
+                f"больше max_working_bytes={max_working_bytes}. Сохраните карту в PNG (8 бит на канал, "
+                f"без чересстрочной развертки) или несжатом BMP/TIFF - они читаются полосами - "
+                f"или увеличьте max_working_bytes."
+                )
+    store = ChunkStore(store_dir if store_dir is not None else "", reader.size, chunk_tiles=chunk_tiles)
+    if battle_map is None and store_dir is None:
+        battle_map = BattleMap(*store.map_size_tiles)
+    if battle_map is not None and (battle_map.map_width_tiles < store.map_size_tiles[0] or
+                                   battle_map.map_height_tiles < store.map_size_tiles[1]):
+        raise ValueError(f"Карта {battle_map.map_width_tiles}x{battle_map.map_height_tiles} меньше сетки "
+                         f"изображения {store.map_size_tiles[0]}x{store.map_size_tiles[1]}.")
+    if store_dir is not None:
+        store.write_index()
+
+    band_bytes = store.map_size_tiles[0] * store.tile_size[0] * store.chunk_pixel_size[1] * 4
+    # Полоса читается, режется (копия) и кодируется - в памяти до трех ее копий
+    workers = max(1, min(workers or os.cpu_count() or 1, max_working_bytes // max(1, band_bytes * 3)))
+    total = store.grid_size[1]
+    done = 0
+
+    def process(chunk_row: int) -> Tuple[int, List[Image.Image]]:
+        row, chunks = _cut_band(reader, store, chunk_row)
+        if store_dir is not None:
+            for chunk_col, chunk in enumerate(chunks):
+                store.write_chunk(row, chunk_col, chunk)
+        return row, chunks if battle_map is not None else []
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="battlemap-import") as pool:
+            # Окно из workers полос: следующая полоса отправляется, когда готова предыдущая
+            pending = []
+            rows = iter(range(total))
+            for chunk_row in rows:
+                pending.append(pool.submit(process, chunk_row))
+                if len(pending) >= workers:
+                    break
+            while pending:
+                row, chunks = pending.pop(0).result()
+                if battle_map is not None:
+                    _add_band_tiles(battle_map, store, row, chunks)
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+                next_row = next(rows, None)
+                if next_row is not None:
+                    pending.append(pool.submit(process, next_row))
+    finally:
+        reader.close()
+    return (store if store_dir is not None else None), battle_map
+
+
+def _add_band_tiles(battle_map: BattleMap, store: ChunkStore, chunk_row: int, chunks: List[Image.Image]):
+    """Режет фрагменты ряда на тайлы и записывает их в палитру и ячейки карты (в вызывающем потоке)."""
+    tile_w, tile_h = store.tile_size
+    rows, cols, ids = [], [], []
+    for chunk_col, chunk in enumerate(chunks):
+        x0, y0, _, _ = store.chunk_box(chunk_row, chunk_col)
+        for ty in range(chunk.height // tile_h):
+            for tx in range(chunk.width // tile_w):
+                tile = chunk.crop((tx * tile_w, ty * tile_h, (tx + 1) * tile_w, (ty + 1) * tile_h))
+                rows.append(y0 // tile_h + ty)
+                cols.append(x0 // tile_w + tx)
+                ids.append(battle_map.add_palette_texture(MapTileSprite.prepare_texture(tile), prepared=True))
+    battle_map.set_cells(rows, cols, ids)
@@ -0,0 +1,391 @@
+"""
+Модуль реализует компактный бинарный формат сохранения сцены (карта, токены, слои рендерера).
+
+Структура файла:
+    MAGIC (8 байт) | длина заголовка (uint32 LE) | заголовок JSON (UTF-8) | выравнивание |
+    блобы данных, каждый выровнен по BLOB_ALIGNMENT байт.
+
+Текстуры хранятся один раз по хэшу содержимого в уже подготовленном виде (сырые RGBA байты),
+поэтому при загрузке не требуется декодирование и ресайз. Блобы можно отобразить в память
+(mmap): изображения создаются через `Image.frombuffer` без копирования пикселей.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ..render.sprite import SpriteRenderer
+from ..sprites.animated_sprite import AnimatedSprite, AnimationFrames
+from ..sprites.base_sprite import BaseSprite
+from ..sprites.lazy_texture import BlobRef, LazyTexture
+from ..sprites.map_tile import MapTileSprite
+from ..sprites.token_tile import TokenSize, TokenTileSprite
+from ..types.battle_map import BattleMap
+from ..types.token import OwnerId, Token, TokenId
+
+MAGIC: bytes = b"BMSCENE\x01"
+FORMAT_VERSION: int = 1
+BLOB_ALIGNMENT: int = 64
+_HEADER_LEN = struct.Struct("<I")
+
+
+class Scene:
+    """
+    Контейнер сохраняемой сцены.
+
+    Атрибуты:
+        battle_map (Optional[BattleMap]): Логическая карта (сетка тайлов и блокирующие ячейки).
+        tokens (List[Token]): Токены сцены (в том числе не добавленные в рендерер).
+        renderer (Optional[SpriteRenderer]): Рендерер со слоями и спрайтами.
+    """
+
+    def __init__(
+            self,
+            battle_map: Optional[BattleMap] = None,
+            tokens: Optional[List[Token]] = None,
+            renderer: Optional[SpriteRenderer] = None
+            ):
+        self.battle_map: Optional[BattleMap] = battle_map
+        self.tokens: List[Token] = list(tokens) if tokens is not None else []
+        self.renderer: Optional[SpriteRenderer] = renderer
+
+    def __repr__(self) -> str:
+        return (f"<Scene(map={self.battle_map!r}, tokens={len(self.tokens)}, "
+                f"layers={list(self.renderer.layers) if self.renderer else []})>")
+
+
+def texture_content_hash(image: Image.Image) -> str:
+    """Возвращает хэш содержимого текстуры (режим, размер и пиксели)."""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()[:32]
+
+
+class _BlobWriter:
+    """Накопитель блобов с выравниванием и дедупликацией текстур по хэшу."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size: int = 0
+        self.textures: Dict[str, Dict[str, Any]] = {}
+        self._hash_by_image_id: Dict[int, Tuple[Image.Image, str]] = {}
+
+    def add_blob(self, data: bytes) -> Dict[str, int]:
+        padding = (-self.size) % BLOB_ALIGNMENT
+        if padding:
+            self.chunks.append(b"\0" * padding)
+            self.size += padding
+        offset = self.size
+        self.chunks.append(data)
+        self.size += len(data)
+        return {"offset": offset, "length": len(data)}
+
+    def add_texture(self, image: Image.Image) -> str:
+        cached = self._hash_by_image_id.get(id(image))
+        if cached is not None and cached[0] is image:
+            return cached[1]
+        rgba = image if image.mode == "RGBA" else image.convert("RGBA")
+        texture_hash = texture_content_hash(rgba)
+        if texture_hash not in self.textures:
+            entry = self.add_blob(rgba.tobytes())
+            entry["size"] = [rgba.width, rgba.height]
+            self.textures[texture_hash] = entry
+        self._hash_by_image_id[id(image)] = (image, texture_hash)
+        return texture_hash
+
+
+def _sprite_record(sprite: BaseSprite, blobs: _BlobWriter) -> Dict[str, Any]:
+    # У токенов сохраняется наибольшая подготовленная текстура: при загрузке из нее заново
+    # готовятся все размеры без апскейла основной 70x70
+    texture = sprite.source_texture() if isinstance(sprite, TokenTileSprite) else sprite.image
+    record: Dict[str, Any] = {
+        "texture": blobs.add_texture(texture),
+        "x": sprite.x,
+        "y": sprite.y,
+        "name": sprite.name,
+        "visible": sprite.visible,
+        }
+    if isinstance(sprite, Token):
+        record.update(
+                kind="token", token_id=int(sprite.token_id), owner_ids=[int(o) for o in sprite.owner_ids],
+                token_size=sprite.token_size_enum.name
+                )
+    elif isinstance(sprite, TokenTileSprite):
+        record.update(kind="token_tile", token_size=sprite.token_size_enum.name)
+    elif isinstance(sprite, MapTileSprite):
+        record["kind"] = "map_tile"
+    elif isinstance(sprite, AnimatedSprite) and sprite.texture_is_shared:
+        # Кадры хранятся как обычные текстуры (повторяющиеся - один раз); время проигрывания
+        # не сохраняется - после загрузки анимация начинается заново
+        animation = sprite.animation
+        record.update(
+                kind="animated", frames=[blobs.add_texture(frame) for frame in animation.frames],
+                durations=list(animation.durations), loop=animation.loop, speed=sprite.speed
+                )
+    else:
+        record["kind"] = "base"
+    return record
+
+
+def save_scene(path: str | os.PathLike, scene: Scene) -> int:
+    """
+    Сохраняет сцену в бинарный файл. Запись атомарная (через временный файл).
+
+    Args:
+        path (str | os.PathLike): Путь к файлу сцены.
+        scene (Scene): Сохраняемая сцена.
+
+    Returns:
+        int: Размер записанного файла в байтах.
+
+    Raises:
+        ValueError: Если слой рендерера запекает карту, отличную от `scene.battle_map`.
+    """
+    blobs = _BlobWriter()
+    sprite_records: List[Dict[str, Any]] = []
+    sprite_indices: Dict[int, int] = {}
+    recorded_sprites: List[BaseSprite] = []
+
+    def sprite_index(sprite: BaseSprite) -> int:
+        index = sprite_indices.get(id(sprite))
+        if index is None:
+            index = len(sprite_records)
+            sprite_records.append(_sprite_record(sprite, blobs))
+            sprite_indices[id(sprite)] = index
+            recorded_sprites.append(sprite)
+        return index
+
+    battle_map = scene.battle_map
+    header: Dict[str, Any] = {"version": FORMAT_VERSION}
+
+    renderer = scene.renderer
+    if renderer is not None:
+        if battle_map is None:
+            # Если карта не задана явно, сохраняем карту запеченного слоя
+            for layer_data in renderer.layers.values():
+                if layer_data.get('baked_map') is not None:
+                    battle_map = layer_data['baked_map'].battle_map
+                    break
+        layers = []
+        for layer_name, layer_data in renderer.layers.items():
+            baked_map = layer_data.get('baked_map')
+            if baked_map is not None and baked_map.battle_map is not battle_map:
+                raise ValueError(f"Слой '{layer_name}' запекает карту, отличную от карты сцены.")
+            layers.append({
+                "name": layer_name,
+                "z_index": layer_data['z_index'],
+                "visible": layer_data['visible'],
+                "battle_map": baked_map is not None,
+                "sprites": [sprite_index(sprite) for sprite in layer_data['sprites']],
+                })
+        header["renderer"] = {
+            "width": renderer.width,
+            "height": renderer.height,
+            "background_color": list(renderer.background_color),
+            "grid_color": list(renderer.grid_color),
+            "label_color": list(renderer.label_color),
+            "label_font_path": renderer.label_font_path,
+            "label_font_size": renderer.label_font_size,
+            "layers": layers,
+            }
+
+    header["tokens"] = [sprite_index(token) for token in scene.tokens]
+
+    if battle_map is not None:
+        header["map"] = {
+            "width": battle_map.map_width_tiles,
+            "height": battle_map.map_height_tiles,
+            # Текущие текстуры явно установленных тайлов сохраняются как элементы палитры
+            "palette": [blobs.add_texture(texture) for texture in battle_map.palette],
+            "tile_indices": blobs.add_blob(battle_map.tile_indices.astype("<i4").tobytes()),
+            "blocking": blobs.add_blob(np.packbits(battle_map.blocking, axis=None).tobytes()),
+            "explicit_tiles": [
+                [row, col, blobs.add_texture(battle_map.get_cell_texture(row, col))]
+                for (row, col) in battle_map.explicit_tile_cells()
+                ],
+            }
+
+    # Группы токенов: связь с родителем сохраняется, если родитель тоже есть в сцене
+    for sprite, record in zip(recorded_sprites, sprite_records):
+        if isinstance(sprite, Token) and sprite.parent is not None and id(sprite.parent) in sprite_indices:
+            record["parent"] = sprite_indices[id(sprite.parent)]
+
+    header["sprites"] = sprite_records
+    header["textures"] = blobs.textures
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    prefix_len = len(MAGIC) + _HEADER_LEN.size + len(header_bytes)
+    data_start = prefix_len + (-prefix_len) % BLOB_ALIGNMENT
+
+    directory = os.path.dirname(os.fspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(os.fspath(path))}.", suffix=".tmp",
+                                    dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(_HEADER_LEN.pack(len(header_bytes)))
+            f.write(header_bytes)
+            f.write(b"\0" * (data_start - prefix_len))
+            for chunk in blobs.chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return data_start + blobs.size
+
+
+def _read_header(data: bytes | mmap.mmap) -> Tuple[Dict[str, Any], int]:
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Файл не является сценой BattleMap (неверная сигнатура).")
+    (header_len,) = _HEADER_LEN.unpack_from(data, len(MAGIC))
+    header_start = len(MAGIC) + _HEADER_LEN.size
+    header = json.loads(bytes(data[header_start:header_start + header_len]).decode("utf-8"))
+    if header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия формата сцены: {header.get('version')}.")
+    prefix_len = header_start + header_len
+    return header, prefix_len + (-prefix_len) % BLOB_ALIGNMENT
+
+
+def load_scene(path: str | os.PathLike, use_mmap: bool = True, lazy_textures: bool = False) -> Scene:
+    """
+    Загружает сцену из бинарного файла.
+
+    Args:
+        path (str | os.PathLike): Путь к файлу сцены.
+        use_mmap (bool, optional): Если True, текстуры ссылаются на отображенный в память
+                                   файл без копирования (изображения доступны только для чтения,
+                                   при изменении Pillow создаст копию). По умолчанию True.
+        lazy_textures (bool, optional): Если True, спрайты получают `LazyTexture` со ссылкой
+                                        на блоб файла и декодируются только при отрисовке
+                                        (под бюджетом общего кэша текстур). Палитра карты
+                                        и кадры анимаций загружаются сразу. По умолчанию False.
+
+    Returns:
+        Scene: Восстановленная сцена.
+
+    Raises:
+        ValueError: Если файл поврежден или имеет неподдерживаемую версию.
+    """
+    with open(path, "rb") as f:
+        if use_mmap:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = f.read()
+
+    header, data_start = _read_header(data)
+    view = memoryview(data)
+
+    def blob(entry: Dict[str, int]) -> memoryview:
+        start = data_start + entry["offset"]
+        return view[start:start + entry["length"]]
+
+    textures: Dict[str, Image.Image] = {}
+
+    def texture(texture_hash: str) -> Image.Image:
+        image = textures.get(texture_hash)
+        if image is None:
+            entry = header["textures"][texture_hash]
+            image = Image.frombuffer("RGBA", tuple(entry["size"]), blob(entry), "raw", "RGBA", 0, 1)
+            textures[texture_hash] = image
+        return image
+
+    battle_map: Optional[BattleMap] = None
+    map_header = header.get("map")
+    if map_header is not None:
+        width, height = map_header["width"], map_header["height"]
+        battle_map = BattleMap(width, height)
+        # Элементы палитры с одинаковым содержимым загружаются одним объектом и сливаются
+        # в палитре карты: сохраненные индексы переводятся в индексы загруженной палитры
+        remap = np.array([battle_map.add_palette_texture(texture(texture_hash), prepared=True)
+                          for texture_hash in map_header["palette"]], dtype=np.int32)
+        indices = np.frombuffer(blob(map_header["tile_indices"]), dtype="<i4").reshape(height, width)
+        blocking = np.unpackbits(np.frombuffer(blob(map_header["blocking"]), dtype=np.uint8),
+                                 count=width * height).reshape(height, width)
+        battle_map.set_blocking_mask(blocking)
+        filled_rows, filled_cols = np.nonzero(indices != BattleMap.EMPTY_TILE)
+        battle_map.set_cells(filled_rows, filled_cols, remap[indices[filled_rows, filled_cols]])
+        for row, col, texture_hash in map_header["explicit_tiles"]:
+            battle_map.set_tile(row, col, MapTileSprite(texture(texture_hash), shared_texture=True,
+                                                        name=f"map_tile_{row}_{col}"))
+
+    lazy: Dict[str, LazyTexture] = {}
+
+    def sprite_texture(texture_hash: str) -> Image.Image | LazyTexture:
+        if not lazy_textures:
+            return texture(texture_hash)
+        handle = lazy.get(texture_hash)
+        if handle is None:
+            entry = header["textures"][texture_hash]
+            handle = LazyTexture(BlobRef(path, data_start + entry["offset"], tuple(entry["size"])),
+                                 target_size=tuple(entry["size"]))
+            lazy[texture_hash] = handle
+        return handle
+
+    animations: Dict[Tuple[str, ...], AnimationFrames] = {}
+
+    def animation(record: Dict[str, Any]) -> AnimationFrames:
+        # Спрайты с одинаковыми кадрами снова разделяют один объект анимации
+        key = tuple(record["frames"])
+        frames = animations.get(key)
+        if frames is None:
+            frames = AnimationFrames([texture(texture_hash) for texture_hash in key], record["durations"],
+                                     record["loop"])
+            animations[key] = frames
+        return frames
+
+    sprites: List[BaseSprite] = []
+    for record in header["sprites"]:
+        kind = record["kind"]
+        x, y, name = record["x"], record["y"], record["name"]
+        # Кадры анимации загружаются сразу (и при lazy_textures): переключаются каждый тик
+        image = sprite_texture(record["texture"]) if kind != "animated" else None
+        if kind == "animated":
+            sprite = AnimatedSprite(animation(record), x, y, name, speed=record["speed"])
+        elif kind == "token":
+            sprite = Token(
+                    image, TokenSize[record["token_size"]], TokenId(record["token_id"]),
+                    owner_ids=[OwnerId(o) for o in record["owner_ids"]],
+                    x=x, y=y, name=name, shared_texture=True
+                    )
+        elif kind == "token_tile":
+            sprite = TokenTileSprite(image, TokenSize[record["token_size"]], x=x, y=y, name=name, shared_texture=True)
+        elif kind == "map_tile":
+            sprite = MapTileSprite(image, x, y, name, shared_texture=True)
+        else:
+            sprite = BaseSprite(image, x, y, name, shared_texture=True)
+        sprite.visible = record["visible"]
+        sprites.append(sprite)
+    for record, sprite in zip(header["sprites"], sprites):
+        if "parent" in record:
+            sprites[record["parent"]].attach_child(sprite)
+
+    renderer: Optional[SpriteRenderer] = None
+    renderer_header = header.get("renderer")
+    if renderer_header is not None:
+        renderer = SpriteRenderer(
+                renderer_header["width"], renderer_header["height"],
+                background_color=tuple(renderer_header["background_color"]),
+                grid_color=tuple(renderer_header["grid_color"]),
+                label_color=tuple(renderer_header["label_color"]),
+                label_font_path=renderer_header["label_font_path"],
+                label_font_size=renderer_header["label_font_size"]
+                )
+        for layer in renderer_header["layers"]:
+            if layer["battle_map"] and battle_map is not None:
+                renderer.add_battle_map_layer(layer["name"], battle_map, layer["z_index"], layer["visible"])
+            else:
+                renderer.add_layer(layer["name"], layer["z_index"], layer["visible"])
+            for index in layer["sprites"]:
+                renderer.add_sprite(layer["name"], sprites[index])
+
+    tokens = [sprites[index] for index in header["tokens"]]
+    return Scene(battle_map=battle_map, tokens=tokens, renderer=renderer)
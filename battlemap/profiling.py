@@ -0,0 +1,315 @@
+"""
+Модуль реализует профилирование конвейера рендеринга: запись интервалов (spans) и экспорт
+в формат Chrome trace-event JSON, который открывается офлайн в chrome://tracing или Perfetto.
+
+Запись включается вызовом `enable_tracing()` или переменной окружения BATTLEMAP_TRACE:
+    BATTLEMAP_TRACE=1               - писать трассу при выходе в battlemap-trace-<pid>.json;
+    BATTLEMAP_TRACE=/path/out.json  - писать трассу при выходе в указанный файл.
+Пока запись выключена, `trace_span` и `traced` стоят одной проверки флага.
+
+`profile_render` профилирует один рендер целиком: трасса интервалов, cProfile
+(файл .prof для pstats/snakeviz) и tracemalloc (Python-выделения; пиксельные буферы
+Pillow выделяются в C и tracemalloc не видны - для них см. `SpriteRenderer.memory_report`).
+"""
+import atexit
+import contextlib
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, TypeVar
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+TRACE_ENV_VAR = "BATTLEMAP_TRACE"
+
+
+class Tracer:
+    """
+    Накопитель интервалов для Chrome trace-event JSON. Потокобезопасен.
+
+    Каждый интервал - событие "X" (complete) с именем, категорией, потоком, началом и длительностью
+    в микросекундах и необязательными аргументами. Хранится не больше max_events последних событий.
+
+    Атрибуты:
+        enabled (bool): Записываются ли интервалы.
+        max_events (int): Максимум хранимых событий.
+    """
+
+    def __init__(self, enabled: bool = False, max_events: int = 1_000_000):
+        if max_events <= 0:
+            raise ValueError("Максимальное число событий трассы должно быть положительным.")
+        self.enabled: bool = enabled
+        self.max_events: int = max_events
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self._thread_names: Dict[int, str] = {}
+        self._epoch_ns: int = time.perf_counter_ns()
+        self._pid: int = os.getpid()
+        self._lock = threading.Lock()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter_ns() - self._epoch_ns) / 1000.0
+
+    def _append(self, event: Dict[str, Any]):
+        tid = threading.get_ident()
+        event["pid"] = self._pid
+        event["tid"] = tid
+        with self._lock:
+            if tid not in self._thread_names:
+                self._thread_names[tid] = threading.current_thread().name
+            self._events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name: str, cat: str = "battlemap", **args: Any):
+        """Записывает интервал выполнения блока with (безусловно, флаг enabled проверяет `trace_span`)."""
+        start = self._now_us()
+        try:
+            yield
+        finally:
+            event = {"name": name, "cat": cat, "ph": "X", "ts": start, "dur": self._now_us() - start}
+            if args:
+                event["args"] = args
+            self._append(event)
+
+    def instant(self, name: str, cat: str = "battlemap", **args: Any):
+        """Записывает мгновенное событие (например, выгрузку кэша)."""
+        if not self.enabled:
+            return
+        event = {"name": name, "cat": cat, "ph": "i", "s": "t", "ts": self._now_us()}
+        if args:
+            event["args"] = args
+        self._append(event)
+
+    def counter(self, name: str, values: Dict[str, float], cat: str = "battlemap"):
+        """Записывает значения счетчика (график в просмотрщике, например объем памяти)."""
+        if not self.enabled:
+            return
+        self._append({"name": name, "cat": cat, "ph": "C", "ts": self._now_us(), "args": dict(values)})
+
+    def events(self) -> List[Dict[str, Any]]:
+        """Возвращает копию записанных событий."""
+        with self._lock:
+            return list(self._events)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def to_chrome_trace(self, events: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Возвращает трассу в формате Chrome trace-event (объект с traceEvents)."""
+        events = self.events() if events is None else events
+        with self._lock:
+            thread_names = dict(self._thread_names)
+        metadata = [{"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid, "args": {"name": name}}
+                    for tid, name in thread_names.items()]
+        metadata.append({"name": "process_name", "ph": "M", "pid": self._pid, "tid": 0,
+                         "args": {"name": "battlemap"}})
+        return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str | os.PathLike, events: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        Сохраняет трассу в JSON файл (атомарно, через временный файл).
+
+        Returns:
+            str: Путь к файлу.
+        """
+        path = os.fspath(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(events), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def __repr__(self) -> str:
+        return f"<Tracer(enabled={self.enabled}, events={len(self._events)})>"
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    """Возвращает общий для процесса трассировщик."""
+    return _tracer
+
+
+def enable_tracing():
+    _tracer.enabled = True
+
+
+def disable_tracing():
+    _tracer.enabled = False
+
+
+def tracing_enabled() -> bool:
+    return _tracer.enabled
+
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def trace_span(name: str, cat: str = "battlemap", **args: Any):
+    """
+    Контекстный менеджер интервала общего трассировщика. Если запись выключена,
+    возвращает общий пустой контекст.
+    """
+    if not _tracer.enabled:
+        return _NULL_SPAN
+    return _tracer.span(name, cat, **args)
+
+
+def traced(name: Optional[str] = None, cat: str = "battlemap") -> Callable[[F], F]:
+    """Декоратор: записывает интервал каждого вызова функции (по умолчанию с именем ее __qualname__)."""
+
+    def decorate(func: F) -> F:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return func(*args, **kwargs)
+            with _tracer.span(span_name, cat):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+class RenderProfile:
+    """
+    Результат `profile_render`.
+
+    Атрибуты:
+        image (Any): Результат рендера.
+        wall_time (float): Время рендера в секундах.
+        events (List[Dict[str, Any]]): Интервалы этого рендера (Chrome trace-event).
+        stats (Optional[pstats.Stats]): Статистика cProfile.
+        memory_peak (Optional[int]): Пик Python-выделений (tracemalloc) в байтах.
+        memory_top (List[str]): Крупнейшие места Python-выделений.
+        files (Dict[str, str]): Сохраненные файлы: "trace", "cprofile", "tracemalloc".
+    """
+
+    def __init__(self):
+        self.image: Any = None
+        self.wall_time: float = 0.0
+        self.events: List[Dict[str, Any]] = []
+        self.stats: Optional[pstats.Stats] = None
+        self.memory_peak: Optional[int] = None
+        self.memory_top: List[str] = []
+        self.files: Dict[str, str] = {}
+
+    def format_stats(self, limit: int = 25, sort: str = "cumulative") -> str:
+        """Текстовая таблица cProfile (limit самых дорогих функций)."""
+        if self.stats is None:
+            return ""
+        stream = io.StringIO()
+        self.stats.stream = stream
+        self.stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def __repr__(self) -> str:
+        return (f"<RenderProfile(wall={self.wall_time:.4f}s, events={len(self.events)}, "
+                f"memory_peak={self.memory_peak}, files={list(self.files)})>")
+
+
+def profile_render(
+        renderer: Any,
+        output_prefix: Optional[str | os.PathLike] = None,
+        cprofile: bool = True,
+        memory: bool = False,
+        memory_top: int = 20,
+        **render_kwargs: Any
+        ) -> RenderProfile:
+    """
+    Выполняет один `renderer.render(**render_kwargs)` под трассировкой и (опционально)
+    cProfile и tracemalloc.
+
+    Args:
+        renderer: Объект с методом render (например, `SpriteRenderer` или его снимок).
+        output_prefix (optional): Префикс файлов результата: <prefix>.trace.json,
+            <prefix>.prof и <prefix>.tracemalloc.txt. None - ничего не сохранять.
+        cprofile (bool, optional): Снять профиль cProfile. По умолчанию True.
+        memory (bool, optional): Снять tracemalloc (заметно замедляет рендер). По умолчанию False.
+        memory_top (int, optional): Сколько мест выделений сохранить.
+        **render_kwargs: Аргументы render.
+
+    Returns:
+        RenderProfile: Результат с изображением и собранными данными.
+    """
+    result = RenderProfile()
+    was_enabled = _tracer.enabled
+    _tracer.enabled = True
+    started_tracemalloc = memory and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    if memory:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile() if cprofile else None
+    first_ts = _tracer._now_us()
+    try:
+        if profiler is not None:
+            profiler.enable()
+        started = time.perf_counter()
+        with _tracer.span("profile_render", "profile"):
+            result.image = renderer.render(**render_kwargs)
+        result.wall_time = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+        if hasattr(renderer, "memory_report"):
+            # Объем пикселей сцены по категориям - счетчик рядом с интервалами кадра
+            _tracer.counter("memory", renderer.memory_report().totals(), "memory")
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            result.memory_peak = tracemalloc.get_traced_memory()[1]
+            result.memory_top = [str(stat) for stat in snapshot.statistics("lineno")[:memory_top]]
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _tracer.enabled = was_enabled
+
+    result.events = [event for event in _tracer.events() if event.get("ts", 0) >= first_ts]
+    if profiler is not None:
+        result.stats = pstats.Stats(profiler)
+    if output_prefix is not None:
+        prefix = os.fspath(output_prefix)
+        result.files["trace"] = _tracer.export_chrome_trace(f"{prefix}.trace.json", result.events)
+        if profiler is not None:
+            profiler.dump_stats(f"{prefix}.prof")
+            result.files["cprofile"] = f"{prefix}.prof"
+        if memory:
+            with open(f"{prefix}.tracemalloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"peak {result.memory_peak} bytes\n")
+                f.write("\n".join(result.memory_top) + "\n")
+            result.files["tracemalloc"] = f"{prefix}.tracemalloc.txt"
+    return result
+
+
+def _export_at_exit(path: str):
+    if len(_tracer):
+        _tracer.export_chrome_trace(path)
+
+
+def _configure_from_env():
+    value = os.environ.get(TRACE_ENV_VAR, "").strip()
+    if not value or value.lower() in ("0", "false", "no", "off"):
+        return
+    path = f"battlemap-trace-{os.getpid()}.json" if value.lower() in ("1", "true", "yes", "on") else value
+    enable_tracing()
+    atexit.register(_export_at_exit, path)
+
+
+_configure_from_env()
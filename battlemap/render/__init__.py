@@ -1 +1,8 @@
+from .atlas import AtlasRegion, TextureAtlas
+from .dirty import DirtyTracker
+from .memory import (MemoryBudget, MemoryBudgetExceededError, MemoryBudgetWarning, MemoryReport, battle_map_memory,
+                     process_memory, renderer_memory, sprites_memory)
+from .progressive import RenderPass
+from .quality import RenderQuality
 from .sprite import SpriteRenderer
+from .worker import RenderWorker
@@ -3,7 +3,10 @@ from typing import Optional, Tuple
 
 from PIL import Image, ImageDraw
 
+from ..profiling import traced
 
+
+@traced("create_arrow_image", "render")
 def create_arrow_image(
         start_xy: Tuple[int, int],
         end_xy: Tuple[int, int],
@@ -0,0 +1,310 @@
+"""
+Модуль предоставляет TextureAtlas - упаковку небольших текстур токенов в общие страницы.
+"""
+import weakref
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from PIL import Image
+
+from ..sprites.animated_sprite import AnimationFrames
+from ..sprites.token_tile import TokenSize, TokenTileSprite
+
+
+class AtlasRegion:
+    """
+    Прямоугольная область страницы атласа, занятая одной текстурой.
+
+    Атрибуты:
+        page (Image.Image): RGBA изображение страницы атласа.
+        page_index (int): Номер страницы в атласе.
+        box (Tuple[int, int, int, int]): Область (left, top, right, bottom) на странице.
+    """
+
+    def __init__(self, page: Image.Image, page_index: int, box: Tuple[int, int, int, int]):
+        self.page: Image.Image = page
+        self.page_index: int = page_index
+        self.box: Tuple[int, int, int, int] = box
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Размер области (ширина, высота) в пикселях."""
+        return self.box[2] - self.box[0], self.box[3] - self.box[1]
+
+    def image(self) -> Image.Image:
+        """Возвращает копию текстуры области в виде отдельного изображения."""
+        return self.page.crop(self.box)
+
+    def __repr__(self) -> str:
+        return f"<AtlasRegion(page={self.page_index}, box={self.box})>"
+
+
+class _Shelf:
+    """Горизонтальная полка страницы: ряд текстур одинаковой (не большей) высоты."""
+
+    def __init__(self, top: int, height: int):
+        self.top: int = top
+        self.height: int = height
+        self.cursor_x: int = 0
+
+
+class _AtlasPage:
+    def __init__(self, page_size: int):
+        self.image: Image.Image = Image.new("RGBA", (page_size, page_size), (0, 0, 0, 0))
+        self.shelves: List[_Shelf] = []
+        self.next_shelf_top: int = 0
+        self.used_area: int = 0
+
+
+class TextureAtlas:
+    """
+    Менеджер атласа: упаковывает текстуры в несколько больших RGBA страниц (алгоритм полок).
+
+    Вместо сотен отдельных маленьких изображений спрайты ссылаются на области
+    общих страниц (`AtlasRegion`), а рендерер копирует пиксели прямо из страницы.
+    Для токенов (`pack_token`) в атлас кладутся заранее отмасштабированные варианты
+    текстуры под каждый `TokenSize`, поэтому при отрисовке ресайз не нужен;
+    для анимаций (`pack_animation`) - все кадры.
+
+    Области текстур, исходные объекты которых (текстура токена, анимация) собраны
+    сборщиком мусора, освобождаются `collect` - он вызывается и автоматически перед
+    созданием новой страницы. Если живые области занимают меньше REPACK_RATIO выделенной
+    площади, они переупаковываются в новые страницы; объекты `AtlasRegion` при этом
+    остаются прежними (меняются их страница и область), так что ссылки токенов действительны.
+
+    Атрибуты класса:
+        REPACK_RATIO (float): Доля занятой площади, ниже которой `collect` переупаковывает страницы.
+
+    Атрибуты:
+        page_size (int): Сторона квадратной страницы в пикселях.
+        padding (int): Отступ между текстурами (защита от "протекания" соседних пикселей).
+    """
+    REPACK_RATIO: float = 0.5
+
+    def __init__(self, page_size: int = 2048, padding: int = 1):
+        """
+        Инициализирует TextureAtlas.
+
+        Args:
+            page_size (int, optional): Размер страницы. По умолчанию 2048.
+            padding (int, optional): Отступ между текстурами. По умолчанию 1.
+
+        Raises:
+            ValueError: Если page_size не положительный или padding отрицательный.
+        """
+        if page_size <= 0 or padding < 0:
+            raise ValueError("Размер страницы атласа должен быть положительным, а отступ - неотрицательным.")
+        self.page_size: int = page_size
+        self.padding: int = padding
+        self._pages: List[_AtlasPage] = []
+        self._regions: Dict[Hashable, AtlasRegion] = {}
+        # id(исходной текстуры) -> (слабая ссылка, ключи ее вариантов в атласе)
+        self._token_sources: Dict[int, Tuple[weakref.ref, Dict[Tuple[int, int], Hashable]]] = {}
+        # id(анимации) -> (слабая ссылка, области кадров или None, если кадры не помещаются в страницу,
+        #                 ключи областей в атласе)
+        self._animation_sources: Dict[int, Tuple[weakref.ref, Optional[List[AtlasRegion]], List[Hashable]]] = {}
+        self._repacking: bool = False
+
+    @property
+    def pages(self) -> List[Image.Image]:
+        """Изображения страниц атласа."""
+        return [page.image for page in self._pages]
+
+    def _allocate(self, width: int, height: int) -> Tuple[int, int, int]:
+        """Находит место под прямоугольник: возвращает (номер страницы, x, y)."""
+        padded_w, padded_h = width + self.padding, height + self.padding
+        if padded_w > self.page_size or padded_h > self.page_size:
+            raise ValueError(
+                    f"Текстура {width}x{height} не помещается в страницу атласа {self.page_size}x{self.page_size}."
+                    )
+        for page_index, page in enumerate(self._pages):
+            # Подходящая полка: достаточно высокая, но не слишком (чтобы не терять место)
+            for shelf in page.shelves:
+                if padded_h <= shelf.height <= padded_h * 2 and shelf.cursor_x + padded_w <= self.page_size:
+                    x = shelf.cursor_x
+                    shelf.cursor_x += padded_w
+                    return page_index, x, shelf.top
+            if page.next_shelf_top + padded_h <= self.page_size:
+                shelf = _Shelf(page.next_shelf_top, padded_h)
+                page.shelves.append(shelf)
+                page.next_shelf_top += padded_h
+                shelf.cursor_x = padded_w
+                return page_index, 0, shelf.top
+        if self._pages and not self._repacking and self.collect():
+            # Освобожденное место могло вместить текстуру без новой страницы
+            return self._allocate(width, height)
+        page = _AtlasPage(self.page_size)
+        self._pages.append(page)
+        shelf = _Shelf(0, padded_h)
+        page.shelves.append(shelf)
+        page.next_shelf_top = padded_h
+        shelf.cursor_x = padded_w
+        return len(self._pages) - 1, 0, 0
+
+    def add(self, key: Hashable, image: Image.Image) -> AtlasRegion:
+        """
+        Добавляет текстуру в атлас под ключом. Если ключ уже есть, возвращает существующую область.
+
+        Args:
+            key (Hashable): Ключ текстуры.
+            image (Image.Image): Изображение (будет приведено к RGBA).
+
+        Returns:
+            AtlasRegion: Область атласа с текстурой.
+
+        Raises:
+            ValueError: Если текстура больше страницы атласа.
+        """
+        region = self._regions.get(key)
+        if region is not None:
+            return region
+        rgba = image if image.mode == "RGBA" else image.convert("RGBA")
+        page_index, x, y = self._allocate(rgba.width, rgba.height)
+        page = self._pages[page_index]
+        page.image.paste(rgba, (x, y))
+        page.used_area += rgba.width * rgba.height
+        region = AtlasRegion(page.image, page_index, (x, y, x + rgba.width, y + rgba.height))
+        self._regions[key] = region
+        return region
+
+    def get(self, key: Hashable) -> Optional[AtlasRegion]:
+        """Возвращает область по ключу или None."""
+        return self._regions.get(key)
+
+    def remove(self, key: Hashable) -> bool:
+        """
+        Освобождает область по ключу. Место на странице переиспользуется после
+        переупаковки (см. `collect`).
+
+        Returns:
+            bool: True, если область была в атласе.
+        """
+        region = self._regions.pop(key, None)
+        if region is None:
+            return False
+        width, height = region.size
+        self._pages[region.page_index].used_area -= width * height
+        return True
+
+    def collect(self) -> bool:
+        """
+        Освобождает области текстур токенов и анимаций, собранных сборщиком мусора,
+        и переупаковывает страницы, если живые области занимают меньше REPACK_RATIO
+        выделенной площади (пустой атлас теряет все страницы).
+
+        Returns:
+            bool: True, если после переупаковки страниц стало меньше.
+        """
+        for sources in (self._token_sources, self._animation_sources):
+            for source_id in [source_id for source_id, cached in sources.items() if cached[0]() is None]:
+                cached = sources.pop(source_id)
+                keys = cached[1].values() if sources is self._token_sources else cached[2]
+                for key in keys:
+                    self.remove(key)
+        pages_count = len(self._pages)
+        used_area = sum(page.used_area for page in self._pages)
+        if pages_count == 0 or (pages_count == 1 and used_area) \
+                or used_area >= self.REPACK_RATIO * pages_count * self.page_size * self.page_size:
+            # Одну занятую страницу переупаковка не сократит
+            return False
+        self._repack()
+        return len(self._pages) < pages_count
+
+    def _repack(self):
+        """Переносит живые области в новые плотно упакованные страницы (высокие - первыми)."""
+        old_pages = self._pages
+        self._pages = []
+        self._repacking = True
+        try:
+            for region in sorted(self._regions.values(), key=lambda r: (r.size[1], r.size[0]), reverse=True):
+                width, height = region.size
+                page_index, x, y = self._allocate(width, height)
+                page = self._pages[page_index]
+                page.image.paste(old_pages[region.page_index].image.crop(region.box), (x, y))
+                page.used_area += width * height
+                region.page, region.page_index, region.box = page.image, page_index, (x, y, x + width, y + height)
+        finally:
+            self._repacking = False
+
+    def pack_token(self, token: TokenTileSprite) -> Dict[Tuple[int, int], AtlasRegion]:
+        """
+        Упаковывает текстуру токена и ее варианты под все `TokenSize` в атлас и
+        сохраняет области в `token.atlas_regions` (ключ - логический размер в пикселях).
+        Токены с одинаковой (тем же объектом) текстурой разделяют области атласа.
+
+        Returns:
+            Dict[Tuple[int, int], AtlasRegion]: Области по логическим размерам.
+        """
+        texture = token.image
+        cached = self._token_sources.get(id(texture))
+        if cached is None or cached[0]() is not texture:
+            variant_keys: Dict[Tuple[int, int], Hashable] = {}
+            for token_size in TokenSize:
+                logical_size = token_size.get_logical_pixel_dimensions()
+                if logical_size in variant_keys:
+                    continue
+                key = ("token", id(texture), logical_size)
+                self.remove(key)  # id мог быть переиспользован после сборки мусора
+                # Подготовленная токеном текстура размера (из исходного изображения, а не из 70x70)
+                self.add(key, token.texture_for_size(logical_size))
+                variant_keys[logical_size] = key
+            cached = (weakref.ref(texture), variant_keys)
+            self._token_sources[id(texture)] = cached
+        regions = {size: self._regions[key] for size, key in cached[1].items()}
+        token.atlas_regions = regions
+        return regions
+
+    def animation_regions(self, animation: AnimationFrames) -> Optional[List[AtlasRegion]]:
+        """Возвращает области кадров уже упакованной анимации или None."""
+        cached = self._animation_sources.get(id(animation))
+        if cached is None or cached[0]() is not animation:
+            return None
+        return cached[1]
+
+    def pack_animation(self, animation: AnimationFrames) -> Optional[List[AtlasRegion]]:
+        """
+        Упаковывает все кадры анимации в атлас (один раз на объект `AnimationFrames`;
+        повторяющиеся кадры анимации - одна общая текстура - занимают одну область).
+
+        Returns:
+            Optional[List[AtlasRegion]]: Области кадров по порядку или None, если кадр
+                не помещается в страницу атласа (тогда кадры рисуются напрямую).
+        """
+        cached = self._animation_sources.get(id(animation))
+        if cached is not None and cached[0]() is animation:
+            return cached[1]
+        width, height = animation.size
+        regions: Optional[List[AtlasRegion]] = None
+        keys: List[Hashable] = []
+        if width + self.padding <= self.page_size and height + self.padding <= self.page_size:
+            regions = []
+            by_frame: Dict[int, AtlasRegion] = {}
+            for index, frame in enumerate(animation.frames):
+                region = by_frame.get(id(frame))
+                if region is None:
+                    key = ("animation", id(animation), index)
+                    self.remove(key)  # id мог быть переиспользован после сборки мусора
+                    region = by_frame[id(frame)] = self.add(key, frame)
+                    keys.append(key)
+                regions.append(region)
+        self._animation_sources[id(animation)] = (weakref.ref(animation), regions, keys)
+        return regions
+
+    def clear(self):
+        """Удаляет все страницы и области. Ссылки токенов на области нужно сбросить отдельно."""
+        self._pages.clear()
+        self._regions.clear()
+        self._token_sources.clear()
+        self._animation_sources.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Возвращает статистику: число страниц, областей и долю занятой площади."""
+        total_area = len(self._pages) * self.page_size * self.page_size
+        used_area = sum(page.used_area for page in self._pages)
+        return {
+            "pages": len(self._pages),
+            "regions": len(self._regions),
+            "fill_ratio": used_area / total_area if total_area else 0.0,
+            }
+
+    def __repr__(self) -> str:
+        return f"<TextureAtlas(page_size={self.page_size}, pages={len(self._pages)}, regions={len(self._regions)})>"
@@ -0,0 +1,165 @@
+"""
+Модуль предоставляет BakedMapLayer - запеченный фон BattleMap для SpriteRenderer.
+"""
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from ..types.battle_map import BattleMap
+
+
+class BakedMapLayer:
+    """
+    Фоновое изображение карты, собранное из тайлов BattleMap один раз.
+
+    При последующих обновлениях перерисовываются только ячейки, измененные
+    с момента прошлой сборки (по журналу `BattleMap.changes_since`).
+    Рендерер накладывает результат одной операцией paste; если все ячейки
+    заполнены непрозрачными текстурами, наложение выполняется без маски.
+
+    Атрибуты:
+        battle_map (BattleMap): Источник тайлов.
+        image (Optional[Image.Image]): Запеченное RGBA изображение всей карты.
+        opaque (bool): True, если изображение полностью непрозрачно.
+    """
+
+    def __init__(self, battle_map: BattleMap):
+        """
+        Инициализирует BakedMapLayer.
+
+        Args:
+            battle_map (BattleMap): Карта, тайлы которой будут запечены.
+
+        Raises:
+            TypeError: Если battle_map не является экземпляром BattleMap.
+        """
+        if not isinstance(battle_map, BattleMap):
+            raise TypeError("Источник слоя должен быть экземпляром BattleMap.")
+        self.battle_map: BattleMap = battle_map
+        self.image: Optional[Image.Image] = None
+        self.opaque: bool = False
+        self._revision: int = -1
+        # id(текстуры) -> (слабая ссылка на текстуру, полностью непрозрачна)
+        self._opaque_textures: Dict[int, Tuple[weakref.ref, bool]] = {}
+        # Уменьшенные копии для грубых проходов: коэффициент -> (ревизия, изображение)
+        self._reduced: Dict[int, Tuple[int, Image.Image]] = {}
+        # Защищает запеченное изображение: его может читать поток рендера (снимки сцены),
+        # пока основной поток выполняет инкрементальное обновление
+        self.lock = threading.RLock()
+
+    def _is_texture_opaque(self, texture: Image.Image) -> bool:
+        cached = self._opaque_textures.get(id(texture))
+        if cached is not None and cached[0]() is texture:
+            return cached[1]
+        opaque = texture.getextrema()[3][0] == 255
+        self._opaque_textures[id(texture)] = (weakref.ref(texture), opaque)
+        return opaque
+
+    def _blit_region(self, row_start: int, col_start: int, row_end: int, col_end: int):
+        bm = self.battle_map
+        tile_w, tile_h = bm.tile_pixel_width, bm.tile_pixel_height
+        row_start, row_end = max(0, row_start), min(bm.map_height_tiles, row_end)
+        col_start, col_end = max(0, col_start), min(bm.map_width_tiles, col_end)
+        if row_start >= row_end or col_start >= col_end:
+            return
+        # Сначала очищаем область: пустые ячейки должны стать прозрачными
+        self.image.paste(
+                (0, 0, 0, 0),
+                (col_start * tile_w, row_start * tile_h, col_end * tile_w, row_end * tile_h)
+                )
+        for row in range(row_start, row_end):
+            for col in range(col_start, col_end):
+                texture = bm.get_cell_texture(row, col)
+                if texture is not None:
+                    self.image.paste(texture, (col * tile_w, row * tile_h))
+
+    def _update_opacity(self):
+        bm = self.battle_map
+        if (bm.tile_indices == BattleMap.EMPTY_TILE).any():
+            self.opaque = False
+            return
+        self.opaque = all(
+                texture.size == (bm.tile_pixel_width, bm.tile_pixel_height) and self._is_texture_opaque(texture)
+                for texture in bm.used_textures()
+                )
+
+    def update(self) -> Image.Image:
+        """
+        Актуализирует запеченное изображение и возвращает его.
+        Полная пересборка выполняется только при первом вызове или если журнал
+        изменений карты не покрывает прошлую ревизию.
+        """
+        bm = self.battle_map
+        with self.lock:
+            # Ревизия фиксируется до чтения журнала: изменения, внесенные во время
+            # обновления, попадут в следующий вызов, а не потеряются
+            revision = bm.revision
+            size = (bm.total_pixel_width, bm.total_pixel_height)
+            changes = None if self.image is None or self.image.size != size else bm.changes_since(self._revision)
+
+            if changes is None:
+                self.image = Image.new("RGBA", size, (0, 0, 0, 0))
+                self._blit_region(0, 0, bm.map_height_tiles, bm.map_width_tiles)
+                self._update_opacity()
+            elif changes:
+                for row_start, col_start, row_end, col_end in changes:
+                    self._blit_region(row_start, col_start, row_end, col_end)
+                self._update_opacity()
+
+            self._revision = revision
+            return self.image
+
+    def reduced(self, factor: int) -> Image.Image:
+        """
+        Возвращает запеченное изображение, уменьшенное в factor раз (`Image.reduce`).
+        Результат кэшируется до следующего изменения карты.
+        """
+        with self.lock:
+            return self._reduced_locked(factor)
+
+    def _reduced_locked(self, factor: int) -> Image.Image:
+        image = self.update()
+        if factor <= 1:
+            return image
+        cached = self._reduced.get(factor)
+        if cached is not None and cached[0] == self._revision:
+            return cached[1]
+        changes = self.battle_map.changes_since(cached[0]) if cached is not None else None
+        reduced_size = (-(-image.width // factor), -(-image.height // factor))  # reduce округляет вверх
+        if changes is None or cached[1].size != reduced_size:
+            reduced = image.reduce(factor)
+        else:
+            # Уменьшаем только изменившиеся области (выровненные по factor)
+            reduced = cached[1]
+            tile_w, tile_h = self.battle_map.tile_pixel_width, self.battle_map.tile_pixel_height
+            for row_start, col_start, row_end, col_end in changes:
+                left = col_start * tile_w // factor
+                top = row_start * tile_h // factor
+                right = min(-(-col_end * tile_w // factor), reduced.width)
+                bottom = min(-(-row_end * tile_h // factor), reduced.height)
+                if left < right and top < bottom:
+                    box = (left * factor, top * factor,
+                           min(right * factor, image.width), min(bottom * factor, image.height))
+                    reduced.paste(image.crop(box).reduce(factor), (left, top))
+        self._reduced[factor] = (self._revision, reduced)
+        return reduced
+
+    def drop_reduced(self) -> int:
+        """Удаляет уменьшенные копии (пересоздаются при следующем `reduced`). Возвращает освобожденные байты."""
+        with self.lock:
+            freed = sum(image.width * image.height * 4 for _, image in self._reduced.values())
+            self._reduced.clear()
+        return freed
+
+    def invalidate(self):
+        """Принудительно пересобирает изображение при следующем `update`."""
+        with self.lock:
+            self.image = None
+            self._opaque_textures.clear()
+            self._reduced.clear()
+
+    def __repr__(self) -> str:
+        return (f"<BakedMapLayer(map={self.battle_map!r}, baked={self.image is not None}, "
+                f"opaque={self.opaque}, revision={self._revision})>")
@@ -0,0 +1,195 @@
+"""
+Модуль реализует отслеживание измененных областей (dirty rectangles) для инкрементального
+рендера `SpriteRenderer.render_tick`: вместо пересборки всего кадра перерисовываются только
+области спрайтов, которые сменили кадр анимации, текстуру, позицию, видимость, слой или
+порядок отрисовки в слое, и ячейки карты, измененные с прошлого кадра.
+"""
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Optional, Tuple
+
+from PIL import Image
+
+from .baked_map import BakedMapLayer
+from ..sprites.base_sprite import BaseSprite
+
+if TYPE_CHECKING:
+    from .sprite import SpriteRenderer
+
+Box = Tuple[int, int, int, int]  # (left, top, right, bottom)
+
+
+def sprite_box(sprite: BaseSprite) -> Box:
+    """Область холста, которую занимает спрайт (для токенов - логический размер)."""
+    width, height = sprite._extent()
+    return sprite.x, sprite.y, sprite.x + width, sprite.y + height
+
+
+def merge_boxes(boxes: List[Box]) -> List[Box]:
+    """
+    Объединяет пересекающиеся и соприкасающиеся области в охватывающие прямоугольники,
+    чтобы ни один пиксель не перерисовывался дважды.
+    """
+    merged: List[Box] = []
+    for box in boxes:
+        left, top, right, bottom = box
+        changed = True
+        while changed:
+            changed = False
+            for index, other in enumerate(merged):
+                if left <= other[2] and other[0] <= right and top <= other[3] and other[1] <= bottom:
+                    left, top = min(left, other[0]), min(top, other[1])
+                    right, bottom = max(right, other[2]), max(bottom, other[3])
+                    del merged[index]
+                    changed = True
+                    break
+        merged.append((left, top, right, bottom))
+    return merged
+
+
+class DirtyTracker:
+    """
+    Состояние инкрементального рендера: последний собранный кадр и то, что на нем нарисовано
+    (области, текстуры, слои и порядок спрайтов, ревизии карт), а также области, помеченные вручную.
+
+    `scan` сравнивает текущую сцену с нарисованной и возвращает области для перерисовки
+    (или None, если кадр нужно собрать целиком: первый кадр, изменились размер холста,
+    слои, качество или сетка, журнал изменений карты не покрывает прошлый кадр,
+    либо измененная площадь больше FULL_REDRAW_RATIO холста).
+
+    Атрибуты класса:
+        FULL_REDRAW_RATIO (float): Доля площади холста, начиная с которой выгоднее полный рендер.
+
+    Атрибуты:
+        frame (Optional[Image.Image]): Последний кадр `render_tick` (изменяется на месте).
+    """
+    FULL_REDRAW_RATIO: float = 0.5
+
+    def __init__(self):
+        self.frame: Optional[Image.Image] = None
+        self._settings: Optional[Hashable] = None
+        # id(спрайта) -> (спрайт, нарисованная область, id текстуры, слой)
+        self._sprites: Dict[int, Tuple[BaseSprite, Box, int, str]] = {}
+        # слой -> id спрайтов слоя в порядке отрисовки
+        self._orders: Dict[str, List[int]] = {}
+        # id(запеченной карты) -> ревизия карты в нарисованном кадре
+        self._map_revisions: Dict[int, int] = {}
+        self._pending: List[Box] = []
+        self._full: bool = True
+
+    def invalidate(self, box: Optional[Box] = None):
+        """
+        Помечает область для перерисовки в следующем `render_tick` (None - весь кадр).
+        Нужно для изменений, которые не видны по спрайтам: например, правки пикселей
+        текстуры на месте.
+        """
+        if box is None:
+            self._full = True
+        else:
+            self._pending.append(tuple(box))
+
+    def reset(self):
+        """Забывает кадр: следующий `render_tick` соберет его целиком."""
+        self.frame = None
+        self._sprites = {}
+        self._orders = {}
+        self._map_revisions = {}
+        self._pending = []
+        self._full = True
+
+    @staticmethod
+    def _texture_id(sprite: BaseSprite) -> int:
+        handle = sprite.texture_handle
+        return id(handle) if handle is not None else id(sprite._raw_image)
+
+    def scan(self, renderer: "SpriteRenderer", settings: Any) -> Optional[List[Box]]:
+        """
+        Сравнивает сцену рендерера с последним кадром и запоминает ее как нарисованную.
+
+        Args:
+            renderer (SpriteRenderer): Рендерер.
+            settings (Any): Параметры кадра (сетка, качество), при смене которых нужен полный рендер.
+
+        Returns:
+            Optional[List[Box]]: Непересекающиеся области для перерисовки (обрезанные по холсту)
+                или None, если кадр нужно собрать целиком.
+        """
+        layer_names = renderer.sorted_visible_layers()
+        full_settings = (
+            renderer.width, renderer.height, tuple(renderer.background_color), id(renderer.grid_artist), settings,
+            tuple((name, renderer.layers[name]['z_index'], id(renderer.layers[name].get('baked_map')))
+                  for name in layer_names),
+            )
+        full = self._full or self.frame is None or full_settings != self._settings
+        boxes = self._pending
+        sprites: Dict[int, Tuple[BaseSprite, Box, int, str]] = {}
+        orders: Dict[str, List[int]] = {}
+        map_revisions: Dict[int, int] = {}
+
+        for layer_name in layer_names:
+            baked_map: Optional[BakedMapLayer] = renderer.layers[layer_name].get('baked_map')
+            if baked_map is not None:
+                battle_map = baked_map.battle_map
+                revision = battle_map.revision
+                map_revisions[id(baked_map)] = revision
+                previous = self._map_revisions.get(id(baked_map))
+                if not full and previous != revision:
+                    changes = battle_map.changes_since(previous) if previous is not None else None
+                    if changes is None:
+                        full = True
+                    else:
+                        tile_w, tile_h = battle_map.tile_pixel_width, battle_map.tile_pixel_height
+                        boxes.extend((col_start * tile_w, row_start * tile_h, col_end * tile_w, row_end * tile_h)
+                                     for row_start, col_start, row_end, col_end in changes)
+
+            order = orders[layer_name] = []
+            for sprite in renderer.layer_sprites_in_view(layer_name):
+                key = id(sprite)
+                state = (sprite, sprite_box(sprite), self._texture_id(sprite), layer_name)
+                sprites[key] = state
+                order.append(key)
+                if full:
+                    continue
+                drawn = self._sprites.get(key)
+                if drawn is None:
+                    boxes.append(state[1])
+                elif drawn[1:] != state[1:]:
+                    boxes.append(drawn[1])
+                    boxes.append(state[1])
+
+            previous_order = self._orders.get(layer_name)
+            if not full and previous_order is not None and previous_order != order:
+                # Сменился порядок отрисовки (например, clear_layer и добавление в другом порядке).
+                # Из двух спрайтов, поменявшихся местами, хотя бы один сменил номер среди оставшихся
+                # в слое - его область покрывает их пересечение.
+                common = set(previous_order).intersection(order)
+                kept_before = [key for key in previous_order if key in common]
+                kept_now = [key for key in order if key in common]
+                boxes.extend(sprites[now][1] for before, now in zip(kept_before, kept_now) if before != now)
+
+        if not full:
+            # Спрайты, которых больше нет в кадре (удалены, скрыты или ушли за холст)
+            boxes.extend(drawn[1] for key, drawn in self._sprites.items() if key not in sprites)
+
+        self._settings = full_settings
+        self._sprites = sprites
+        self._orders = orders
+        self._map_revisions = map_revisions
+        self._pending = []
+        self._full = False
+        if full:
+            return None
+
+        clipped = []
+        for left, top, right, bottom in boxes:
+            left, top = max(left, 0), max(top, 0)
+            right, bottom = min(right, renderer.width), min(bottom, renderer.height)
+            if left < right and top < bottom:
+                clipped.append((left, top, right, bottom))
+        merged = merge_boxes(clipped)
+        area = sum((right - left) * (bottom - top) for left, top, right, bottom in merged)
+        if area > self.FULL_REDRAW_RATIO * renderer.width * renderer.height:
+            return None
+        return merged
+
+    def __repr__(self) -> str:
+        return (f"<DirtyTracker(frame={self.frame.size if self.frame is not None else None}, "
+                f"sprites={len(self._sprites)}, pending={len(self._pending)})>")
@@ -1,7 +1,9 @@
-from typing import Optional, Tuple, TypeAlias
+from typing import Dict, Optional, Tuple, TypeAlias
 
 from PIL import Image, ImageDraw, ImageFont
 
+from ..profiling import traced
+
 RGBA: TypeAlias = Tuple[int, int, int, int]
 
 
@@ -22,6 +24,7 @@ class GridArtist:
         self.font_path = font_path
         self.font_size = font_size
         self.font = self._load_font()
+        self._label_bboxes: Dict[str, Tuple[int, int, int, int]] = {}
 
     def _load_font(self) -> Optional[ImageFont.FreeTypeFont]:
         try:
@@ -42,58 +45,78 @@ class GridArtist:
                 font = None
         return font
 
-    def _draw_lines(self, draw: ImageDraw.ImageDraw, canvas_width: int, canvas_height: int):
+    def _draw_lines(self, draw: ImageDraw.ImageDraw, canvas_width: int, canvas_height: int, ox: int = 0, oy: int = 0):
         # Рисуем вертикальные линии
         for c in range(canvas_width // self.tile_pixel_width + 1):
-            x = c * self.tile_pixel_width
-            draw.line([(x, 0), (x, canvas_height)], fill=self.grid_color, width=1)
+            x = c * self.tile_pixel_width - ox
+            draw.line([(x, -oy), (x, canvas_height - oy)], fill=self.grid_color, width=1)
 
         # Рисуем горизонтальные линии
         for r in range(canvas_height // self.tile_pixel_height + 1):
-            y = r * self.tile_pixel_height
-            draw.line([(0, y), (canvas_width, y)], fill=self.grid_color, width=1)
+            y = r * self.tile_pixel_height - oy
+            draw.line([(-ox, y), (canvas_width - ox, y)], fill=self.grid_color, width=1)
+
+    def _label_bbox(self, draw: ImageDraw.ImageDraw, label_text: str) -> Optional[Tuple[int, int, int, int]]:
+        """Рамка текста метки относительно точки вывода (кэшируется: метки повторяются в каждом кадре)."""
+        bbox = self._label_bboxes.get(label_text)
+        if bbox is None and hasattr(draw, "textbbox"):
+            bbox = self._label_bboxes[label_text] = draw.textbbox((0, 0), label_text, font=self.font)
+        return bbox
 
-    def _draw_labels(self, draw: ImageDraw.ImageDraw, canvas_width: int, canvas_height: int):
+    def _draw_label(self, draw: ImageDraw.ImageDraw, position: Tuple[int, int], label_text: str,
+                    canvas_width: int, canvas_height: int, ox: int, oy: int, width: int, height: int):
+        x, y = position
+        # Для более точного позиционирования и избегания выхода за границы
+        # можно использовать textbbox (Pillow 9.2.0+)
+        bbox = self._label_bbox(draw, label_text)
+        if bbox is not None:
+            text_width = bbox[2] - bbox[0]
+            text_height = bbox[3] - bbox[1]
+            if not (x + text_width < canvas_width and y + text_height < canvas_height):
+                return
+            # Метка вне рисуемого фрагмента холста
+            if x + bbox[2] <= ox or x + bbox[0] >= ox + width or y + bbox[3] <= oy or y + bbox[1] >= oy + height:
+                return
+        draw.text((x - ox, y - oy), label_text, fill=self.label_color, font=self.font)
+
+    def _draw_labels(self, draw: ImageDraw.ImageDraw, canvas_width: int, canvas_height: int, ox: int, oy: int,
+                     width: int, height: int):
         if not self.font:
             return
 
         # Метки колонок
         for c in range(canvas_width // self.tile_pixel_width + 1):
             x = c * self.tile_pixel_width
-            label_text = str(c)
-
-            # Для более точного позиционирования и избегания выхода за границы
-            # можно использовать textbbox (Pillow 9.2.0+)
-            if hasattr(draw, "textbbox"):
-                bbox = draw.textbbox((x + 2, 2), label_text, font=self.font)
-                text_width = bbox[2] - bbox[0]
-                text_height = bbox[3] - bbox[1]
-                if x + 2 + text_width < canvas_width and 2 + text_height < canvas_height:
-                    draw.text((x + 2, 2), label_text, fill=self.label_color, font=self.font)
-            else:  # Fallback для старых версий
-                draw.text((x + 2, 2), label_text, fill=self.label_color, font=self.font)
+            self._draw_label(draw, (x + 2, 2), str(c), canvas_width, canvas_height, ox, oy, width, height)
 
         # Метки рядов
         for r in range(canvas_height // self.tile_pixel_height + 1):
             y = r * self.tile_pixel_height
             if r > 0:  # Пропускаем первую строку (0) для меток рядов
-                label_text = str(r)
-
-                if hasattr(draw, "textbbox"):
-                    bbox = draw.textbbox((2, y + 2), label_text, font=self.font)
-                    text_width = bbox[2] - bbox[0]
-                    text_height = bbox[3] - bbox[1]
-                    if 2 + text_width < canvas_width and y + 2 + text_height < canvas_height:
-                        draw.text((2, y + 2), label_text, fill=self.label_color, font=self.font)
-                else:
-                    draw.text((2, y + 2), label_text, fill=self.label_color, font=self.font)
-
-    def render_on(self, image: Image.Image):
+                self._draw_label(draw, (2, y + 2), str(r), canvas_width, canvas_height, ox, oy, width, height)
+
+    @traced("GridArtist.render_on", "render")
+    def render_on(
+            self, image: Image.Image, offset: Tuple[int, int] = (0, 0),
+            canvas_size: Optional[Tuple[int, int]] = None
+            ):
+        """
+        Рисует сетку и метки на изображении.
+
+        Args:
+            image (Image.Image): Изображение, на котором рисуется сетка.
+            offset (Tuple[int, int], optional): Положение изображения на холсте, если это
+                фрагмент холста (перерисовка области). По умолчанию (0, 0).
+            canvas_size (Optional[Tuple[int, int]], optional): Размер всего холста (от него зависят
+                число линий и видимость меток). По умолчанию None (размер image).
+        """
         if self.tile_pixel_width <= 0 or self.tile_pixel_height <= 0:
             return
 
+        canvas_width, canvas_height = canvas_size if canvas_size is not None else image.size
+        ox, oy = offset
         draw = ImageDraw.Draw(image)
-        self._draw_lines(draw, image.width, image.height)
+        self._draw_lines(draw, canvas_width, canvas_height, ox, oy)
         if self.font:
-            self._draw_labels(draw, image.width, image.height)
+            self._draw_labels(draw, canvas_width, canvas_height, ox, oy, image.width, image.height)
         del draw
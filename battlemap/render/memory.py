@@ -0,0 +1,422 @@
+"""
+Модуль реализует учет памяти спрайтов, слоев, рендереров и карт, а также бюджеты памяти
+с выгрузкой кэшей.
+
+Объем считается по пикселям, которые реально удерживаются объектами, и делится на категории:
+    textures - исходные текстуры спрайтов и палитры карт (в том числе декодированные ленивые);
+    caches   - производные данные, которые можно пересоздать (атлас, уменьшенные копии фона);
+    canvases - холсты: запеченный фон карты и кадр рендера;
+    arrays   - массивы NumPy (сетки карт, хранилища позиций спрайтов).
+Общая (flyweight) текстура учитывается в отчете один раз, сколько бы спрайтов на нее ни ссылалось.
+Ленивые текстуры при учете не декодируются.
+"""
+import warnings
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set
+
+from PIL import Image
+
+from .atlas import TextureAtlas
+from .baked_map import BakedMapLayer
+from ..sprites.animated_sprite import AnimatedSprite
+from ..sprites.base_sprite import BaseSprite
+from ..sprites.lazy_texture import LazyTexture, get_texture_cache
+from ..sprites.sprite_store import SpriteArrayStore
+from ..sprites.texture_registry import get_texture_registry
+from ..sprites.token_tile import TokenTileSprite
+from ..types.battle_map import BattleMap
+
+if TYPE_CHECKING:
+    from .sprite import SpriteRenderer
+
+CATEGORIES = ("textures", "caches", "canvases", "arrays")
+
+# Pillow хранит пиксели 1, L и P в одном байте, 16-битные режимы - в двух, остальные - в четырех
+_ONE_BYTE_MODES = ("1", "L", "P")
+
+
+def image_nbytes(image: Optional[Image.Image]) -> int:
+    """Объем пикселей изображения в памяти Pillow (0 для None)."""
+    if image is None:
+        return 0
+    if image.mode in _ONE_BYTE_MODES:
+        pixel_bytes = 1
+    elif image.mode.startswith("I;16"):
+        pixel_bytes = 2
+    else:
+        pixel_bytes = 4
+    return image.width * image.height * pixel_bytes
+
+
+class MemoryBudgetExceededError(MemoryError):
+    """
+    Сцена не помещается в бюджет памяти даже после выгрузки кэшей.
+
+    Атрибуты:
+        report (MemoryReport): Отчет после выгрузки.
+        limit_bytes (int): Бюджет в байтах.
+    """
+
+    def __init__(self, message: str, report: "MemoryReport", limit_bytes: int):
+        super().__init__(message)
+        self.report: MemoryReport = report
+        self.limit_bytes: int = limit_bytes
+
+
+class MemoryBudgetWarning(UserWarning):
+    """Сцена не помещается в бюджет памяти (режим on_exceed="warn"); видно при настройках warnings по умолчанию."""
+
+
+class MemoryReport:
+    """
+    Отчет об объеме памяти объекта: байты по категориям и вложенные отчеты (слои, спрайты).
+
+    Байты `bytes` - собственные данные узла; `total` и `category_total` учитывают всех потомков.
+    Общие текстуры, уже учтенные в другом узле того же отчета, не учитываются повторно.
+
+    Атрибуты:
+        name (str): Имя объекта.
+        bytes (Dict[str, int]): Собственные байты узла по категориям.
+        children (Dict[str, MemoryReport]): Вложенные отчеты.
+    """
+
+    def __init__(self, name: str):
+        self.name: str = name
+        self.bytes: Dict[str, int] = dict.fromkeys(CATEGORIES, 0)
+        self.children: Dict[str, MemoryReport] = {}
+
+    def add(self, category: str, nbytes: int):
+        if category not in self.bytes:
+            raise ValueError(f"Неизвестная категория памяти '{category}'. Допустимы: {', '.join(CATEGORIES)}.")
+        self.bytes[category] += int(nbytes)
+
+    def add_image(self, category: str, image: Optional[Image.Image], seen: Optional[Set[int]] = None):
+        """Учитывает изображение, если оно еще не встречалось в seen (по id)."""
+        if image is None:
+            return
+        if seen is not None:
+            if id(image) in seen:
+                return
+            seen.add(id(image))
+        self.add(category, image_nbytes(image))
+
+    def child(self, report: "MemoryReport") -> "MemoryReport":
+        key, suffix = report.name, 1
+        while key in self.children:  # Имена спрайтов могут совпадать
+            suffix += 1
+            key = f"{report.name}#{suffix}"
+        self.children[key] = report
+        return report
+
+    def category_total(self, category: str) -> int:
+        return self.bytes[category] + sum(child.category_total(category) for child in self.children.values())
+
+    @property
+    def total(self) -> int:
+        return sum(self.bytes.values()) + sum(child.total for child in self.children.values())
+
+    def totals(self) -> Dict[str, int]:
+        """Байты по категориям с учетом потомков."""
+        return {category: self.category_total(category) for category in CATEGORIES}
+
+    def to_dict(self, depth: Optional[int] = None) -> Dict[str, object]:
+        """Словарь для JSON: имя, итоги по категориям, общий объем и потомки (до глубины depth)."""
+        result: Dict[str, object] = {"name": self.name, "total": self.total, **self.totals()}
+        if self.children and (depth is None or depth > 0):
+            next_depth = None if depth is None else depth - 1
+            result["children"] = [child.to_dict(next_depth) for child in self.children.values()]
+        return result
+
+    def format(self, depth: int = 1, indent: int = 0) -> str:
+        """Текстовая таблица отчета (для логов и отладки)."""
+        totals = self.totals()
+        parts = ", ".join(f"{category} {_mb(totals[category])}" for category in CATEGORIES if totals[category])
+        lines = [f"{'  ' * indent}{self.name}: {_mb(self.total)}" + (f" ({parts})" if parts else "")]
+        if depth > 0:
+            for child in sorted(self.children.values(), key=lambda c: c.total, reverse=True):
+                lines.append(child.format(depth - 1, indent + 1))
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return f"<MemoryReport(name='{self.name}', total={self.total})>"
+
+
+def _mb(nbytes: int) -> str:
+    return f"{nbytes / (1024 * 1024):.1f} MB"
+
+
+def _texture_bytes(texture: Optional[Image.Image | LazyTexture], report: MemoryReport, seen: Optional[Set[int]]):
+    if isinstance(texture, LazyTexture):
+        # Ленивая текстура учитывается, только если она сейчас декодирована
+        if seen is None or id(texture) not in seen:
+            if seen is not None:
+                seen.add(id(texture))
+            report.add("textures", texture.nbytes)
+    else:
+        report.add_image("textures", texture, seen)
+
+
+def _sprite_textures(sprite: BaseSprite) -> List[Image.Image | LazyTexture]:
+    """Текстуры спрайта: основная, (у токенов) подготовленные текстуры размеров, (у анимаций) все кадры."""
+    if isinstance(sprite, AnimatedSprite) and sprite.texture_is_shared:
+        return list(sprite.animation.frames)
+    textures = [sprite.texture_handle if sprite.texture_handle is not None else sprite._raw_image]
+    if isinstance(sprite, TokenTileSprite):
+        textures.extend(sprite._size_textures.values())
+    return textures
+
+
+def _sprite_texture_bytes(sprite: BaseSprite, report: MemoryReport, seen: Optional[Set[int]]):
+    for texture in _sprite_textures(sprite):
+        _texture_bytes(texture, report, seen)
+
+
+def sprite_memory(sprite: BaseSprite, seen: Optional[Set[int]] = None) -> MemoryReport:
+    """
+    Возвращает отчет о памяти спрайта: его текстура (без повторного учета общих текстур из seen).
+
+    Args:
+        sprite (BaseSprite): Спрайт.
+        seen (Optional[Set[int]], optional): id уже учтенных изображений (пополняется).
+    """
+    report = MemoryReport(sprite.name)
+    _sprite_texture_bytes(sprite, report, seen)
+    return report
+
+
+def sprites_memory(sprites: Iterable[BaseSprite], name: str = "sprites", seen: Optional[Set[int]] = None,
+                   per_sprite: bool = False) -> MemoryReport:
+    """
+    Возвращает суммарный отчет для набора спрайтов (например, токенов сцены).
+
+    Args:
+        sprites (Iterable[BaseSprite]): Спрайты.
+        name (str, optional): Имя отчета.
+        seen (Optional[Set[int]], optional): id уже учтенных изображений (пополняется).
+        per_sprite (bool, optional): Добавить отчет каждого спрайта как потомка. По умолчанию False.
+    """
+    report = MemoryReport(name)
+    seen = seen if seen is not None else set()
+    for sprite in sprites:
+        if per_sprite:
+            report.child(sprite_memory(sprite, seen))
+        else:
+            _sprite_texture_bytes(sprite, report, seen)
+    return report
+
+
+def battle_map_memory(battle_map: BattleMap, seen: Optional[Set[int]] = None, name: str = "battle_map") -> MemoryReport:
+    """Возвращает отчет о памяти карты: текстуры палитры и явных тайлов, массивы сетки."""
+    report = MemoryReport(name)
+    seen = seen if seen is not None else set()
+    for texture in battle_map.palette:
+        report.add_image("textures", texture, seen)
+    for tile in battle_map._explicit_tiles.values():
+        _sprite_texture_bytes(tile, report, seen)
+    report.add("arrays", battle_map.tile_indices.nbytes + battle_map.blocking.nbytes)
+    return report
+
+
+def baked_map_memory(baked_map: BakedMapLayer, seen: Optional[Set[int]] = None,
+                     name: str = "baked_map") -> MemoryReport:
+    """Возвращает отчет о запеченном фоне: холст и его уменьшенные копии, карта - потомок."""
+    report = MemoryReport(name)
+    seen = seen if seen is not None else set()
+    with baked_map.lock:
+        report.add_image("canvases", baked_map.image, seen)
+        for _, reduced in baked_map._reduced.values():
+            report.add_image("caches", reduced, seen)
+    report.child(battle_map_memory(baked_map.battle_map, seen))
+    return report
+
+
+def atlas_memory(atlas: TextureAtlas, seen: Optional[Set[int]] = None, name: str = "atlas") -> MemoryReport:
+    """Возвращает отчет об атласе: страницы (производные копии текстур) - кэш."""
+    report = MemoryReport(name)
+    for page in atlas.pages:
+        report.add_image("caches", page, seen)
+    return report
+
+
+def _store_memory(store: SpriteArrayStore) -> int:
+    return store._x.nbytes + store._y.nbytes + store._w.nbytes + store._h.nbytes + store._visible.nbytes
+
+
+def layer_memory(renderer: "SpriteRenderer", layer_name: str, seen: Optional[Set[int]] = None,
+                 per_sprite: bool = False) -> MemoryReport:
+    """
+    Возвращает отчет о памяти слоя рендерера: текстуры спрайтов, запеченная карта, хранилище позиций.
+
+    Raises:
+        ValueError: Если слой не существует.
+    """
+    if layer_name not in renderer.layers:
+        raise ValueError(f"Слой '{layer_name}' не существует.")
+    layer_data = renderer.layers[layer_name]
+    seen = seen if seen is not None else set()
+    report = sprites_memory(layer_data['sprites'], layer_name, seen, per_sprite)
+    baked_map: Optional[BakedMapLayer] = layer_data.get('baked_map')
+    if baked_map is not None:
+        report.child(baked_map_memory(baked_map, seen))
+    store: Optional[SpriteArrayStore] = layer_data.get('store')
+    if store is not None:
+        report.add("arrays", _store_memory(store))
+    return report
+
+
+def renderer_memory(renderer: "SpriteRenderer", per_sprite: bool = False) -> MemoryReport:
+    """
+    Возвращает отчет о памяти рендерера: слои (потомки), атлас и кадр рендера.
+    Кадр (width x height RGBA) учитывается как холст: он выделяется при каждом рендере.
+    Кадр инкрементального рендера (`render_tick`) удерживается рендерером и учитывается отдельно.
+
+    Args:
+        renderer (SpriteRenderer): Рендерер.
+        per_sprite (bool, optional): Детализировать слои до отдельных спрайтов. По умолчанию False.
+    """
+    report = MemoryReport("renderer")
+    seen: Set[int] = set()
+    report.add("canvases", renderer.width * renderer.height * 4)
+    if renderer.dirty_tracker.frame is not None:
+        report.add_image("canvases", renderer.dirty_tracker.frame, seen)
+    for layer_name in renderer.layers:
+        report.child(layer_memory(renderer, layer_name, seen, per_sprite))
+    if renderer.atlas is not None:
+        report.child(atlas_memory(renderer.atlas, seen))
+    return report
+
+
+def process_memory() -> MemoryReport:
+    """
+    Возвращает отчет об общих для процесса кэшах: ленивые текстуры (`TextureCache`),
+    исходные изображения (`ImageLoader`) и живые текстуры `TextureRegistry`.
+    Эти объемы пересекаются с отчетами рендереров (те же текстуры), поэтому их не суммируют.
+    """
+    # Импорт здесь: пакет io зависит от render (формат сцены)
+    from ..io.image_loader import get_image_loader
+    report = MemoryReport("process")
+    texture_cache = MemoryReport("texture_cache")
+    texture_cache.add("caches", get_texture_cache().used_bytes)
+    report.child(texture_cache)
+    image_loader = MemoryReport("image_loader")
+    image_loader.add("caches", get_image_loader().used_bytes)
+    report.child(image_loader)
+    registry = MemoryReport("texture_registry")
+    for texture in list(get_texture_registry()._textures.values()):
+        registry.add_image("textures", texture)
+    report.child(registry)
+    return report
+
+
+class MemoryBudget:
+    """
+    Бюджет памяти рендерера.
+
+    `enforce` считает отчет рендерера и, если объем превышает бюджет, выгружает данные,
+    которые можно пересоздать, от самых дешевых к самым дорогим:
+        1. уменьшенные копии запеченных карт (прогрессивный рендер);
+        2. атлас токенов (токены будут упакованы заново при отрисовке);
+        3. декодированные ленивые текстуры, не закрепленные последним кадром.
+    Если и после этого объем больше бюджета, сцена не помещается: в режиме on_exceed="raise"
+    выбрасывается `MemoryBudgetExceededError`, в режиме "warn" выдается `MemoryBudgetWarning`
+    (один раз при выходе за бюджет, повторно - только после возвращения в бюджет).
+
+    Атрибуты:
+        limit_bytes (int): Бюджет в байтах.
+        on_exceed (str): "raise" или "warn".
+        evictions (int): Количество выгрузок (шагов, освободивших память).
+    """
+    ON_EXCEED = ("raise", "warn")
+
+    def __init__(self, limit_bytes: int, on_exceed: str = "warn"):
+        if limit_bytes <= 0:
+            raise ValueError("Бюджет памяти должен быть положительным.")
+        if on_exceed not in self.ON_EXCEED:
+            raise ValueError(f"on_exceed должен быть одним из: {', '.join(self.ON_EXCEED)}.")
+        self.limit_bytes: int = limit_bytes
+        self.on_exceed: str = on_exceed
+        self.evictions: int = 0
+        self._over_budget: bool = False
+        self._overruns: int = 0
+
+    def _evict_steps(self, renderer: "SpriteRenderer"):
+        yield lambda: self._drop_reduced_maps(renderer)
+        yield lambda: self._drop_atlas(renderer)
+        yield lambda: self._evict_lazy_textures(renderer)
+
+    @staticmethod
+    def _drop_reduced_maps(renderer: "SpriteRenderer") -> int:
+        freed = 0
+        for layer_data in renderer.layers.values():
+            baked_map: Optional[BakedMapLayer] = layer_data.get('baked_map')
+            if baked_map is not None:
+                freed += baked_map.drop_reduced()
+        return freed
+
+    @staticmethod
+    def _drop_atlas(renderer: "SpriteRenderer") -> int:
+        atlas = renderer.atlas
+        if atlas is None or not atlas.pages:
+            return 0
+        freed = sum(image_nbytes(page) for page in atlas.pages)
+        atlas.clear()
+        # Области старых страниц удерживают их в памяти - сбрасываем их у токенов рендерера
+        for layer_data in renderer.layers.values():
+            for sprite in layer_data['sprites']:
+                if isinstance(sprite, TokenTileSprite):
+                    sprite.atlas_regions = {}
+        return freed
+
+    @staticmethod
+    def _evict_lazy_textures(renderer: "SpriteRenderer") -> int:
+        freed = 0
+        for layer_data in renderer.layers.values():
+            for sprite in layer_data['sprites']:
+                for texture in _sprite_textures(sprite):
+                    if isinstance(texture, LazyTexture) and texture.is_loaded and not texture.pinned:
+                        nbytes = texture.nbytes
+                        texture.evict()
+                        freed += nbytes
+        return freed
+
+    def check(self, report: MemoryReport):
+        """
+        Проверяет отчет без выгрузки.
+
+        Raises:
+            MemoryBudgetExceededError: Если объем превышает бюджет и on_exceed="raise".
+        """
+        if report.total <= self.limit_bytes:
+            self._over_budget = False
+            return
+        message = (f"Сцена занимает {_mb(report.total)} при бюджете {_mb(self.limit_bytes)} "
+                   f"даже после выгрузки кэшей:\n{report.format(depth=2)}")
+        if self.on_exceed == "raise":
+            raise MemoryBudgetExceededError(message, report, self.limit_bytes)
+        if not self._over_budget:
+            # Предупреждение при каждом кадре превратилось бы в шум: только при выходе за бюджет.
+            # Номер выхода делает текст уникальным - фильтр warnings по умолчанию не скроет повтор
+            self._over_budget = True
+            self._overruns += 1
+            warnings.warn(f"{message}\n(выход за бюджет №{self._overruns})", MemoryBudgetWarning, stacklevel=3)
+
+    def enforce(self, renderer: "SpriteRenderer") -> MemoryReport:
+        """
+        Приводит рендерер к бюджету (см. описание класса) и возвращает итоговый отчет.
+
+        Raises:
+            MemoryBudgetExceededError: Если сцена не помещается в бюджет и on_exceed="raise".
+        """
+        report = renderer_memory(renderer)
+        if report.total > self.limit_bytes:
+            for step in self._evict_steps(renderer):
+                if step():
+                    self.evictions += 1
+                    report = renderer_memory(renderer)
+                    if report.total <= self.limit_bytes:
+                        break
+        # Итог всегда проходит через check: возврат в бюджет снова разрешает предупреждение
+        self.check(report)
+        return report
+
+    def __repr__(self) -> str:
+        return f"<MemoryBudget(limit={self.limit_bytes}, on_exceed='{self.on_exceed}', evictions={self.evictions})>"
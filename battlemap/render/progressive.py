@@ -0,0 +1,101 @@
+"""
+Модуль реализует прогрессивный рендеринг: быстрый грубый кадр в уменьшенном масштабе,
+затем уточняющие проходы в полном разрешении.
+"""
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+
+from PIL import Image
+
+from ..sprites.map_tile import MapTileSprite
+from ..sprites.token_tile import TokenTileSprite
+
+if TYPE_CHECKING:
+    from .sprite import SpriteRenderer
+
+
+class RenderPass:
+    """
+    Результат одного прохода прогрессивного рендеринга.
+
+    Атрибуты:
+        stage (str): Этап: "preview" (грубый кадр), "full" (полное разрешение без сетки)
+                     или "grid" (полное разрешение с сеткой).
+        image (Image.Image): Изображение прохода.
+        scale (float): Масштаб изображения относительно холста рендерера (1.0 - полный размер).
+        complete (bool): False, если грубый проход прерван по бюджету времени
+                         и содержит не все спрайты.
+        final (bool): True для последнего прохода.
+    """
+    PREVIEW = "preview"
+    FULL = "full"
+    GRID = "grid"
+
+    def __init__(self, stage: str, image: Image.Image, scale: float, complete: bool = True, final: bool = False):
+        self.stage: str = stage
+        self.image: Image.Image = image
+        self.scale: float = scale
+        self.complete: bool = complete
+        self.final: bool = final
+
+    def __repr__(self) -> str:
+        return (f"<RenderPass(stage='{self.stage}', size={self.image.size}, scale={self.scale}, "
+                f"complete={self.complete}, final={self.final})>")
+
+
+def render_preview(
+        renderer: "SpriteRenderer",
+        reduce_factor: int,
+        time_budget: float,
+        cancelled: Callable[[], bool]
+        ) -> Optional[Tuple[Image.Image, bool]]:
+    """
+    Рисует сцену рендерера в масштабе 1/reduce_factor самыми дешевыми операциями:
+    запеченная карта уменьшается `Image.reduce` (с кэшем до изменения карты), текстуры спрайтов - NEAREST
+    (каждая уникальная текстура и размер уменьшаются один раз за проход).
+    Спрайты, не успевшие отрисоваться за time_budget секунд, пропускаются.
+
+    Returns:
+        Optional[Tuple[Image.Image, bool]]: Грубый кадр и флаг полноты, или None при отмене.
+    """
+    started = time.perf_counter()
+    width = max(1, renderer.width // reduce_factor)
+    height = max(1, renderer.height // reduce_factor)
+    preview = Image.new("RGBA", (width, height), renderer.background_color)
+    scaled_textures: Dict[Tuple[int, Tuple[int, int]], Image.Image] = {}
+    complete = True
+
+    for layer_name in renderer.sorted_visible_layers():
+        layer_data = renderer.layers[layer_name]
+        baked_map = layer_data.get('baked_map')
+        if baked_map is not None:
+            reduced = baked_map.reduced(reduce_factor)
+            preview.paste(reduced, (0, 0), None if baked_map.opaque else reduced)
+
+        for sprite in renderer.layer_sprites_in_view(layer_name):
+            if cancelled():
+                return None
+            if time.perf_counter() - started > time_budget:
+                complete = False
+                break
+            if isinstance(sprite, TokenTileSprite):
+                size = (sprite.logical_pixel_width, sprite.logical_pixel_height)
+            elif layer_name == "background" and not isinstance(sprite, MapTileSprite):
+                size = (64, 64)
+            else:
+                size = sprite.size
+            target = (max(1, size[0] // reduce_factor), max(1, size[1] // reduce_factor))
+            texture = sprite.image
+            key = (id(texture), target)
+            scaled = scaled_textures.get(key)
+            if scaled is None:
+                if isinstance(sprite, TokenTileSprite):
+                    # Подготовленные размеры токена: при совпадении (например, 140 / 2 = 70) ресайза нет
+                    scaled = sprite.texture_for_size(target, Image.Resampling.NEAREST)
+                else:
+                    scaled = texture if texture.size == target else texture.resize(target, Image.Resampling.NEAREST)
+                scaled_textures[key] = scaled
+            preview.paste(scaled, (sprite.x // reduce_factor, sprite.y // reduce_factor), scaled)
+        if not complete:
+            break
+    return preview, complete
@@ -0,0 +1,44 @@
+"""
+Модуль определяет RenderQuality - уровни качества рендеринга, управляющие выбором фильтров ресайза.
+"""
+from enum import Enum
+
+from PIL import Image
+
+
+class RenderQuality(Enum):
+    """
+    Уровень качества рендеринга.
+
+    DRAFT - самые дешевые фильтры (NEAREST) для интерактивных операций (перетаскивание, панорамирование).
+    BALANCED - компромисс (BILINEAR).
+    FINAL - максимальное качество (LANCZOS); используется по умолчанию и для финального кадра.
+    """
+    DRAFT = "draft"
+    BALANCED = "balanced"
+    FINAL = "final"
+
+    @property
+    def resample(self) -> Image.Resampling:
+        """Фильтр для масштабирования спрайтов при рендеринге."""
+        if self is RenderQuality.DRAFT:
+            return Image.Resampling.NEAREST
+        if self is RenderQuality.BALANCED:
+            return Image.Resampling.BILINEAR
+        return Image.Resampling.LANCZOS
+
+    def display_resample(self, scale: float) -> Image.Resampling:
+        """
+        Фильтр для масштабирования готового кадра при отображении.
+
+        Args:
+            scale (float): Масштаб отображения (меньше 1 - уменьшение).
+        """
+        if self is RenderQuality.DRAFT:
+            return Image.Resampling.NEAREST
+        if self is RenderQuality.BALANCED:
+            return Image.Resampling.BILINEAR if scale >= 0.75 else Image.Resampling.NEAREST
+        return Image.Resampling.LANCZOS if scale < 1.0 else Image.Resampling.BICUBIC
+
+    def __str__(self) -> str:
+        return self.value
@@ -2,15 +2,27 @@
 Модуль предоставляет SpriteRenderer для 2D рендеринга спрайтов со слоями.
 """
 import pathlib
-from typing import Any, Dict, NewType, Optional, Tuple, TypeAlias  # Добавил типы
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NewType, Optional, Tuple, TypeAlias  # Добавил типы
 
 from PIL import Image, ImageDraw, ImageFont
 
+from .atlas import TextureAtlas
+from .baked_map import BakedMapLayer
+from .dirty import Box, DirtyTracker, sprite_box
 from .grid_artist import GridArtist
+from .memory import MemoryBudget, MemoryReport, renderer_memory
+from .progressive import RenderPass, render_preview
+from .quality import RenderQuality
 # Относительные импорты для использования внутри пакета
+from ..profiling import trace_span, traced
+from ..sprites.animated_sprite import AnimatedSprite
 from ..sprites.base_sprite import BaseSprite
+from ..sprites.lazy_texture import LazyTexture
 from ..sprites.map_tile import MapTileSprite
+from ..sprites.sprite_store import SpriteArrayStore
 from ..sprites.token_tile import TokenTileSprite
+from ..types.battle_map import BattleMap
 
 RGBA: TypeAlias = Tuple[int, int, int, int]
 
@@ -36,6 +48,12 @@ class SpriteRenderer:
         height (int): Текущая высота холста рендера.
         background_color (Tuple[int, int, int, int]): Цвет фона RGBA.
         layers (Dict[str, Dict[str, Any]]): Словарь для хранения слоев и их спрайтов.
+        atlas (Optional[TextureAtlas]): Атлас текстур токенов. Если задан, токены без подготовленной
+                                        текстуры нужного размера рисуются из заранее
+                                        отмасштабированных областей атласа.
+        quality (RenderQuality): Качество рендеринга по умолчанию (фильтры ресайза).
+        memory_budget (Optional[MemoryBudget]): Бюджет памяти, проверяемый после каждого рендера.
+        dirty_tracker (DirtyTracker): Состояние инкрементального рендера `render_tick`.
     """
     MAX_TILES_WIDE: int = 64
     MAX_TILES_HIGH: int = 64
@@ -95,6 +113,16 @@ class SpriteRenderer:
         self.label_color: RGBA = label_color
         self.label_font_path: Optional[str] = label_font_path
         self.label_font_size: int = label_font_size
+        # Ленивые текстуры спрайтов последнего кадра: закреплены, чтобы не выгружаться из кэша
+        self._pinned_textures: Dict[int, LazyTexture] = {}
+        self.atlas: Optional[TextureAtlas] = None
+        self.quality: RenderQuality = RenderQuality.FINAL
+        # Поколение прогрессивного рендера: новый запуск отменяет предыдущие генераторы
+        self._progressive_generation: int = 0
+        # Бюджет памяти: проверяется после каждого рендера (None - без ограничения)
+        self.memory_budget: Optional[MemoryBudget] = None
+        # Последний кадр render_tick и нарисованное на нем состояние сцены
+        self.dirty_tracker: DirtyTracker = DirtyTracker()
 
         self.grid_artist = GridArtist(
                 tile_pixel_width=self.DEFAULT_TILE_PIXEL_WIDTH,
@@ -129,6 +157,77 @@ class SpriteRenderer:
         else:
             self.layers[layer_name] = {'sprites': [], 'z_index': z_index, 'visible': visible}
 
+    def add_battle_map_layer(
+            self, layer_name: str, battle_map: BattleMap,
+            z_index: int = 0, visible: bool = True
+            ):
+        """
+        Добавляет (или перенастраивает) слой, источником которого является BattleMap.
+
+        Тайлы карты запекаются в одно фоновое изображение при первом рендере;
+        затем при изменении ячеек (`set_tile`, `fill_region`, `set_cells`) перерисовываются
+        только соответствующие области 70x70. При рендере запеченный фон
+        накладывается одной операцией paste (без маски, если он полностью непрозрачен).
+        Спрайты, добавленные на этот слой через `add_sprite`, рисуются поверх фона.
+
+        Args:
+            layer_name (str): Уникальное имя слоя.
+            battle_map (BattleMap): Карта-источник тайлов.
+            z_index (int, optional): Порядок отрисовки. По умолчанию 0.
+            visible (bool, optional): Видимость слоя. По умолчанию True.
+
+        Raises:
+            ValueError: Если имя слоя некорректно или z_index не целое число.
+            TypeError: Если battle_map не является экземпляром BattleMap.
+        """
+        baked_map = BakedMapLayer(battle_map)
+        self.add_layer(layer_name, z_index, visible)
+        self.layers[layer_name]['baked_map'] = baked_map
+
+    def enable_atlas(self, page_size: int = 2048) -> TextureAtlas:
+        """
+        Включает атлас текстур токенов. Токены, у которых нет подготовленной текстуры
+        логического размера (например, после `detach_texture`), упаковываются в атлас при
+        первой отрисовке и далее копируются из его страниц без масштабирования. Токены
+        с подготовленными текстурами рисуются ими напрямую: копирование области страницы
+        в каждом кадре дороже, чем наложение готовой текстуры.
+
+        Args:
+            page_size (int, optional): Размер страницы атласа. По умолчанию 2048.
+
+        Returns:
+            TextureAtlas: Атлас рендерера.
+        """
+        if self.atlas is None or self.atlas.page_size != page_size:
+            self.atlas = TextureAtlas(page_size)
+        return self.atlas
+
+    def use_sprite_store(self, layer_name: str) -> SpriteArrayStore:
+        """
+        Переводит слой на хранение позиций и видимости спрайтов в массивах NumPy.
+        Спрайты слоя (текущие и добавляемые позже) привязываются к `SpriteArrayStore`,
+        а рендер отсекает невидимые и вышедшие за холст спрайты одной векторной операцией.
+
+        Args:
+            layer_name (str): Имя слоя.
+
+        Returns:
+            SpriteArrayStore: Хранилище слоя (для `move_many`, `set_visible_many` и т.п.).
+
+        Raises:
+            ValueError: Если слой не существует.
+        """
+        if layer_name not in self.layers:
+            raise ValueError(f"Слой '{layer_name}' не существует.")
+        layer_data = self.layers[layer_name]
+        store = layer_data.get('store')
+        if store is None:
+            store = SpriteArrayStore(max(len(layer_data['sprites']), 64))
+            for sprite in layer_data['sprites']:
+                store.bind(sprite)
+            layer_data['store'] = store
+        return store
+
     def add_sprite(
             self, layer_name: str, sprite: BaseSprite | Image.Image,
             x: Optional[int] = None, y: Optional[int] = None
@@ -165,28 +264,41 @@ class SpriteRenderer:
             if y is not None:
                 sprite.y = y
             self.layers[layer_name]['sprites'].append(sprite)
+            store = self.layers[layer_name].get('store')
+            if store is not None:
+                store.bind(sprite)
         elif isinstance(sprite, Image.Image):
             if x is None or y is None:
                 raise ValueError("Координаты x и y обязательны при добавлении PIL.Image напрямую.")
             temp_sprite = BaseSprite(sprite, x, y, name=f"pil_img_on_{layer_name}")
             self.layers[layer_name]['sprites'].append(temp_sprite)
+            store = self.layers[layer_name].get('store')
+            if store is not None:
+                store.bind(temp_sprite)
         else:
             raise TypeError("Добавляемый объект должен быть экземпляром BaseSprite или PIL.Image.Image.")
 
+    @traced("SpriteRenderer.render", "render")
     def render(
             self,
             draw_grid: bool = False,
+            quality: Optional[RenderQuality] = None,
             ) -> Image.Image:
         """
         Отрисовывает все видимые слои и спрайты в единое изображение.
 
-        Спрайты типа `TokenTileSprite` (и его наследники) будут отмасштабированы
-        до их `logical_pixel_width` и `logical_pixel_height`.
+        Спрайты типа `TokenTileSprite` (и его наследники) рисуются подготовленной текстурой
+        размера `logical_pixel_width` x `logical_pixel_height` (без ресайза; если такой
+        текстуры нет - из атласа, если он включен, иначе основная текстура масштабируется
+        до этого размера).
         Спрайты на слое с именем "background", не являющиеся `MapTileSprite` или
         `TokenTileSprite`, будут приведены к размеру 64x64 (если правило не изменено).
+        `AnimatedSprite` рисуется текущим кадром (кадры переключает `render_tick`).
 
         Args:
             draw_grid (bool, optional): Если True, нарисовать сетку. По умолчанию False.
+            quality (Optional[RenderQuality], optional): Качество этого кадра (фильтр ресайза
+                                                         спрайтов). По умолчанию `self.quality`.
             grid_color (Tuple[int,int,int,int], optional): Цвет линий сетки RGBA.
                                                            По умолчанию полупрозрачный серый.
             label_color (Tuple[int,int,int,int], optional): Цвет меток координат RGBA.
@@ -205,60 +317,370 @@ class SpriteRenderer:
         #  токен, под слоями
         # self.width и self.height уже ограничены
         final_image = Image.new("RGBA", (self.width, self.height), self.background_color)
+        resample = (quality or self.quality).resample
+
+        frame_textures: Dict[int, LazyTexture] = {}
+        self._draw_layers(final_image, resample, frame_textures)
+        if draw_grid and self.grid_artist:
+            self.grid_artist.render_on(final_image)
+
+        self._update_pinned_textures(frame_textures)
+        if self.memory_budget is not None:
+            with trace_span("MemoryBudget.enforce", "memory"):
+                self.memory_budget.enforce(self)
+
+        return final_image
+
+    def _draw_layers(
+            self, canvas: Image.Image, resample: Image.Resampling, frame_textures: Dict[int, LazyTexture],
+            box: Optional[Box] = None
+            ):
+        """
+        Накладывает видимые слои на canvas. Если задан box, canvas - фрагмент холста
+        с левым верхним углом в (box[0], box[1]), и рисуются только пересекающие его спрайты.
+        """
+        origin_x, origin_y = (box[0], box[1]) if box is not None else (0, 0)
+
+        for layer_name in self.sorted_visible_layers():
+            layer_data = self.layers[layer_name]
+            with trace_span(f"layer:{layer_name}", "render"):
+                baked_map: Optional[BakedMapLayer] = layer_data.get('baked_map')
+                if baked_map is not None:
+                    with baked_map.lock:
+                        with trace_span("BakedMapLayer.update", "render"):
+                            baked_image = baked_map.update()
+                        if box is not None:
+                            # Только часть фона внутри области (за пределами фона холст не трогаем)
+                            visible_box = (max(box[0], 0), max(box[1], 0),
+                                           min(box[2], baked_image.width), min(box[3], baked_image.height))
+                            if visible_box[0] < visible_box[2] and visible_box[1] < visible_box[3]:
+                                part = baked_image.crop(visible_box)
+                                position = (visible_box[0] - origin_x, visible_box[1] - origin_y)
+                                canvas.paste(part, position, None if baked_map.opaque else part)
+                        elif baked_map.opaque:
+                            canvas.paste(baked_image, (0, 0))
+                        else:
+                            canvas.paste(baked_image, (0, 0), baked_image)
+
+                for sprite_obj in self.layer_sprites_in_view(layer_name, box):
+                    if not sprite_obj.visible:
+                        continue
+                    # Координаты спрайта относительно холста (или фрагмента холста)
+                    x_pos, y_pos = sprite_obj.x - origin_x, sprite_obj.y - origin_y
+
+                    prepared = None
+                    if isinstance(sprite_obj, TokenTileSprite):
+                        logical_size = (sprite_obj.logical_pixel_width, sprite_obj.logical_pixel_height)
+                        # Подготовленная текстура ровно логического размера - без ресайза в кадре
+                        prepared = sprite_obj.size_texture(logical_size)
+                        if isinstance(prepared, LazyTexture):
+                            frame_textures[id(prepared)] = prepared
+                            prepared = prepared.get()
+                        if prepared is None:
+                            region = sprite_obj.atlas_regions.get(logical_size)
+                            if region is None and self.atlas is not None:
+                                with trace_span("TextureAtlas.pack_token", "render", sprite=sprite_obj.name):
+                                    region = self.atlas.pack_token(sprite_obj).get(logical_size)
+                            if region is not None:
+                                # Вариант нужного размера уже лежит в атласе - ресайз не нужен
+                                image_to_paste = region.page.crop(region.box)
+                                canvas.paste(image_to_paste, (x_pos, y_pos), image_to_paste)
+                                continue
+
+                    if prepared is not None:
+                        image_to_paste = prepared
+                    else:
+                        texture_handle = sprite_obj.texture_handle
+                        if texture_handle is not None:
+                            frame_textures[id(texture_handle)] = texture_handle
+                        current_sprite_texture = sprite_obj.image
+                        image_to_paste = current_sprite_texture
+
+                    if isinstance(sprite_obj, TokenTileSprite):
+                        logical_w = sprite_obj.logical_pixel_width
+                        logical_h = sprite_obj.logical_pixel_height
+                        if image_to_paste.size != (logical_w, logical_h):
+                            try:
+                                with trace_span("resize", "render", sprite=sprite_obj.name):
+                                    image_to_paste = image_to_paste.resize(
+                                            (logical_w, logical_h), resample
+                                            )
+                            except Exception as e:
+                                raise ValueError(f"SpriteRenderer: Error resizing token '{sprite_obj.name}': {e}")
+
+                    elif layer_name == "background" and \
+                            not isinstance(sprite_obj, MapTileSprite) and \
+                            not isinstance(sprite_obj, TokenTileSprite):
+                        # Это специальное правило для нетипизированных спрайтов на фоне
+                        # Возможно, его стоит сделать настраиваемым или убрать из ядра рендерера
+                        target_bg_size = (64, 64)
+                        if image_to_paste.size != target_bg_size:
+                            try:
+                                with trace_span("resize", "render", sprite=sprite_obj.name):
+                                    image_to_paste = image_to_paste.resize(target_bg_size, resample)
+                            except Exception as e:
+                                # logging.warning(f"SpriteRenderer: Error resizing background sprite '{sprite_obj.name}': {e}")
+                                pass
+
+                    # Спрайты могут быть частично или полностью за пределами холста,
+                    # Pillow обработает это корректно при paste.
+                    canvas.paste(
+                            image_to_paste,
+                            (x_pos, y_pos),
+                            image_to_paste
+                            )  # Используем альфа-канал спрайта как маску
+
+
+    @traced("SpriteRenderer.render_tick", "render")
+    def render_tick(
+            self,
+            now: Optional[float] = None,
+            draw_grid: bool = False,
+            quality: Optional[RenderQuality] = None,
+            ) -> Tuple[Image.Image, List[Box]]:
+        """
+        Инкрементальный рендер для анимации: переключает кадры всех видимых `AnimatedSprite`
+        на момент now и перерисовывает в последнем кадре только изменившиеся области.
+
+        Изменения находятся сравнением сцены с нарисованной (`DirtyTracker`): смена кадра,
+        текстуры, позиции, размера, видимости или слоя спрайта, порядка отрисовки в слое,
+        добавление и удаление спрайтов, измененные ячейки карты. Правки пикселей текстуры на месте так не видны -
+        для них вызовите `invalidate`. Первый кадр, смена слоев, размера холста, сетки
+        или качества, а также изменения больше половины холста собираются полным `render`.
 
-        sorted_layer_names = sorted(
+        Возвращается один и тот же объект кадра, изменяемый на месте при каждом вызове;
+        скопируйте его, если кадр нужно сохранить.
+
+        Args:
+            now (Optional[float], optional): Время в шкале `time.monotonic()`. По умолчанию текущее.
+            draw_grid (bool, optional): Рисовать сетку. По умолчанию False.
+            quality (Optional[RenderQuality], optional): Качество кадра. По умолчанию `self.quality`.
+
+        Returns:
+            Tuple[Image.Image, List[Box]]: Кадр и перерисованные области (left, top, right, bottom)
+                в координатах холста (пустой список - кадр не изменился).
+        """
+        now = time.monotonic() if now is None else now
+        for layer_name in self.sorted_visible_layers():
+            for sprite_obj in self.layer_sprites_in_view(layer_name):
+                if isinstance(sprite_obj, AnimatedSprite):
+                    sprite_obj.advance(now)
+
+        resample = (quality or self.quality).resample
+        tracker = self.dirty_tracker
+        boxes = tracker.scan(self, (draw_grid, int(resample)))
+        if boxes is None:
+            tracker.frame = self.render(draw_grid=draw_grid, quality=quality)
+            return tracker.frame, [(0, 0, self.width, self.height)]
+
+        if boxes:
+            # Закрепленные текстуры кадра остаются: перерисовка областей использует лишь часть из них
+            frame_textures = dict(self._pinned_textures)
+            for box in boxes:
+                with trace_span("render_region", "render", box=list(box)):
+                    patch = Image.new("RGBA", (box[2] - box[0], box[3] - box[1]), self.background_color)
+                    self._draw_layers(patch, resample, frame_textures, box)
+                    if draw_grid and self.grid_artist:
+                        self.grid_artist.render_on(patch, (box[0], box[1]), (self.width, self.height))
+                    tracker.frame.paste(patch, (box[0], box[1]))
+            self._update_pinned_textures(frame_textures)
+            if self.memory_budget is not None:
+                with trace_span("MemoryBudget.enforce", "memory"):
+                    self.memory_budget.enforce(self)
+        return tracker.frame, boxes
+
+    def invalidate(self, box: Optional[Box] = None):
+        """
+        Помечает область холста (left, top, right, bottom) для перерисовки в следующем
+        `render_tick`; None - весь кадр.
+        """
+        self.dirty_tracker.invalidate(box)
+
+    def snapshot(self, exclude_layers: Iterable[str] = ()) -> "SpriteRenderer":
+        """
+        Возвращает снимок рендерера: новый SpriteRenderer с теми же настройками и слоями,
+        в котором спрайты заменены замороженными копиями (`frozen_copy`) с текущими
+        позициями и видимостью. Текстуры и запеченные карты не копируются, бюджет памяти
+        (`memory_budget`) общий: рендер снимка тоже его проверяет.
+
+        Снимок можно рендерить в другом потоке, пока основной поток меняет сцену.
+        После рендера снимка вызовите у него `release_textures()`.
+
+        Args:
+            exclude_layers (Iterable[str], optional): Слои, которые не попадут в снимок
+                (например, слои, отображаемые отдельно от статичной части сцены).
+        """
+        excluded = set(exclude_layers)
+        clone = SpriteRenderer(
+                self.width, self.height, self.background_color, self.grid_color,
+                self.label_color, self.label_font_path, self.label_font_size
+                )
+        clone.quality = self.quality
+        clone.grid_artist = self.grid_artist
+        # Снимки рендерят поток рендера и сервер: бюджет памяти общий с исходным рендерером
+        clone.memory_budget = self.memory_budget
+        for layer_name, layer_data in self.layers.items():
+            if layer_name in excluded:
+                continue
+            clone_layer = {
+                'sprites': [sprite.frozen_copy() for sprite in self.layer_sprites_in_view(layer_name)],
+                'z_index': layer_data['z_index'],
+                'visible': layer_data['visible'],
+                }
+            if layer_data.get('baked_map') is not None:
+                clone_layer['baked_map'] = layer_data['baked_map']
+            clone.layers[layer_name] = clone_layer
+        return clone
+
+    def sorted_visible_layers(self) -> List[str]:
+        """Возвращает имена видимых слоев в порядке отрисовки (по z-индексу)."""
+        return sorted(
                 (name for name, data in self.layers.items() if data.get('visible', True)),
                 key=lambda name: self.layers[name]['z_index']
                 )
 
-        for layer_name in sorted_layer_names:
-            layer_data = self.layers[layer_name]
-            for sprite_obj in layer_data['sprites']:
-                if not sprite_obj.visible:
-                    continue
-
-                current_sprite_texture = sprite_obj.image
-                image_to_paste = current_sprite_texture
-
-                if isinstance(sprite_obj, TokenTileSprite):
-                    logical_w = sprite_obj.logical_pixel_width
-                    logical_h = sprite_obj.logical_pixel_height
-                    if current_sprite_texture.size != (logical_w, logical_h):
-                        try:
-                            image_to_paste = current_sprite_texture.resize(
-                                    (logical_w, logical_h), Image.Resampling.LANCZOS
-                                    )
-                        except Exception as e:
-                            raise ValueError(f"SpriteRenderer: Error resizing token '{sprite_obj.name}': {e}")
-
-                elif layer_name == "background" and \
-                        not isinstance(sprite_obj, MapTileSprite) and \
-                        not isinstance(sprite_obj, TokenTileSprite):
-                    # Это специальное правило для нетипизированных спрайтов на фоне
-                    # Возможно, его стоит сделать настраиваемым или убрать из ядра рендерера
-                    target_bg_size = (64, 64)
-                    if image_to_paste.size != target_bg_size:
-                        try:
-                            image_to_paste = image_to_paste.resize(target_bg_size, Image.Resampling.LANCZOS)
-                        except Exception as e:
-                            # logging.warning(f"SpriteRenderer: Error resizing background sprite '{sprite_obj.name}': {e}")
-                            pass
-
-                # Координаты спрайта относительно холста рендерера
-                # Спрайты могут быть частично или полностью за пределами холста,
-                # Pillow обработает это корректно при paste.
-                x_pos, y_pos = sprite_obj.x, sprite_obj.y
-                final_image.paste(
-                        image_to_paste,
-                        (x_pos, y_pos),
-                        image_to_paste
-                        )  # Используем альфа-канал спрайта как маску
-        if draw_grid and self.grid_artist:
-            self.grid_artist.render_on(final_image)
+    def layer_sprites_in_view(self, layer_name: str, box: Optional[Box] = None) -> List[BaseSprite]:
+        """
+        Возвращает видимые спрайты слоя в порядке отрисовки. Для слоя с `SpriteArrayStore`
+        спрайты вне холста отсекаются векторно.
+
+        Args:
+            layer_name (str): Имя слоя.
+            box (Optional[Box], optional): Область холста (left, top, right, bottom): вернуть
+                только пересекающие ее спрайты. По умолчанию None (все спрайты слоя).
+        """
+        layer_data = self.layers[layer_name]
+        store: Optional[SpriteArrayStore] = layer_data.get('store')
+        if store is not None:
+            if box is None:
+                return store.visible_in_rect(0, 0, self.width, self.height)
+            return store.visible_in_rect(*box)
+        if box is None:
+            return [sprite for sprite in layer_data['sprites'] if sprite.visible]
+        left, top, right, bottom = box
+        in_view = []
+        for sprite in layer_data['sprites']:
+            if sprite.visible:
+                sprite_left, sprite_top, sprite_right, sprite_bottom = sprite_box(sprite)
+                if sprite_left < right and left < sprite_right and sprite_top < bottom and top < sprite_bottom:
+                    in_view.append(sprite)
+        return in_view
+
+    def render_progressive(
+            self,
+            draw_grid: bool = False,
+            quality: Optional[RenderQuality] = None,
+            preview_reduce: int = 4,
+            preview_time_budget: float = 0.05,
+            cancelled: Optional[Callable[[], bool]] = None
+            ) -> Iterator[RenderPass]:
+        """
+        Прогрессивный рендеринг: генератор проходов от грубого к точному.
 
+        1. "preview" - кадр в масштабе 1/preview_reduce, собранный за preview_time_budget
+           секунд (спрайты, не уложившиеся в бюджет, пропускаются: `complete=False`);
+        2. "full" - кадр в полном разрешении без сетки (как `render`);
+        3. "grid" - тот же кадр с сеткой (только если draw_grid=True).
 
-        return final_image
+        Генератор останавливается без дальнейших проходов, если `cancelled()` вернул True
+        или если был запущен новый прогрессивный рендер (или вызван `cancel_progressive`).
+
+        Args:
+            draw_grid (bool, optional): Рисовать сетку в последнем проходе. По умолчанию False.
+            quality (Optional[RenderQuality], optional): Качество полного прохода.
+            preview_reduce (int, optional): Во сколько раз уменьшен грубый кадр. По умолчанию 4.
+            preview_time_budget (float, optional): Бюджет грубого прохода в секундах. По умолчанию 0.05.
+            cancelled (Optional[Callable[[], bool]], optional): Проверка отмены (например, при
+                изменении сцены). По умолчанию None.
+
+        Yields:
+            RenderPass: Очередной проход.
 
+        Raises:
+            ValueError: Если preview_reduce меньше 1.
+        """
+        if preview_reduce < 1:
+            raise ValueError("Коэффициент уменьшения грубого кадра должен быть не меньше 1.")
+        # Поколение фиксируется при вызове (а не при первом next), чтобы новый запуск
+        # сразу отменял еще не начатые генераторы
+        self._progressive_generation += 1
+        generation = self._progressive_generation
+
+        def is_cancelled() -> bool:
+            return generation != self._progressive_generation or (cancelled is not None and cancelled())
+
+        return self._progressive_passes(draw_grid, quality, preview_reduce, preview_time_budget, is_cancelled)
+
+    def _progressive_passes(
+            self, draw_grid: bool, quality: Optional[RenderQuality], preview_reduce: int,
+            preview_time_budget: float, is_cancelled: Callable[[], bool]
+            ) -> Iterator[RenderPass]:
+        preview = render_preview(self, preview_reduce, preview_time_budget, is_cancelled)
+        if preview is None or is_cancelled():
+            return
+        yield RenderPass(RenderPass.PREVIEW, preview[0], 1.0 / preview_reduce, complete=preview[1])
+        if is_cancelled():
+            return
+
+        full_image = self.render(draw_grid=False, quality=quality)
+        if is_cancelled():
+            return
+        yield RenderPass(RenderPass.FULL, full_image, 1.0, final=not draw_grid)
+        if not draw_grid or is_cancelled():
+            return
+
+        grid_image = full_image.copy()
+        self.grid_artist.render_on(grid_image)
+        yield RenderPass(RenderPass.GRID, grid_image, 1.0, final=True)
+
+    def cancel_progressive(self):
+        """Отменяет все незавершенные генераторы `render_progressive`."""
+        self._progressive_generation += 1
+
+    def _update_pinned_textures(self, frame_textures: Dict[int, LazyTexture]):
+        """Закрепляет ленивые текстуры текущего кадра и снимает закрепление с остальных."""
+        for key, texture in frame_textures.items():
+            if key not in self._pinned_textures:
+                texture.pin()
+        for key, texture in self._pinned_textures.items():
+            if key not in frame_textures:
+                texture.unpin()
+        self._pinned_textures = frame_textures
+
+    def memory_report(self, per_sprite: bool = False) -> MemoryReport:
+        """
+        Возвращает отчет о памяти рендерера по слоям: текстуры, кэши, холсты и массивы
+        (см. `battlemap.render.memory`).
+
+        Args:
+            per_sprite (bool, optional): Детализировать слои до отдельных спрайтов. По умолчанию False.
+        """
+        return renderer_memory(self, per_sprite)
+
+    def set_memory_budget(self, limit_bytes: Optional[int], on_exceed: str = "warn") -> Optional[MemoryBudget]:
+        """
+        Задает бюджет памяти рендерера (None - снять). После каждого рендера при превышении
+        бюджета выгружаются кэши и ленивые текстуры; если сцена все равно не помещается,
+        выдается предупреждение или исключение (см. `MemoryBudget`).
+
+        Returns:
+            Optional[MemoryBudget]: Установленный бюджет.
+
+        Raises:
+            ValueError: Если limit_bytes не положительный или on_exceed некорректен.
+            MemoryBudgetExceededError: Если on_exceed="raise" и текущая сцена уже не помещается в бюджет.
+        """
+        self.memory_budget = MemoryBudget(limit_bytes, on_exceed) if limit_bytes is not None else None
+        if self.memory_budget is not None:
+            self.memory_budget.enforce(self)
+        return self.memory_budget
+
+    def release_textures(self):
+        """
+        Снимает закрепление с ленивых текстур последнего кадра, позволяя кэшу
+        выгрузить их (например, когда сцену больше никто не просматривает).
+        """
+        self._update_pinned_textures({})
 
     def clear_layer(self, layer_name: str, remove_layer_definition: bool = False):
         """
@@ -272,6 +694,9 @@ class SpriteRenderer:
         """
         if layer_name in self.layers:
             self.layers[layer_name]['sprites'] = []
+            store = self.layers[layer_name].get('store')
+            if store is not None:
+                store.clear()
             if remove_layer_definition:
                 del self.layers[layer_name]
         # else: # Слой не найден, можно залогировать или проигнорировать
@@ -280,7 +705,7 @@ class SpriteRenderer:
     def clear_all_layers_sprites(self):
         """Очищает спрайты со всех слоев, но оставляет сами слои."""
         for layer_name in self.layers:
-            self.layers[layer_name]['sprites'] = []
+            self.clear_layer(layer_name)
 
     def reset(
             self, width: Optional[int] = None, height: Optional[int] = None,
@@ -321,6 +746,9 @@ class SpriteRenderer:
         if background_color is not None:
             self.background_color = background_color
 
+        for layer_data in self.layers.values():
+            if layer_data.get('store') is not None:
+                layer_data['store'].clear()
         self.layers = {}
 
     def set_layer_visibility(self, layer_name: str, visible: bool):
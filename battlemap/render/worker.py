@@ -0,0 +1,149 @@
+"""
+Модуль определяет RenderWorker - фоновый поток рендеринга с объединением кадров.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class RenderWorker:
+    """
+    Фоновый поток, выполняющий рендер запросов по одному.
+
+    Запросы объединяются: если поток занят, новый запрос заменяет еще не начатый,
+    поэтому рисуется только последнее состояние сцены. Частота кадров ограничена
+    `max_fps`. Результаты не доставляются в поток UI сами - их забирают через `poll()`
+    (например, из Tk `after()`), причем устаревшие результаты отбрасываются.
+
+    Функция рендера вызывается в фоновом потоке и должна работать только с данными
+    запроса (например, со снимком `SpriteRenderer.snapshot()`), а не с живой сценой.
+
+    Атрибуты:
+        submitted (int): Количество принятых запросов.
+        rendered (int): Количество выполненных рендеров.
+        coalesced (int): Количество запросов, замененных более новыми до начала рендера.
+    """
+
+    def __init__(
+            self,
+            render_fn: Callable[[Any], Any],
+            max_fps: float = 30.0,
+            name: str = "battlemap-render"
+            ):
+        """
+        Инициализирует RenderWorker (поток запускается методом `start`).
+
+        Args:
+            render_fn (Callable[[Any], Any]): Функция рендера запроса.
+            max_fps (float, optional): Максимальная частота рендеров. По умолчанию 30.
+            name (str, optional): Имя потока.
+
+        Raises:
+            ValueError: Если max_fps не положительный.
+        """
+        if max_fps <= 0:
+            raise ValueError("Максимальная частота кадров должна быть положительной.")
+        self._render_fn = render_fn
+        self._min_interval: float = 1.0 / max_fps
+        self._name: str = name
+        self._condition = threading.Condition()
+        self._pending: Optional[Tuple[int, Any]] = None
+        self._result: Optional[Tuple[int, Any, Optional[Exception]]] = None
+        self._frame_counter: int = 0
+        self._running: bool = False
+        self._thread: Optional[threading.Thread] = None
+        self._last_render_started: float = 0.0
+        self.submitted: int = 0
+        self.rendered: int = 0
+        self.coalesced: int = 0
+
+    def start(self):
+        """Запускает фоновый поток (повторный вызов ничего не делает)."""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 1.0):
+        """Останавливает поток; незавершенный запрос отбрасывается."""
+        with self._condition:
+            self._running = False
+            self._pending = None
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def submit(self, request: Any) -> int:
+        """
+        Ставит запрос в очередь, заменяя еще не начатый. Никогда не блокируется на рендере.
+
+        Returns:
+            int: Номер кадра запроса (растет с каждым вызовом).
+        """
+        with self._condition:
+            self._frame_counter += 1
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = (self._frame_counter, request)
+            self.submitted += 1
+            self._condition.notify()
+            return self._frame_counter
+
+    def poll(self) -> Optional[Tuple[int, Any]]:
+        """
+        Забирает последний готовый результат (номер кадра, результат) или None.
+
+        Raises:
+            Exception: Исключение, возникшее при рендере этого кадра.
+        """
+        with self._condition:
+            result, self._result = self._result, None
+        if result is None:
+            return None
+        frame, value, error = result
+        if error is not None:
+            raise error
+        return frame, value
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and self._pending is None:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                # Ограничение частоты: ждем, пока не пройдет минимальный интервал
+                delay = self._last_render_started + self._min_interval - time.perf_counter()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                frame, request = self._pending
+                self._pending = None
+                self._last_render_started = time.perf_counter()
+
+            error: Optional[Exception] = None
+            value: Any = None
+            try:
+                value = self._render_fn(request)
+            except Exception as e:  # Передаем ошибку потоку UI через poll()
+                error = e
+
+            with self._condition:
+                self.rendered += 1
+                self._result = (frame, value, error)
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает статистику: принято, отрисовано и объединено запросов."""
+        with self._condition:
+            return {"submitted": self.submitted, "rendered": self.rendered, "coalesced": self.coalesced}
+
+    def __repr__(self) -> str:
+        return (f"<RenderWorker(running={self._running}, submitted={self.submitted}, "
+                f"rendered={self.rendered}, coalesced={self.coalesced})>")
@@ -1,3 +1,7 @@
+from .animated_sprite import AnimatedSprite, AnimationFrames, decode_animation, load_animation
 from .base_sprite import BaseSprite
+from .lazy_texture import BlobRef, LazyTexture, TextureCache, get_texture_cache, set_texture_budget
 from .map_tile import MapTileSprite
-from .token_tile import TokenSize, TokenTileSprite
\ No newline at end of file
+from .sprite_store import SpriteArrayStore
+from .texture_registry import TextureRegistry, get_texture_registry
+from .token_tile import TokenObserver, TokenSize, TokenTileSprite
@@ -0,0 +1,258 @@
+"""
+Модуль определяет анимированные спрайты: кадры GIF/WebP/APNG декодируются один раз
+в общие подготовленные RGBA текстуры (`AnimationFrames`), а `AnimatedSprite`
+переключает кадры по времени рендера.
+"""
+import bisect
+import hashlib
+import io
+import os
+import threading
+import time
+import weakref
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .base_sprite import BaseSprite
+from .texture_registry import get_texture_registry
+
+# Длительность кадра, если файл ее не задает или задает "нулевую" (как в браузерах: <= 10 мс)
+DEFAULT_FRAME_DURATION: float = 0.1
+_MIN_FRAME_DURATION: float = 0.01
+
+
+class AnimationFrames:
+    """
+    Декодированная анимация: кадры (общие неизменяемые RGBA текстуры одного размера)
+    и их длительности. Один объект разделяется всеми спрайтами с этой анимацией.
+
+    Атрибуты:
+        frames (Tuple[Image.Image, ...]): Кадры.
+        durations (Tuple[float, ...]): Длительности кадров в секундах.
+        loop (int): Число проигрываний (0 - бесконечно).
+        total_duration (float): Длительность одного проигрывания в секундах.
+    """
+    __slots__ = ("frames", "durations", "loop", "total_duration", "_ends", "__weakref__")
+
+    def __init__(self, frames: Sequence[Image.Image], durations: Sequence[float], loop: int = 0):
+        """
+        Инициализирует AnimationFrames.
+
+        Args:
+            frames (Sequence[Image.Image]): Кадры в режиме RGBA одного размера (не копируются).
+            durations (Sequence[float]): Длительности кадров в секундах.
+            loop (int, optional): Число проигрываний (0 - бесконечно). По умолчанию 0.
+
+        Raises:
+            ValueError: Если кадров нет, их число не совпадает с числом длительностей,
+                        размеры или режимы кадров различаются, длительность не положительна
+                        или loop отрицательный.
+        """
+        if not frames:
+            raise ValueError("Анимация должна содержать хотя бы один кадр.")
+        if len(frames) != len(durations):
+            raise ValueError("Число длительностей должно совпадать с числом кадров.")
+        size = frames[0].size
+        if any(frame.mode != "RGBA" or frame.size != size for frame in frames):
+            raise ValueError("Кадры анимации должны быть в режиме RGBA и одного размера.")
+        if any(duration <= 0 for duration in durations):
+            raise ValueError("Длительности кадров должны быть положительными.")
+        if loop < 0:
+            raise ValueError("Число проигрываний не может быть отрицательным.")
+        self.frames: Tuple[Image.Image, ...] = tuple(frames)
+        self.durations: Tuple[float, ...] = tuple(float(duration) for duration in durations)
+        self.loop: int = loop
+        self._ends: List[float] = []
+        elapsed = 0.0
+        for duration in self.durations:
+            elapsed += duration
+            self._ends.append(elapsed)
+        self.total_duration: float = elapsed
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Размер кадров (ширина, высота) в пикселях."""
+        return self.frames[0].size
+
+    def frame_index_at(self, elapsed: float) -> int:
+        """
+        Возвращает номер кадра через elapsed секунд от начала проигрывания.
+        После окончания конечной анимации остается последний кадр.
+        """
+        if len(self.frames) == 1 or elapsed <= 0:
+            return 0
+        if self.loop and elapsed >= self.loop * self.total_duration:
+            return len(self.frames) - 1
+        return min(bisect.bisect_right(self._ends, elapsed % self.total_duration), len(self.frames) - 1)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __repr__(self) -> str:
+        return (f"<AnimationFrames(frames={len(self.frames)}, size={self.size}, "
+                f"duration={self.total_duration:.3f}s, loop={self.loop})>")
+
+
+def decode_animation(
+        pillow_image: Image.Image,
+        target_size: Optional[Tuple[int, int]] = None,
+        resample: Image.Resampling = Image.Resampling.LANCZOS
+        ) -> AnimationFrames:
+    """
+    Декодирует все кадры открытого изображения (GIF, WebP, APNG или статичного)
+    в подготовленные текстуры общего реестра (`TextureRegistry`): одинаковые кадры
+    разных анимаций разделяют пиксели.
+
+    Args:
+        pillow_image (Image.Image): Открытое изображение (текущий кадр будет изменен).
+        target_size (Optional[Tuple[int, int]], optional): Размер кадров. По умолчанию None (исходный).
+        resample (Image.Resampling, optional): Фильтр ресайза. По умолчанию LANCZOS.
+
+    Returns:
+        AnimationFrames: Декодированная анимация.
+    """
+    registry = get_texture_registry()
+    frames: List[Image.Image] = []
+    durations: List[float] = []
+    for index in range(getattr(pillow_image, "n_frames", 1)):
+        pillow_image.seek(index)
+        # Pillow отдает кадры GIF/WebP/APNG уже собранными с учетом способа удаления предыдущего кадра
+        frames.append(registry.intern(pillow_image.convert("RGBA"), target_size, "RGBA", resample))
+        duration = (pillow_image.info.get("duration") or 0) / 1000.0
+        durations.append(duration if duration > _MIN_FRAME_DURATION else DEFAULT_FRAME_DURATION)
+    return AnimationFrames(frames, durations, int(pillow_image.info.get("loop", 0)))
+
+
+_animations: "weakref.WeakValueDictionary[Tuple[str, Optional[Tuple[int, int]], int], AnimationFrames]" = \
+    weakref.WeakValueDictionary()
+_animations_lock = threading.Lock()
+
+
+def load_animation(
+        source: str | os.PathLike | bytes,
+        target_size: Optional[Tuple[int, int]] = None,
+        resample: Image.Resampling = Image.Resampling.LANCZOS
+        ) -> AnimationFrames:
+    """
+    Загружает анимацию из файла или байтов. Результат кэшируется по хешу содержимого
+    файла, размеру и фильтру (по слабым ссылкам): повторная загрузка того же файла
+    не декодирует кадры заново и возвращает тот же объект `AnimationFrames`.
+
+    Args:
+        source (str | os.PathLike | bytes): Путь к файлу или его содержимое.
+        target_size (Optional[Tuple[int, int]], optional): Размер кадров (например,
+            логический размер токена). По умолчанию None (исходный).
+        resample (Image.Resampling, optional): Фильтр ресайза. По умолчанию LANCZOS.
+
+    Returns:
+        AnimationFrames: Общая анимация.
+
+    Raises:
+        TypeError: Если source не является путем или bytes.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = bytes(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            data = f.read()
+    else:
+        raise TypeError("Источник анимации должен быть путем к файлу или bytes.")
+    key = (hashlib.blake2b(data, digest_size=16).hexdigest(),
+           tuple(target_size) if target_size is not None else None, int(resample))
+    with _animations_lock:
+        animation = _animations.get(key)
+    if animation is not None:
+        return animation
+
+    with Image.open(io.BytesIO(data)) as pillow_image:
+        animation = decode_animation(pillow_image, target_size, resample)
+    with _animations_lock:
+        # Другой поток мог успеть декодировать тот же файл
+        return _animations.setdefault(key, animation)
+
+
+class AnimatedSprite(BaseSprite):
+    """
+    Спрайт, изображение которого - текущий кадр общей анимации (`AnimationFrames`).
+
+    Кадр выбирается по времени: `advance(now)` переключает спрайт на кадр, соответствующий
+    моменту now (по умолчанию `time.monotonic()`), и сообщает, сменился ли он.
+    `SpriteRenderer.render_tick` вызывает его для всех видимых анимированных спрайтов
+    и перерисовывает только их области. Кадры не копируются: изображение спрайта - общая
+    текстура (`texture_is_shared`), а изменения через сеттер `image` заменяются следующим кадром.
+
+    Атрибуты:
+        animation (AnimationFrames): Анимация спрайта.
+        speed (float): Множитель скорости проигрывания.
+        start_time (float): Момент начала проигрывания (в шкале `time.monotonic()`).
+    """
+    __slots__ = ("animation", "speed", "start_time", "_frame_index")
+
+    def __init__(
+            self, animation: AnimationFrames, x: int = 0, y: int = 0, name: str = "",
+            speed: float = 1.0, start_time: Optional[float] = None
+            ):
+        """
+        Инициализирует AnimatedSprite.
+
+        Args:
+            animation (AnimationFrames): Анимация (см. `load_animation`).
+            x (int, optional): Начальная X-координата. По умолчанию 0.
+            y (int, optional): Начальная Y-координата. По умолчанию 0.
+            name (str, optional): Имя спрайта. По умолчанию "".
+            speed (float, optional): Множитель скорости. По умолчанию 1.0.
+            start_time (Optional[float], optional): Момент начала проигрывания.
+                По умолчанию None (текущий `time.monotonic()`).
+
+        Raises:
+            TypeError: Если animation не является AnimationFrames.
+            ValueError: Если speed не положительный или координаты не целые.
+        """
+        if not isinstance(animation, AnimationFrames):
+            raise TypeError("animation должен быть экземпляром AnimationFrames.")
+        if speed <= 0:
+            raise ValueError("Скорость анимации должна быть положительной.")
+        super().__init__(animation.frames[0], x, y, name, shared_texture=True)
+        self.animation: AnimationFrames = animation
+        self.speed: float = speed
+        self.start_time: float = time.monotonic() if start_time is None else start_time
+        self._frame_index: int = 0
+
+    @property
+    def frame_index(self) -> int:
+        """Номер текущего кадра."""
+        return self._frame_index
+
+    def frame_index_at(self, now: float) -> int:
+        """Возвращает номер кадра в момент now (не меняя спрайт)."""
+        return self.animation.frame_index_at((now - self.start_time) * self.speed)
+
+    def advance(self, now: Optional[float] = None) -> bool:
+        """
+        Переключает спрайт на кадр момента now.
+
+        Args:
+            now (Optional[float], optional): Время в шкале `time.monotonic()`. По умолчанию текущее.
+
+        Returns:
+            bool: True, если кадр сменился (область спрайта нужно перерисовать).
+        """
+        index = self.frame_index_at(time.monotonic() if now is None else now)
+        if index == self._frame_index and self._raw_image is self.animation.frames[index]:
+            return False
+        self._frame_index = index
+        self._raw_image = self.animation.frames[index]
+        self._texture_handle = None
+        self._texture_shared = True
+        return True
+
+    def restart(self, now: Optional[float] = None):
+        """Начинает проигрывание заново с момента now (по умолчанию текущего)."""
+        self.start_time = time.monotonic() if now is None else now
+        self.advance(self.start_time)
+
+    def __repr__(self) -> str:
+        return (f"<{self.__class__.__name__}(name='{self.name}', size={self.size}, "
+                f"pos=({self.x},{self.y}), frame={self._frame_index}/{len(self.animation)}, "
+                f"visible={self.visible})>")
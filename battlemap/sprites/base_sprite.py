@@ -1,9 +1,12 @@
 """
 Модуль определяет базовый класс для всех спрайтов в системе рендеринга.
 """
-from typing import Tuple
+import copy
+from typing import Optional, Tuple
 from PIL import Image
 
+from .lazy_texture import LazyTexture
+
 
 class BaseSprite:
     """
@@ -15,40 +18,158 @@ class BaseSprite:
         name (str): Имя спрайта, полезно для отладки.
         visible (bool): Определяет, будет ли спрайт отрисован.
         _raw_image (Image.Image): Приватный атрибут, хранящий PIL Image объект (в RGBA).
+        _texture_shared (bool): True, если `_raw_image` - общая (flyweight) текстура,
+                                на которую ссылаются и другие спрайты.
+        _texture_handle (Optional[LazyTexture]): Ленивая текстура, если спрайт создан из нее;
+                                                 тогда `_raw_image` равен None.
+        _store (Optional[SpriteArrayStore]): Хранилище, в массивах которого лежат x, y и
+                                             видимость спрайта (если спрайт к нему привязан).
     """
+    __slots__ = (
+        "_texture_handle", "_raw_image", "_texture_shared", "_x", "_y", "_visible",
+        "_store", "_store_index", "name", "__weakref__",
+        )
 
-    def __init__(self, pillow_image: Image.Image, x: int = 0, y: int = 0, name: str = ""):
+    def __init__(
+            self, pillow_image: Image.Image | LazyTexture, x: int = 0, y: int = 0, name: str = "",
+            shared_texture: bool = False
+            ):
         """
         Инициализирует объект BaseSprite.
 
         Args:
-            pillow_image (Image.Image): Исходное изображение Pillow для спрайта.
+            pillow_image (Image.Image | LazyTexture): Исходное изображение Pillow для спрайта
+                или ленивая текстура, которая будет декодирована при первой отрисовке.
             x (int, optional): Начальная X-координата. По умолчанию 0.
             y (int, optional): Начальная Y-координата. По умолчанию 0.
             name (str, optional): Имя спрайта. Если не указано, генерируется.
                                 По умолчанию "".
+            shared_texture (bool, optional): Если True и изображение уже в RGBA, оно
+                                используется как общая неизменяемая текстура без копирования.
+                                По умолчанию False (спрайт получает собственную копию).
 
         Raises:
-            TypeError: Если pillow_image не является объектом PIL.Image.Image.
+            TypeError: Если pillow_image не является объектом PIL.Image.Image или LazyTexture.
             ValueError: Если x или y не являются целыми числами.
         """
-        if not isinstance(pillow_image, Image.Image):
-            raise TypeError("pillow_image должен быть объектом PIL.Image.Image.")
+        if not isinstance(pillow_image, (Image.Image, LazyTexture)):
+            raise TypeError("pillow_image должен быть объектом PIL.Image.Image или LazyTexture.")
         if not (isinstance(x, int) and isinstance(y, int)):
             raise ValueError("Координаты спрайта (x, y) должны быть целыми числами.")
 
-        self._raw_image: Image.Image = pillow_image.convert("RGBA")
-        self.x: int = x
-        self.y: int = y
+        self._texture_handle: Optional[LazyTexture] = None
+        if isinstance(pillow_image, LazyTexture):
+            self._texture_handle = pillow_image
+            self._raw_image: Optional[Image.Image] = None
+            self._texture_shared: bool = True
+        elif shared_texture and pillow_image.mode == "RGBA":
+            self._raw_image: Image.Image = pillow_image
+            self._texture_shared: bool = True
+        else:
+            self._raw_image = pillow_image.convert("RGBA")
+            self._texture_shared = False
+        self._x: int = x
+        self._y: int = y
+        self._visible: bool = True
+        self._store = None
+        self._store_index: int = -1
         self.name: str = name if name else f"{self.__class__.__name__}_{id(self)}"
-        self.visible: bool = True
+
+    @property
+    def x(self) -> int:
+        """Координата X левого верхнего угла спрайта на холсте."""
+        if self._store is not None:
+            return int(self._store._x[self._store_index])
+        return self._x
+
+    @x.setter
+    def x(self, value: int):
+        self._write_position(value, self.y)
+        self._position_changed()
+
+    @property
+    def y(self) -> int:
+        """Координата Y левого верхнего угла спрайта на холсте."""
+        if self._store is not None:
+            return int(self._store._y[self._store_index])
+        return self._y
+
+    @y.setter
+    def y(self, value: int):
+        self._write_position(self.x, value)
+        self._position_changed()
+
+    @property
+    def visible(self) -> bool:
+        """Определяет, будет ли спрайт отрисован."""
+        if self._store is not None:
+            return bool(self._store._visible[self._store_index])
+        return self._visible
+
+    @visible.setter
+    def visible(self, value: bool):
+        if self._store is not None:
+            self._store._visible[self._store_index] = value
+        else:
+            self._visible = bool(value)
+
+    def _write_position(self, x: int, y: int):
+        """Записывает позицию без уведомлений (в массивы хранилища, если спрайт привязан)."""
+        if self._store is not None:
+            self._store._x[self._store_index] = x
+            self._store._y[self._store_index] = y
+        else:
+            self._x = x
+            self._y = y
+
+    def _position_changed(self):
+        """
+        Вызывается после каждого изменения позиции спрайта.
+        Наследники переопределяют его, чтобы уведомлять наблюдателей (индексы и т.п.).
+        """
+        pass
+
+    @classmethod
+    def _positions_changed(cls, sprites):
+        """
+        Вызывается после группового изменения позиций спрайтов этого класса
+        (`SpriteArrayStore.move_many`). Наследники могут уведомлять наблюдателей пакетом.
+        """
+        for sprite in sprites:
+            sprite._position_changed()
+
+    def frozen_copy(self) -> "BaseSprite":
+        """
+        Возвращает неглубокую копию спрайта с текущими позицией и видимостью, не связанную
+        с хранилищами и наблюдателями. Текстура общая (без копирования пикселей).
+        Используется для снимков сцены, которые рендерятся в другом потоке.
+        """
+        clone = copy.copy(self)
+        clone._x, clone._y = self.x, self.y
+        clone._visible = self.visible
+        clone._store = None
+        clone._store_index = -1
+        return clone
+
+    def _extent(self) -> Tuple[int, int]:
+        """Размер области, которую спрайт занимает на холсте (для отсечения)."""
+        return self.size
+
+    def _extent_changed(self):
+        if self._store is not None:
+            self._store.refresh_extent(self)
 
     @property
     def image(self) -> Image.Image:
         """
         Возвращает объект PIL.Image.Image для этого спрайта.
         Изображение всегда в формате RGBA.
+        Если текстура общая (`texture_is_shared`), изменять ее на месте нельзя -
+        используйте `detach_texture()` или сеттер `image`.
+        Ленивая текстура декодируется при первом обращении.
         """
+        if self._texture_handle is not None:
+            return self._texture_handle.get()
         return self._raw_image
 
     @image.setter
@@ -66,20 +187,49 @@ class BaseSprite:
         if not isinstance(new_pillow_image, Image.Image):
             raise TypeError("Новое изображение должно быть объектом PIL.Image.Image.")
         self._raw_image = new_pillow_image.convert("RGBA")
+        self._texture_handle = None
+        self._texture_shared = False
+        self._extent_changed()
+
+    @property
+    def texture_handle(self) -> Optional[LazyTexture]:
+        """Ленивая текстура спрайта или None, если изображение хранится напрямую."""
+        return self._texture_handle
+
+    @property
+    def texture_is_shared(self) -> bool:
+        """True, если спрайт ссылается на общую (flyweight) текстуру."""
+        return self._texture_shared
+
+    def detach_texture(self) -> Image.Image:
+        """
+        Копирование при записи: если текстура общая, заменяет ее собственной копией.
+        Возвращает изображение, которое можно безопасно изменять на месте.
+        """
+        if self._texture_shared:
+            self._raw_image = self.image.copy()
+            self._texture_handle = None
+            self._texture_shared = False
+        return self._raw_image
 
     @property
     def width(self) -> int:
         """Ширина текущего изображения спрайта в пикселях."""
-        return self._raw_image.width
+        return self.size[0]
 
     @property
     def height(self) -> int:
         """Высота текущего изображения спрайта в пикселях."""
-        return self._raw_image.height
+        return self.size[1]
 
     @property
     def size(self) -> Tuple[int, int]:
-        """Размер текущего изображения спрайта (ширина, высота) в пикселях."""
+        """
+        Размер текущего изображения спрайта (ширина, высота) в пикселях.
+        Для ленивой текстуры не требует декодирования.
+        """
+        if self._texture_handle is not None:
+            return self._texture_handle.size
         return self._raw_image.size
 
     def set_position(self, x: int, y: int):
@@ -95,8 +245,8 @@ class BaseSprite:
         """
         if not (isinstance(x, int) and isinstance(y, int)):
             raise ValueError("Координаты (x, y) должны быть целыми числами.")
-        self.x = x
-        self.y = y
+        self._write_position(x, y)
+        self._position_changed()
 
     def move(self, dx: int, dy: int):
         """
@@ -111,8 +261,8 @@ class BaseSprite:
         """
         if not (isinstance(dx, int) and isinstance(dy, int)):
             raise ValueError("Смещения (dx, dy) должны быть целыми числами.")
-        self.x += dx
-        self.y += dy
+        self._write_position(self.x + dx, self.y + dy)
+        self._position_changed()
 
     def __repr__(self) -> str:
         """Возвращает строковое представление объекта для отладки."""
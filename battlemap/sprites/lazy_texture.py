@@ -0,0 +1,300 @@
+"""
+Модуль определяет ленивые текстуры (LazyTexture) и общий для процесса LRU-кэш
+декодированных текстур с бюджетом памяти (TextureCache).
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+
+class BlobRef:
+    """
+    Ссылка на сырые RGBA пиксели внутри файла (например, блоб текстуры файла сцены).
+
+    Атрибуты:
+        path (str): Путь к файлу.
+        offset (int): Смещение пикселей от начала файла.
+        size (Tuple[int, int]): Размер изображения (ширина, высота).
+    """
+
+    def __init__(self, path: str | os.PathLike, offset: int, size: Tuple[int, int]):
+        self.path: str = os.fspath(path)
+        self.offset: int = offset
+        self.size: Tuple[int, int] = (int(size[0]), int(size[1]))
+
+    def read(self) -> Image.Image:
+        """Читает пиксели из файла и возвращает RGBA изображение."""
+        length = self.size[0] * self.size[1] * 4
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(length)
+        if len(data) != length:
+            raise ValueError(f"Блоб текстуры в '{self.path}' (смещение {self.offset}) поврежден или обрезан.")
+        return Image.frombytes("RGBA", self.size, data)
+
+    def __repr__(self) -> str:
+        return f"<BlobRef(path='{self.path}', offset={self.offset}, size={self.size})>"
+
+
+class TextureCache:
+    """
+    LRU-кэш декодированных ленивых текстур с бюджетом памяти.
+
+    Когда суммарный объем декодированных пикселей превышает бюджет, текстуры
+    выгружаются, начиная с давно не использовавшихся. Закрепленные текстуры
+    (`LazyTexture.pin`) не выгружаются. Потокобезопасен.
+
+    Атрибуты:
+        budget_bytes (int): Бюджет памяти в байтах.
+        used_bytes (int): Текущий объем декодированных текстур в байтах.
+        evictions (int): Количество выгрузок за время жизни кэша.
+    """
+
+    def __init__(self, budget_bytes: int = 512 * 1024 * 1024):
+        if budget_bytes < 0:
+            raise ValueError("Бюджет памяти кэша текстур не может быть отрицательным.")
+        self._budget_bytes: int = budget_bytes
+        self.used_bytes: int = 0
+        self.evictions: int = 0
+        self._entries: "OrderedDict[int, LazyTexture]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def budget_bytes(self) -> int:
+        return self._budget_bytes
+
+    @budget_bytes.setter
+    def budget_bytes(self, value: int):
+        if value < 0:
+            raise ValueError("Бюджет памяти кэша текстур не может быть отрицательным.")
+        self._budget_bytes = value
+        self.trim()
+
+    def _register(self, texture: "LazyTexture"):
+        with self._lock:
+            if id(texture) not in self._entries:
+                self.used_bytes += texture.nbytes
+            self._entries[id(texture)] = texture
+            self._entries.move_to_end(id(texture))
+            self.trim()
+
+    def _touch(self, texture: "LazyTexture"):
+        with self._lock:
+            if id(texture) in self._entries:
+                self._entries.move_to_end(id(texture))
+
+    def _forget(self, texture: "LazyTexture"):
+        with self._lock:
+            if self._entries.pop(id(texture), None) is not None:
+                self.used_bytes -= texture.nbytes
+
+    def trim(self, target_bytes: Optional[int] = None) -> int:
+        """
+        Выгружает незакрепленные текстуры (LRU), пока объем не станет не больше
+        `target_bytes` (по умолчанию - бюджета).
+
+        Returns:
+            int: Количество освобожденных байт.
+        """
+        target = self._budget_bytes if target_bytes is None else target_bytes
+        freed = 0
+        with self._lock:
+            if self.used_bytes <= target:
+                return 0
+            for texture in list(self._entries.values()):
+                if self.used_bytes <= target:
+                    break
+                if texture.pinned:
+                    continue
+                nbytes = texture.nbytes
+                texture._drop_image()
+                self._entries.pop(id(texture), None)
+                self.used_bytes -= nbytes
+                freed += nbytes
+                self.evictions += 1
+        return freed
+
+    def clear(self):
+        """Выгружает все незакрепленные текстуры."""
+        self.trim(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Возвращает статистику кэша: бюджет, занято, число текстур, закрепленных и выгрузок."""
+        with self._lock:
+            return {
+                "budget_bytes": self._budget_bytes,
+                "used_bytes": self.used_bytes,
+                "loaded": len(self._entries),
+                "pinned": sum(1 for t in self._entries.values() if t.pinned),
+                "evictions": self.evictions,
+                }
+
+    def __repr__(self) -> str:
+        return (f"<TextureCache(used={self.used_bytes}, budget={self._budget_bytes}, "
+                f"loaded={len(self._entries)})>")
+
+
+_default_cache = TextureCache()
+
+
+def get_texture_cache() -> TextureCache:
+    """Возвращает общий для процесса кэш ленивых текстур."""
+    return _default_cache
+
+
+def set_texture_budget(budget_bytes: int):
+    """Задает бюджет памяти общего кэша ленивых текстур (с немедленной выгрузкой лишнего)."""
+    _default_cache.budget_bytes = budget_bytes
+
+
+class LazyTexture:
+    """
+    Дескриптор текстуры, которая декодируется при первом обращении.
+
+    Источник - путь к файлу, байты закодированного изображения или `BlobRef`.
+    Декодированное изображение приводится к RGBA и (если задан `target_size`)
+    к нужному размеру, после чего учитывается в `TextureCache` и может быть
+    выгружено при нехватке бюджета; следующее обращение декодирует его снова.
+
+    Атрибуты:
+        source (str | bytes | BlobRef): Источник данных.
+        target_size (Optional[Tuple[int, int]]): Размер подготовленной текстуры.
+    """
+
+    def __init__(
+            self,
+            source: str | os.PathLike | bytes | BlobRef,
+            target_size: Optional[Tuple[int, int]] = None,
+            cache: Optional[TextureCache] = None
+            ):
+        """
+        Инициализирует LazyTexture.
+
+        Args:
+            source (str | os.PathLike | bytes | BlobRef): Источник изображения.
+            target_size (Optional[Tuple[int, int]], optional): Размер, к которому приводится
+                текстура после декодирования. По умолчанию None (исходный размер).
+            cache (Optional[TextureCache], optional): Кэш для учета памяти.
+                По умолчанию общий кэш процесса.
+
+        Raises:
+            TypeError: Если тип источника не поддерживается.
+        """
+        if isinstance(source, os.PathLike):
+            source = os.fspath(source)
+        if not isinstance(source, (str, bytes, BlobRef)):
+            raise TypeError("Источник LazyTexture должен быть путем, bytes или BlobRef.")
+        self.source: str | bytes | BlobRef = source
+        self.target_size: Optional[Tuple[int, int]] = tuple(target_size) if target_size else None
+        self._cache: TextureCache = cache if cache is not None else _default_cache
+        self._image: Optional[Image.Image] = None
+        self._size: Optional[Tuple[int, int]] = self.target_size
+        self._pins: int = 0
+        self._lock = threading.Lock()
+        # Производные текстуры по размерам: повторный derive возвращает тот же объект
+        self._derived: Dict[Tuple[int, int], LazyTexture] = {}
+
+    def derive(self, target_size: Tuple[int, int]) -> "LazyTexture":
+        """
+        Возвращает ленивую текстуру с тем же источником, но другим целевым размером
+        (для одного размера - всегда один и тот же объект, поэтому она декодируется один раз).
+        """
+        target_size = (int(target_size[0]), int(target_size[1]))
+        if target_size == self.target_size:
+            return self
+        with self._lock:
+            derived = self._derived.get(target_size)
+            if derived is None:
+                derived = LazyTexture(self.source, target_size, self._cache)
+                self._derived[target_size] = derived
+        return derived
+
+    def _decode(self) -> Image.Image:
+        if isinstance(self.source, BlobRef):
+            image = self.source.read()
+            if self.target_size is not None and image.size != self.target_size:
+                image = image.resize(self.target_size, Image.Resampling.LANCZOS)
+            return image
+        # Импорт здесь: пакет io зависит от sprites (формат сцены)
+        from ..io.image_loader import decode_image
+        # Файлы и байты декодируются сразу в целевом размере (уменьшенное декодирование JPEG, reduce)
+        return decode_image(self.source, exact_size=self.target_size)
+
+    def get(self) -> Image.Image:
+        """Возвращает декодированное RGBA изображение, декодируя его при необходимости."""
+        image = self._image
+        if image is not None:
+            self._cache._touch(self)
+            return image
+        with self._lock:
+            image = self._image
+            if image is None:
+                image = self._decode()
+                self._image = image
+                self._size = image.size
+                # Регистрация может сразу выгрузить текстуру при нулевом бюджете -
+                # вызывающий код все равно получает декодированное изображение
+                self._cache._register(self)
+        return image
+
+    def _drop_image(self):
+        self._image = None
+
+    def evict(self):
+        """Принудительно выгружает декодированное изображение (если оно не закреплено)."""
+        if self._pins == 0 and self._image is not None:
+            self._cache._forget(self)
+            self._image = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """True, если изображение сейчас декодировано."""
+        return self._image is not None
+
+    @property
+    def nbytes(self) -> int:
+        """Объем декодированных пикселей в байтах (0, если не загружено)."""
+        image = self._image
+        return image.width * image.height * 4 if image is not None else 0
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """
+        Размер текстуры. Если он еще не известен, читается только заголовок файла
+        (без декодирования пикселей).
+        """
+        if self._size is None:
+            if isinstance(self.source, BlobRef):
+                self._size = self.source.size
+            else:
+                stream = io.BytesIO(self.source) if isinstance(self.source, bytes) else self.source
+                with Image.open(stream) as opened:
+                    self._size = opened.size
+        return self._size
+
+    def pin(self):
+        """Закрепляет текстуру: пока счетчик закреплений > 0, она не выгружается."""
+        with self._lock:
+            self._pins += 1
+
+    def unpin(self):
+        """Снимает одно закрепление. Текстура снова может быть выгружена при нехватке бюджета."""
+        with self._lock:
+            if self._pins > 0:
+                self._pins -= 1
+
+    @property
+    def pinned(self) -> bool:
+        return self._pins > 0
+
+    def __repr__(self) -> str:
+        source = self.source if not isinstance(self.source, bytes) else f"<{len(self.source)} bytes>"
+        return (f"<LazyTexture(source={source!r}, target_size={self.target_size}, "
+                f"loaded={self.is_loaded}, pinned={self.pinned})>")
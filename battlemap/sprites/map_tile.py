@@ -1,8 +1,12 @@
 """
 Модуль определяет спрайт для одного тайла карты.
 """
+from typing import Optional, Tuple
+
 from PIL import Image
 from battlemap.sprites.base_sprite import BaseSprite
+from battlemap.sprites.lazy_texture import LazyTexture
+from battlemap.sprites.texture_registry import get_texture_registry
 
 class MapTileSprite(BaseSprite):
     """
@@ -15,32 +19,100 @@ class MapTileSprite(BaseSprite):
         TILE_HEIGHT (int): Стандартная высота тайла в пикселях.
         TARGET_SIZE (Tuple[int, int]): Кортеж (TILE_WIDTH, TILE_HEIGHT).
     """
+    __slots__ = ("_battle_map", "_map_cell")
+
     TILE_WIDTH: int = 70
     TILE_HEIGHT: int = 70
     TARGET_SIZE: tuple[int, int] = (TILE_WIDTH, TILE_HEIGHT)
 
-    def __init__(self, pillow_image: Image.Image, x: int = 0, y: int = 0, name: str = "map_tile"):
+    def __init__(
+            self, pillow_image: Image.Image | LazyTexture, x: int = 0, y: int = 0, name: str = "map_tile",
+            shared_texture: bool = False
+            ):
         """
         Инициализирует MapTileSprite.
 
         Args:
-            pillow_image (Image.Image): Исходное изображение для тайла.
-                                       Оно будет изменено до TARGET_SIZE.
+            pillow_image (Image.Image | LazyTexture): Исходное изображение для тайла.
+                                       Оно будет изменено до TARGET_SIZE (ленивая текстура -
+                                       при декодировании). Одинаковые изображения разрешаются
+                                       в одну общую текстуру через `TextureRegistry`.
             x (int, optional): Начальная X-координата. По умолчанию 0.
             y (int, optional): Начальная Y-координата. По умолчанию 0.
             name (str, optional): Имя спрайта. По умолчанию "map_tile".
+            shared_texture (bool, optional): Использовать изображение как общую текстуру
+                                             как есть, без хеширования и копирования. Имеет смысл
+                                             для текстур, подготовленных `prepare_texture`.
+                                             По умолчанию False.
         """
-        super().__init__(pillow_image, x, y, name)
+        if isinstance(pillow_image, LazyTexture):
+            if pillow_image.target_size != self.TARGET_SIZE:
+                pillow_image = pillow_image.derive(self.TARGET_SIZE)
+        elif not shared_texture and isinstance(pillow_image, Image.Image):
+            pillow_image = self.prepare_texture(pillow_image)
+            shared_texture = True
+        super().__init__(pillow_image, x, y, name, shared_texture=shared_texture)
+        # Ячейка BattleMap, к которой привязан спрайт (для обновления палитры при замене изображения)
+        self._battle_map = None
+        self._map_cell: Optional[Tuple[int, int]] = None
         self._force_target_size()
 
+    def frozen_copy(self) -> "MapTileSprite":
+        clone = super().frozen_copy()
+        clone._battle_map = None
+        clone._map_cell = None
+        return clone
+
+    def _bind_to_map(self, battle_map, cell: Tuple[int, int]):
+        self._battle_map = battle_map
+        self._map_cell = cell
+
+    def _unbind_from_map(self, battle_map):
+        if self._battle_map is battle_map:
+            self._battle_map = None
+            self._map_cell = None
+
+    def _notify_map_image_changed(self):
+        if self._battle_map is not None and self._map_cell is not None:
+            self._battle_map._on_tile_image_changed(self, self._map_cell)
+
+    def detach_texture(self) -> Image.Image:
+        """
+        Копирование при записи: если текстура общая, заменяет ее собственной копией
+        и сообщает об этом карте, к которой привязан тайл.
+        """
+        was_shared = self._texture_shared
+        texture = super().detach_texture()
+        if was_shared:
+            self._notify_map_image_changed()
+        return texture
+
+    @classmethod
+    def prepare_texture(cls, pillow_image: Image.Image) -> Image.Image:
+        """
+        Готовит общую текстуру тайла: RGBA размера TARGET_SIZE (через общий `TextureRegistry`,
+        поэтому одинаковые изображения дают один и тот же объект текстуры).
+        Результат можно передавать в конструктор с `shared_texture=True`
+        для любого количества тайлов - без копий и повторных ресайзов.
+
+        Raises:
+            TypeError: Если pillow_image не является объектом PIL.Image.Image.
+        """
+        if not isinstance(pillow_image, Image.Image):
+            raise TypeError("Изображение для тайла должно быть объектом PIL.Image.Image.")
+        return get_texture_registry().intern(pillow_image, cls.TARGET_SIZE)
+
     def _force_target_size(self):
         """
         Принудительно изменяет размер внутреннего изображения `_raw_image`
         до `TARGET_SIZE`. Использует `Image.Resampling.LANCZOS` для качественного ресайза.
         """
+        if self._texture_handle is not None:
+            return  # Ленивая текстура уже приводится к TARGET_SIZE при декодировании
         if self._raw_image.size != self.TARGET_SIZE:
             try:
                 self._raw_image = self._raw_image.resize(self.TARGET_SIZE, Image.Resampling.LANCZOS)
+                self._texture_shared = False
             except Exception as e:
                 # В библиотеке лучше не выводить print, а логировать или дать возможность обработать
                 # Для простоты оставим print, но это место для улучшения (например, logging)
@@ -62,5 +134,7 @@ class MapTileSprite(BaseSprite):
         # Это установит self._raw_image и конвертирует в RGBA.
         if not isinstance(new_pillow_image, Image.Image):
             raise TypeError("Новое изображение должно быть объектом PIL.Image.Image.")
-        self._raw_image = new_pillow_image.convert("RGBA")
-        self._force_target_size() # Затем применяем наше правило размера
\ No newline at end of file
+        self._raw_image = self.prepare_texture(new_pillow_image)
+        self._texture_handle = None
+        self._texture_shared = True  # Общая текстура реестра; изменения на месте - через detach_texture
+        self._notify_map_image_changed()
\ No newline at end of file
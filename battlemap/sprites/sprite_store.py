@@ -0,0 +1,233 @@
+"""
+Модуль определяет SpriteArrayStore - хранилище позиций, размеров и видимости спрайтов
+в массивах NumPy (struct-of-arrays).
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from battlemap.sprites.base_sprite import BaseSprite
+
+
+class SpriteArrayStore:
+    """
+    Хранилище состояния группы спрайтов (обычно одного слоя) в массивах NumPy.
+
+    Привязанный спрайт (`bind`) хранит x, y и видимость не в себе, а в строке
+    массивов хранилища; его свойства `x`, `y`, `visible`, методы `set_position`
+    и `move` остаются прежними и работают как тонкие представления над массивами.
+    Это позволяет выполнять векторизованные операции над всей группой:
+    отсечение по прямоугольнику (`visible_in_rect`), групповые сдвиги (`move_many`)
+    и переключение видимости (`set_visible_many`).
+
+    Порядок строк совпадает с порядком привязки (порядком отрисовки).
+
+    Атрибуты:
+        x, y (np.ndarray): Координаты левого верхнего угла (int32).
+        width, height (np.ndarray): Размеры области спрайта на холсте (int32).
+        visible (np.ndarray): Флаги видимости (bool).
+    """
+
+    def __init__(self, capacity: int = 64):
+        """
+        Инициализирует SpriteArrayStore.
+
+        Args:
+            capacity (int, optional): Начальная емкость массивов. По умолчанию 64.
+        """
+        capacity = max(int(capacity), 1)
+        self._count: int = 0
+        self._sprites: List[BaseSprite] = []
+        self._x = np.zeros(capacity, dtype=np.int32)
+        self._y = np.zeros(capacity, dtype=np.int32)
+        self._w = np.zeros(capacity, dtype=np.int32)
+        self._h = np.zeros(capacity, dtype=np.int32)
+        self._visible = np.zeros(capacity, dtype=bool)
+
+    # --- Представления массивов (только занятая часть) ---
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._x[:self._count]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._y[:self._count]
+
+    @property
+    def width(self) -> np.ndarray:
+        return self._w[:self._count]
+
+    @property
+    def height(self) -> np.ndarray:
+        return self._h[:self._count]
+
+    @property
+    def visible(self) -> np.ndarray:
+        return self._visible[:self._count]
+
+    @property
+    def sprites(self) -> List[BaseSprite]:
+        """Привязанные спрайты в порядке строк."""
+        return list(self._sprites)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, sprite: BaseSprite) -> bool:
+        return sprite._store is self
+
+    # --- Привязка ---
+
+    def _grow(self):
+        capacity = len(self._x) * 2
+        for name in ("_x", "_y", "_w", "_h", "_visible"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._count] = old[:self._count]
+            setattr(self, name, new)
+
+    def bind(self, sprite: BaseSprite) -> int:
+        """
+        Привязывает спрайт к хранилищу: его позиция и видимость переносятся в массивы.
+
+        Args:
+            sprite (BaseSprite): Спрайт для привязки.
+
+        Returns:
+            int: Номер строки спрайта.
+
+        Raises:
+            TypeError: Если sprite не является BaseSprite.
+            ValueError: Если спрайт уже привязан к другому хранилищу.
+        """
+        if not isinstance(sprite, BaseSprite):
+            raise TypeError("К хранилищу можно привязать только экземпляры BaseSprite.")
+        if sprite._store is self:
+            return sprite._store_index
+        if sprite._store is not None:
+            raise ValueError(f"Спрайт '{sprite.name}' уже привязан к другому SpriteArrayStore.")
+        if self._count == len(self._x):
+            self._grow()
+        index = self._count
+        width, height = sprite._extent()
+        self._x[index] = sprite._x
+        self._y[index] = sprite._y
+        self._w[index] = width
+        self._h[index] = height
+        self._visible[index] = sprite._visible
+        self._sprites.append(sprite)
+        self._count += 1
+        sprite._store = self
+        sprite._store_index = index
+        return index
+
+    def unbind(self, sprite: BaseSprite):
+        """
+        Отвязывает спрайт: текущие значения из массивов возвращаются в сам спрайт.
+        Порядок остальных спрайтов сохраняется. Непривязанный спрайт игнорируется.
+        """
+        if sprite._store is not self:
+            return
+        index = sprite._store_index
+        sprite._x = int(self._x[index])
+        sprite._y = int(self._y[index])
+        sprite._visible = bool(self._visible[index])
+        sprite._store = None
+        sprite._store_index = -1
+
+        last = self._count - 1
+        for array in (self._x, self._y, self._w, self._h, self._visible):
+            array[index:last] = array[index + 1:self._count]
+        del self._sprites[index]
+        self._count = last
+        for shifted_index in range(index, last):
+            self._sprites[shifted_index]._store_index = shifted_index
+
+    def clear(self):
+        """Отвязывает все спрайты."""
+        for index, sprite in enumerate(self._sprites):
+            sprite._x = int(self._x[index])
+            sprite._y = int(self._y[index])
+            sprite._visible = bool(self._visible[index])
+            sprite._store = None
+            sprite._store_index = -1
+        self._sprites.clear()
+        self._count = 0
+
+    def refresh_extent(self, sprite: BaseSprite):
+        """Обновляет ширину и высоту спрайта в массивах (после смены изображения или размера)."""
+        if sprite._store is self:
+            self._w[sprite._store_index], self._h[sprite._store_index] = sprite._extent()
+
+    # --- Групповые операции ---
+
+    def _indices(self, sprites: Optional[Iterable[BaseSprite]]) -> np.ndarray:
+        if sprites is None:
+            return np.arange(self._count)
+        indices = []
+        for sprite in sprites:
+            if sprite._store is not self:
+                raise ValueError(f"Спрайт '{sprite.name}' не привязан к этому SpriteArrayStore.")
+            indices.append(sprite._store_index)
+        return np.asarray(indices, dtype=np.intp)
+
+    def move_many(self, dx: int, dy: int, sprites: Optional[Sequence[BaseSprite]] = None):
+        """
+        Сдвигает спрайты (по умолчанию - все) на (dx, dy) одной векторной операцией.
+        Наблюдатели токенов уведомляются одним пакетом на наблюдателя.
+
+        Args:
+            dx (int): Смещение по оси X.
+            dy (int): Смещение по оси Y.
+            sprites (Optional[Sequence[BaseSprite]], optional): Спрайты для сдвига.
+
+        Raises:
+            ValueError: Если смещения не целые или спрайт не привязан к хранилищу.
+        """
+        if not (isinstance(dx, (int, np.integer)) and isinstance(dy, (int, np.integer))):
+            raise ValueError("Смещения (dx, dy) должны быть целыми числами.")
+        indices = self._indices(sprites)
+        if len(indices) == 0:
+            return
+        self._x[indices] += dx
+        self._y[indices] += dy
+        self._notify_moved([self._sprites[i] for i in indices])
+
+    def set_positions(self, sprites: Sequence[BaseSprite], xs: Sequence[int], ys: Sequence[int]):
+        """Задает позиции нескольких спрайтов одной векторной операцией."""
+        indices = self._indices(sprites)
+        if len(indices) == 0:
+            return
+        self._x[indices] = np.asarray(xs, dtype=np.int32)
+        self._y[indices] = np.asarray(ys, dtype=np.int32)
+        self._notify_moved([self._sprites[i] for i in indices])
+
+    def set_visible_many(self, visible: bool, sprites: Optional[Iterable[BaseSprite]] = None):
+        """Задает видимость спрайтов (по умолчанию - всех)."""
+        self._visible[self._indices(sprites)] = bool(visible)
+
+    def visible_mask_in_rect(self, left: int, top: int, right: int, bottom: int) -> np.ndarray:
+        """
+        Возвращает маску видимых спрайтов, пересекающих прямоугольник [left, right) x [top, bottom).
+        """
+        x, y = self.x, self.y
+        return (self.visible &
+                (x < right) & (x + self.width > left) &
+                (y < bottom) & (y + self.height > top))
+
+    def visible_in_rect(self, left: int, top: int, right: int, bottom: int) -> List[BaseSprite]:
+        """Возвращает видимые спрайты, пересекающие прямоугольник, в порядке отрисовки."""
+        indices = np.flatnonzero(self.visible_mask_in_rect(left, top, right, bottom))
+        return [self._sprites[i] for i in indices]
+
+    @staticmethod
+    def _notify_moved(sprites: List[BaseSprite]):
+        by_type: Dict[type, List[BaseSprite]] = {}
+        for sprite in sprites:
+            by_type.setdefault(type(sprite), []).append(sprite)
+        for sprite_type, group in by_type.items():
+            sprite_type._positions_changed(group)
+
+    def __repr__(self) -> str:
+        return f"<SpriteArrayStore(sprites={self._count}, capacity={len(self._x)})>"
@@ -0,0 +1,156 @@
+"""
+Модуль определяет TextureRegistry - общий для процесса реестр подготовленных текстур,
+который дедуплицирует одинаковые изображения по хешу содержимого.
+"""
+import hashlib
+import threading
+import weakref
+from typing import Dict, Iterable, Optional, Tuple
+
+from PIL import Image
+
+TextureKey = Tuple[str, Tuple[int, int], str, int]  # (хеш источника, размер, режим, фильтр)
+
+
+class TextureRegistry:
+    """
+    Реестр подготовленных (приведенных к режиму и размеру) текстур.
+
+    Ключ текстуры - хеш содержимого исходного изображения (с его режимом и размером),
+    целевой размер, режим и фильтр ресайза. Одинаковые исходные изображения, даже
+    загруженные независимо, разрешаются в один общий объект текстуры - для всех
+    спрайтов и всех экземпляров `SpriteRenderer` в процессе.
+
+    Текстуры хранятся по слабым ссылкам: подготовленная текстура живет, пока на нее
+    ссылается хотя бы один спрайт. Возвращаемые текстуры общие и неизменяемые -
+    для изменения на месте используйте `BaseSprite.detach_texture()`. Потокобезопасен.
+
+    Атрибуты:
+        requests (int): Количество запросов `intern`.
+        hits (int): Количество запросов, разрешенных в уже существующую текстуру.
+        bytes_saved (int): Объем пикселей, не выделенных благодаря дедупликации.
+    """
+
+    def __init__(self):
+        self._textures: "weakref.WeakValueDictionary[TextureKey, Image.Image]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.requests: int = 0
+        self.hits: int = 0
+        self.bytes_saved: int = 0
+
+    @staticmethod
+    def content_hash(pillow_image: Image.Image) -> str:
+        """Возвращает хеш содержимого изображения с учетом его режима и размера."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{pillow_image.mode}:{pillow_image.width}x{pillow_image.height}:".encode("ascii"))
+        digest.update(pillow_image.tobytes())
+        return digest.hexdigest()
+
+    def intern(
+            self,
+            pillow_image: Image.Image,
+            target_size: Optional[Tuple[int, int]] = None,
+            mode: str = "RGBA",
+            resample: Image.Resampling = Image.Resampling.LANCZOS
+            ) -> Image.Image:
+        """
+        Возвращает общую подготовленную текстуру для изображения, создавая ее при первом запросе.
+
+        Args:
+            pillow_image (Image.Image): Исходное изображение (не изменяется и не удерживается).
+            target_size (Optional[Tuple[int, int]], optional): Целевой размер.
+                По умолчанию None (исходный размер).
+            mode (str, optional): Целевой режим. По умолчанию "RGBA".
+            resample (Image.Resampling, optional): Фильтр ресайза. По умолчанию LANCZOS.
+
+        Returns:
+            Image.Image: Общая текстура; изменять ее на месте нельзя.
+
+        Raises:
+            TypeError: Если pillow_image не является объектом PIL.Image.Image.
+        """
+        if not isinstance(pillow_image, Image.Image):
+            raise TypeError("Интернировать можно только объекты PIL.Image.Image.")
+        size = tuple(target_size) if target_size is not None else pillow_image.size
+        return self._intern_hashed(pillow_image, self.content_hash(pillow_image), size, mode, resample)
+
+    def intern_sizes(
+            self,
+            pillow_image: Image.Image,
+            target_sizes: Iterable[Tuple[int, int]],
+            mode: str = "RGBA",
+            resample: Image.Resampling = Image.Resampling.LANCZOS
+            ) -> Dict[Tuple[int, int], Image.Image]:
+        """
+        Возвращает общие подготовленные текстуры изображения сразу для нескольких размеров
+        (каждая получена из исходного изображения, а не из другой подготовленной копии).
+        Хеш содержимого вычисляется один раз.
+
+        Raises:
+            TypeError: Если pillow_image не является объектом PIL.Image.Image.
+        """
+        if not isinstance(pillow_image, Image.Image):
+            raise TypeError("Интернировать можно только объекты PIL.Image.Image.")
+        content_hash = self.content_hash(pillow_image)
+        return {tuple(size): self._intern_hashed(pillow_image, content_hash, tuple(size), mode, resample)
+                for size in target_sizes}
+
+    def _intern_hashed(self, pillow_image: Image.Image, content_hash: str, size: Tuple[int, int], mode: str,
+                       resample: Image.Resampling) -> Image.Image:
+        key: TextureKey = (content_hash, size, mode, int(resample))
+        with self._lock:
+            self.requests += 1
+            texture = self._textures.get(key)
+            if texture is not None:
+                self.hits += 1
+                self.bytes_saved += len(texture.getbands()) * texture.width * texture.height
+                return texture
+
+        texture = pillow_image.convert(mode) if pillow_image.mode != mode else pillow_image
+        if texture.size != size:
+            texture = texture.resize(size, resample)
+        elif texture is pillow_image:
+            texture = pillow_image.copy()  # Реестр не должен разделять изображение с вызывающим кодом
+
+        with self._lock:
+            existing = self._textures.get(key)
+            if existing is not None:
+                # Другой поток успел подготовить ту же текстуру
+                self.hits += 1
+                self.bytes_saved += len(existing.getbands()) * existing.width * existing.height
+                return existing
+            self._textures[key] = texture
+        return texture
+
+    def __len__(self) -> int:
+        return len(self._textures)
+
+    def clear(self):
+        """Забывает все текстуры (уже выданные спрайтам текстуры продолжают работать) и обнуляет статистику."""
+        with self._lock:
+            self._textures.clear()
+            self.requests = 0
+            self.hits = 0
+            self.bytes_saved = 0
+
+    def stats(self) -> Dict[str, float]:
+        """Возвращает статистику дедупликации: запросы, попадания, уникальные текстуры, долю попаданий и сэкономленные байты."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hits": self.hits,
+                "unique": len(self._textures),
+                "hit_ratio": self.hits / self.requests if self.requests else 0.0,
+                "bytes_saved": self.bytes_saved,
+                }
+
+    def __repr__(self) -> str:
+        return f"<TextureRegistry(unique={len(self._textures)}, requests={self.requests}, hits={self.hits})>"
+
+
+_default_registry = TextureRegistry()
+
+
+def get_texture_registry() -> TextureRegistry:
+    """Возвращает общий для процесса реестр текстур."""
+    return _default_registry
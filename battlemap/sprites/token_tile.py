@@ -2,10 +2,12 @@
 Модуль определяет типы размеров токенов и базовый класс для спрайтов токенов.
 """
 from enum import Enum
-from typing import Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from PIL import Image
 from battlemap.sprites.base_sprite import BaseSprite
+from battlemap.sprites.lazy_texture import LazyTexture
 from battlemap.sprites.map_tile import MapTileSprite  # Для констант размера тайла
+from battlemap.sprites.texture_registry import get_texture_registry
 
 
 class TokenSize(Enum):
@@ -44,68 +46,167 @@ class TokenSize(Enum):
         return f"{self.tiles_width}x{self.tiles_height} tiles"
 
 
+class TokenObserver:
+    """
+    Базовый класс наблюдателя за токенами (индексы, реестры и т.п.).
+    Наследники переопределяют нужные методы; по умолчанию они ничего не делают.
+    """
+
+    def on_tokens_moved(self, tokens: Sequence["TokenTileSprite"]):
+        """
+        Вызывается после изменения позиции или логического размера токенов.
+
+        Args:
+            tokens (Sequence[TokenTileSprite]): Токены, footprint которых мог измениться.
+        """
+        pass
+
+    def on_token_owners_changed(self, token: "TokenTileSprite", added: Sequence, removed: Sequence):
+        """
+        Вызывается после изменения списка владельцев токена (`Token.add_owner` и т.п.).
+
+        Args:
+            token (TokenTileSprite): Токен, владельцы которого изменились.
+            added (Sequence[OwnerId]): Добавленные владельцы.
+            removed (Sequence[OwnerId]): Удаленные владельцы.
+        """
+        pass
+
+
 class TokenTileSprite(BaseSprite):
     """
     Базовый класс для спрайтов, представляющих игровые токены.
 
     Текстура (изображение) такого спрайта всегда приводится к фиксированному
     размеру `FIXED_TEXTURE_SIZE` (например, 70x70 пикселей).
-    Логический размер токена на карте определяется атрибутом `token_size_enum`
-    и используется рендерером для масштабирования текстуры при отрисовке.
+    Логический размер токена на карте определяется атрибутом `token_size_enum`.
+
+    Кроме основной текстуры токен хранит подготовленные текстуры для каждого логического
+    размера из `PREPARED_SIZES` (70, 140, 210 px), полученные один раз из исходного
+    изображения. Рендерер берет текстуру ровно нужного размера (`size_texture`) без ресайза
+    в каждом кадре; масштабы отображения используют `texture_for_size`.
 
     Атрибуты класса:
         TEXTURE_WIDTH (int): Ширина текстуры токена по умолчанию.
         TEXTURE_HEIGHT (int): Высота текстуры токена по умолчанию.
         FIXED_TEXTURE_SIZE (Tuple[int, int]): Кортеж (TEXTURE_WIDTH, TEXTURE_HEIGHT).
+        PREPARED_SIZES (Tuple[Tuple[int, int], ...]): Логические размеры всех `TokenSize`.
     """
+    __slots__ = ("_token_size_enum", "_observers", "atlas_regions", "_size_textures")
+
     TEXTURE_WIDTH: int = MapTileSprite.TILE_WIDTH
     TEXTURE_HEIGHT: int = MapTileSprite.TILE_HEIGHT
     FIXED_TEXTURE_SIZE: tuple[int, int] = (TEXTURE_WIDTH, TEXTURE_HEIGHT)
+    PREPARED_SIZES: Tuple[Tuple[int, int], ...] = tuple(
+            dict.fromkeys(token_size.get_logical_pixel_dimensions() for token_size in TokenSize)
+            )
 
     def __init__(
             self,
-            pillow_image: Image.Image,
+            pillow_image: Image.Image | LazyTexture,
             token_size: TokenSize,
             initially_visible: bool = True,
             x: int = 0,
             y: int = 0,
             name: str = "token_sprite",
+            shared_texture: bool = False,
             ):
         """
         Инициализирует TokenTileSprite.
 
         Args:
-            pillow_image (Image.Image): Исходное изображение для текстуры токена.
-                                       Будет изменено до FIXED_TEXTURE_SIZE.
+            pillow_image (Image.Image | LazyTexture): Исходное изображение для текстуры токена.
+                                       Будет изменено до FIXED_TEXTURE_SIZE и до каждого из
+                                       PREPARED_SIZES (ленивая текстура - при декодировании).
+                                       Одинаковые изображения разрешаются в общие текстуры
+                                       через `TextureRegistry`.
             token_size (TokenSize): Логический размер токена на карте.
             initially_visible (bool, optional): Начальная видимость спрайта.
                                                 По умолчанию True.
             x (int, optional): Начальная X-координата. По умолчанию 0.
             y (int, optional): Начальная Y-координата. По умолчанию 0.
             name (str, optional): Имя спрайта. По умолчанию "token_sprite".
+            shared_texture (bool, optional): Использовать уже подготовленную RGBA текстуру
+                                             FIXED_TEXTURE_SIZE как есть, без копирования.
+                                             Ограничение: исходника больше нет, поэтому текстуры
+                                             140x140 и 210x210 получаются увеличением этой 70x70
+                                             (заметно мягче). Для четкой графики крупных токенов
+                                             передавайте изображение не меньше max(PREPARED_SIZES)
+                                             (тогда флаг не применяется и все размеры готовятся из него).
+                                             По умолчанию False.
         """
-        self.token_size_enum: TokenSize = token_size
-
-        processed_image: Image.Image
-        if pillow_image.size != self.FIXED_TEXTURE_SIZE:
-            try:
-                processed_image = pillow_image.resize(
-                        self.FIXED_TEXTURE_SIZE,
-                        Image.Resampling.LANCZOS
-                        )
-            except Exception as e:
-                # Логирование или предупреждение
-                print(
-                    f"Warning: TokenTileSprite '{name}': Error resizing image to {self.FIXED_TEXTURE_SIZE}: {e}. "
-                    f"Using original size {pillow_image.size}."
-                    )
-                processed_image = pillow_image
-        else:
+        self._token_size_enum: TokenSize = token_size
+        self._observers: List[TokenObserver] = []
+        # Области атласа (TextureAtlas.pack_token) с вариантами текстуры по логическим размерам
+        self.atlas_regions: Dict[Tuple[int, int], Any] = {}
+        # Подготовленные текстуры по логическим размерам (общие, из TextureRegistry или ленивые)
+        self._size_textures: Dict[Tuple[int, int], Image.Image | LazyTexture] = {}
+
+        processed_image: Image.Image | LazyTexture
+        if isinstance(pillow_image, LazyTexture):
+            processed_image = pillow_image.derive(self.FIXED_TEXTURE_SIZE)
+            self._size_textures = {size: pillow_image.derive(size) for size in self.PREPARED_SIZES}
+        elif shared_texture and pillow_image.mode == "RGBA" and pillow_image.size == self.FIXED_TEXTURE_SIZE:
             processed_image = pillow_image
-
-        super().__init__(processed_image, x, y, name)
+            larger_sizes = [size for size in self.PREPARED_SIZES if size != self.FIXED_TEXTURE_SIZE]
+            self._size_textures = self._prepare_size_textures(pillow_image, name, larger_sizes)
+            self._size_textures[self.FIXED_TEXTURE_SIZE] = pillow_image
+        else:
+            self._size_textures = self._prepare_size_textures(pillow_image, name)
+            processed_image = self._size_textures.get(self.FIXED_TEXTURE_SIZE)
+            if processed_image is None:
+                processed_image, shared_texture = self._intern_texture(pillow_image, name)
+            else:
+                shared_texture = True
+
+        super().__init__(processed_image, x, y, name, shared_texture=shared_texture)
         self.visible = initially_visible
 
+    @property
+    def token_size_enum(self) -> TokenSize:
+        """Логический размер токена на карте."""
+        return self._token_size_enum
+
+    @token_size_enum.setter
+    def token_size_enum(self, token_size: TokenSize):
+        self._token_size_enum = token_size
+        self._extent_changed()
+        self._position_changed()  # Footprint токена изменился
+
+    def add_observer(self, observer: TokenObserver):
+        """Подписывает наблюдателя на изменения позиции и размера токена."""
+        if observer not in self._observers:
+            self._observers.append(observer)
+
+    def remove_observer(self, observer: TokenObserver):
+        """Отписывает наблюдателя, если он был подписан."""
+        try:
+            self._observers.remove(observer)
+        except ValueError:
+            pass
+
+    def _position_changed(self):
+        for observer in tuple(self._observers):
+            observer.on_tokens_moved((self,))
+
+    @classmethod
+    def _positions_changed(cls, sprites):
+        """Уведомляет каждого наблюдателя одним пакетом со всеми его сдвинутыми токенами."""
+        batches: dict = {}
+        for token in sprites:
+            for observer in token._observers:
+                batches.setdefault(id(observer), (observer, []))[1].append(token)
+        for observer, tokens in batches.values():
+            observer.on_tokens_moved(tokens)
+
+    def frozen_copy(self) -> "TokenTileSprite":
+        clone = super().frozen_copy()
+        clone._observers = []
+        return clone
+
+    def _extent(self) -> Tuple[int, int]:
+        return self.token_size_enum.get_logical_pixel_dimensions()
+
     @property
     def logical_pixel_width(self) -> int:
         """
@@ -134,34 +235,115 @@ class TokenTileSprite(BaseSprite):
         """Переключает состояние видимости спрайта."""
         self.visible = not self.visible
 
+    @classmethod
+    def _intern_texture(cls, pillow_image: Image.Image, name: str) -> Tuple[Image.Image, bool]:
+        """
+        Возвращает общую текстуру FIXED_TEXTURE_SIZE из `TextureRegistry` и флаг общей текстуры.
+        При ошибке подготовки возвращает исходное изображение (спрайт получит свою копию).
+        """
+        try:
+            return get_texture_registry().intern(pillow_image, cls.FIXED_TEXTURE_SIZE), True
+        except Exception as e:
+            # Логирование или предупреждение
+            print(
+                f"Warning: TokenTileSprite '{name}': Error resizing image to {cls.FIXED_TEXTURE_SIZE}: {e}. "
+                f"Using original size {pillow_image.size}."
+                )
+            return pillow_image, False
+
+    @classmethod
+    def _prepare_size_textures(
+            cls, pillow_image: Image.Image, name: str,
+            sizes: Optional[Sequence[Tuple[int, int]]] = None
+            ) -> Dict[Tuple[int, int], Image.Image]:
+        """
+        Готовит общие текстуры размеров sizes (по умолчанию всех PREPARED_SIZES) из исходного
+        изображения (`TextureRegistry.intern_sizes`). При ошибке возвращает пустой словарь -
+        тогда рендерер масштабирует основную текстуру.
+        """
+        sizes = cls.PREPARED_SIZES if sizes is None else sizes
+        try:
+            return get_texture_registry().intern_sizes(pillow_image, sizes)
+        except Exception as e:
+            print(f"Warning: TokenTileSprite '{name}': Error preparing textures {tuple(sizes)}: {e}.")
+            return {}
+
+    def size_texture(self, size: Tuple[int, int]) -> Optional[Image.Image | LazyTexture]:
+        """
+        Возвращает подготовленную текстуру ровно размера size (изображение или ленивую текстуру)
+        или None, если такой нет.
+        """
+        return self._size_textures.get(size)
+
+    @property
+    def prepared_sizes(self) -> List[Tuple[int, int]]:
+        """Размеры, для которых у токена есть подготовленные текстуры."""
+        return sorted(self._size_textures)
+
+    def texture_for_size(
+            self, size: Tuple[int, int],
+            resample: Image.Resampling = Image.Resampling.LANCZOS
+            ) -> Image.Image:
+        """
+        Возвращает текстуру токена размера size: подготовленную, если размер совпадает,
+        иначе уменьшенную из ближайшей большей подготовленной (или основной) текстуры.
+        Используется для масштабов отображения, отличных от логического размера.
+        """
+        size = (max(1, int(size[0])), max(1, int(size[1])))
+        prepared = self._size_textures.get(size)
+        if prepared is not None:
+            return prepared.get() if isinstance(prepared, LazyTexture) else prepared
+        larger = [s for s in self._size_textures if s[0] >= size[0] and s[1] >= size[1]]
+        if larger:
+            source = self._size_textures[min(larger, key=lambda s: s[0] * s[1])]
+        elif self._size_textures:
+            source = self._size_textures[max(self._size_textures, key=lambda s: s[0] * s[1])]
+        else:
+            source = self.image
+        source = source.get() if isinstance(source, LazyTexture) else source
+        return source if source.size == size else source.resize(size, resample)
+
+    def source_texture(self) -> Image.Image:
+        """Наибольшая подготовленная текстура (лучшее доступное качество, например для сохранения сцены)."""
+        if not self._size_textures:
+            return self.image
+        return self.texture_for_size(max(self._size_textures, key=lambda s: s[0] * s[1]))
+
     @BaseSprite.image.setter
     def image(self, new_pillow_image: Image.Image):
         """
         Устанавливает новое изображение для текстуры токена.
-        Новое изображение будет конвертировано в RGBA и изменено до FIXED_TEXTURE_SIZE.
+        Новое изображение будет конвертировано в RGBA и изменено до FIXED_TEXTURE_SIZE
+        и до всех PREPARED_SIZES (через общий `TextureRegistry`).
         """
         if not isinstance(new_pillow_image, Image.Image):
             raise TypeError("Новое изображение должно быть объектом PIL.Image.Image.")
 
-        resized_image: Image.Image
-        if new_pillow_image.size != self.FIXED_TEXTURE_SIZE:
-            try:
-                resized_image = new_pillow_image.resize(
-                        self.FIXED_TEXTURE_SIZE,
-                        Image.Resampling.LANCZOS
-                        )
-            except Exception as e:
-                print(
-                    f"Warning: TokenTileSprite '{self.name}': Error resizing new image: {e}. "
-                    f"Using original size {new_pillow_image.size}."
-                    )
-                resized_image = new_pillow_image
+        self._size_textures = self._prepare_size_textures(new_pillow_image, self.name)
+        texture = self._size_textures.get(self.FIXED_TEXTURE_SIZE)
+        shared = texture is not None
+        if not shared:
+            texture, shared = self._intern_texture(new_pillow_image, self.name)
+        if shared:
+            self._raw_image = texture
+            self._texture_handle = None
+            self._texture_shared = True
+            self._extent_changed()
         else:
-            resized_image = new_pillow_image
+            # Используем BaseSprite.image.fset для вызова сеттера родительского класса
+            # Это важно, если в BaseSprite.image.setter есть своя логика (например, конвертация в RGBA)
+            BaseSprite.image.fset(self, texture)
+        self.atlas_regions = {}  # Варианты в атласе относятся к старой текстуре
 
-        # Используем BaseSprite.image.fset для вызова сеттера родительского класса
-        # Это важно, если в BaseSprite.image.setter есть своя логика (например, конвертация в RGBA)
-        BaseSprite.image.fset(self, resized_image)
+    def detach_texture(self) -> Image.Image:
+        """
+        Копирование при записи; области атласа и подготовленные текстуры размеров сбрасываются,
+        так как основная текстура будет изменена (далее она масштабируется при отрисовке).
+        """
+        self.atlas_regions = {}
+        if self._texture_shared:
+            self._size_textures = {}
+        return super().detach_texture()
 
     def set_grid_position(
             self, grid_col: int, grid_row: int,
@@ -183,8 +365,8 @@ class TokenTileSprite(BaseSprite):
         if not (isinstance(grid_col, int) and isinstance(grid_row, int)):
             raise ValueError("Координаты сетки (grid_col, grid_row) должны быть целыми числами.")
 
-        self.x = grid_col * tile_width
-        self.y = grid_row * tile_height
+        self._write_position(grid_col * tile_width, grid_row * tile_height)
+        self._position_changed()
 
     def get_grid_position(
             self,
@@ -1,2 +1,5 @@
 from .battle_map import BattleMap
-from .token import Token, TokenId, OwnerId
\ No newline at end of file
+from .token import Token, TokenId, OwnerId
+from .occupancy import TokenOccupancyIndex
+from .token_registry import TokenRegistry
+from .vision import VisionEngine
\ No newline at end of file
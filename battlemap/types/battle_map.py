@@ -1,15 +1,42 @@
 """
 Модуль определяет класс BattleMap для управления сеткой тайлов карты.
 """
-from typing import List, Optional
+import weakref
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
 from PIL import Image
 from battlemap.sprites.map_tile import MapTileSprite
+from battlemap.profiling import traced
 
 
 class BattleMap:
     """
     Управляет 2D сеткой тайлов `MapTileSprite` для игровой карты.
+
+    Сетка хранится компактно: массив `tile_indices` (int32, [row, col]) содержит
+    индексы в палитре `palette` уникальных подготовленных текстур (RGBA 70x70),
+    `EMPTY_TILE` (-1) обозначает пустую ячейку. Объекты `MapTileSprite` создаются
+    только по запросу (`get_tile`, `get_all_tiles`) и не удерживаются картой,
+    кроме спрайтов, переданных явно через `set_tile`.
+
+    Палитра не растет бесконечно: когда в ней набирается PALETTE_RECLAIM_MIN элементов
+    и вдвое больше, чем используется, элементы, текстуры которых были на карте, но больше
+    не используются ни одной ячейкой, переиспользуются для новых текстур. Индексы
+    используемых и еще не назначенных ячейкам текстур не меняются; полностью перенумеровать
+    палитру можно явно через `compact_palette`.
+
+    Атрибуты класса:
+        EMPTY_TILE (int): Индекс палитры для пустой ячейки.
+        CHANGE_LOG_SIZE (int): Сколько последних изменений сетки хранится для
+                               инкрементальных потребителей (`changes_since`).
+        PALETTE_RECLAIM_MIN (int): Размер палитры, начиная с которого освобожденные
+                                   элементы переиспользуются.
     """
+    EMPTY_TILE: int = -1
+    CHANGE_LOG_SIZE: int = 256
+    PALETTE_RECLAIM_MIN: int = 64
 
     def __init__(
             self,
@@ -40,19 +67,143 @@ class BattleMap:
         self.tile_pixel_width: int = MapTileSprite.TILE_WIDTH
         self.tile_pixel_height: int = MapTileSprite.TILE_HEIGHT
 
-        self.tiles: List[List[Optional[MapTileSprite]]] = \
-            [[None for _ in range(map_width_tiles)] for _ in range(map_height_tiles)]
+        # Компактное хранилище: индексы палитры по ячейкам + палитра уникальных текстур
+        self.tile_indices: np.ndarray = np.full((map_height_tiles, map_width_tiles), self.EMPTY_TILE, dtype=np.int32)
+        self.palette: List[Image.Image] = []
+        self._palette_lookup: Dict[int, int] = {}  # id(текстуры) -> индекс палитры
+        # Элементы, еще не назначенные ни одной ячейке (их индексы держит вызывающий код)
+        self._palette_unassigned: Set[int] = set()
+        # Освобожденные элементы (текстура была на карте и больше не используется)
+        self._palette_free: List[int] = []
+        self._palette_reclaim_at: int = self.PALETTE_RECLAIM_MIN
+
+        # Спрайты, явно установленные через set_tile, удерживаются картой
+        self._explicit_tiles: Dict[Tuple[int, int], MapTileSprite] = {}
+        # Спрайты, созданные по запросу, живут, пока на них есть внешние ссылки
+        self._materialized_tiles: "weakref.WeakValueDictionary[Tuple[int, int], MapTileSprite]" = \
+            weakref.WeakValueDictionary()
+
+        # Ревизия сетки тайлов и журнал измененных областей (revision, row_start, col_start, row_end, col_end)
+        self.revision: int = 0
+        self._change_log: deque = deque(maxlen=self.CHANGE_LOG_SIZE)
+
+        # Битовая карта блокирующих ячеек (стены и т.п.): True - ячейка перекрывает обзор.
+        # Индексация [row, col], как и у tile_indices.
+        self.blocking: np.ndarray = np.zeros((map_height_tiles, map_width_tiles), dtype=bool)
 
         if default_tile_image:
             self.fill_with_default_tiles(default_tile_image)  # Переименовал для ясности
 
-    def fill_with_default_tiles(self, pillow_image: Image.Image):
+    # --- Палитра ---
+
+    @traced("BattleMap.add_palette_texture", "battle_map")
+    def add_palette_texture(self, pillow_image: Image.Image, prepared: bool = False) -> int:
+        """
+        Добавляет текстуру в палитру карты и возвращает ее индекс.
+        Повторное добавление того же объекта текстуры возвращает существующий индекс.
+
+        Индекс действителен, пока текстура используется ячейками или еще не назначена
+        ни одной из них: индекс текстуры, которую полностью перезаписали на карте,
+        может быть отдан новой текстуре - получайте его заново этим методом.
+
+        Args:
+            pillow_image (Image.Image): Изображение тайла.
+            prepared (bool, optional): True, если изображение уже RGBA размера
+                                       `MapTileSprite.TARGET_SIZE` и может храниться
+                                       без копирования. По умолчанию False.
+
+        Returns:
+            int: Индекс текстуры в палитре.
+        """
+        texture = pillow_image
+        if not (prepared and pillow_image.mode == "RGBA" and pillow_image.size == MapTileSprite.TARGET_SIZE):
+            texture = MapTileSprite.prepare_texture(pillow_image)
+        return self._intern_texture(texture)
+
+    def _intern_texture(self, texture: Image.Image) -> int:
+        palette_id = self._palette_lookup.get(id(texture))
+        if palette_id is not None and self.palette[palette_id] is texture:
+            return palette_id
+        if not self._palette_free and len(self.palette) >= self._palette_reclaim_at:
+            self._reclaim_palette()
+        if self._palette_free:
+            palette_id = self._palette_free.pop()
+            self.palette[palette_id] = texture
+        else:
+            palette_id = len(self.palette)
+            self.palette.append(texture)
+        self._palette_lookup[id(texture)] = palette_id
+        self._palette_unassigned.add(palette_id)
+        return palette_id
+
+    def _reclaim_palette(self):
+        """
+        Находит освобожденные элементы палитры для переиспользования. Проверка проходит
+        по всем ячейкам, поэтому следующая назначается, когда палитра вдвое превысит
+        число занятых элементов: в среднем на добавление текстуры она стоит O(1).
+        """
+        unused = np.flatnonzero(self.palette_usage() == 0).tolist()
+        self._palette_free = sorted((i for i in unused if i not in self._palette_unassigned), reverse=True)
+        for palette_id in self._palette_free:
+            # Повторное добавление той же текстуры не должно вернуть элемент, который будет переиспользован
+            texture_id = id(self.palette[palette_id])
+            if self._palette_lookup.get(texture_id) == palette_id:
+                del self._palette_lookup[texture_id]
+        occupied = len(self.palette) - len(self._palette_free)
+        self._palette_reclaim_at = max(self.PALETTE_RECLAIM_MIN, 2 * occupied)
+
+    def _mark_assigned(self, palette_ids: int | np.ndarray):
+        """Отмечает элементы палитры, назначенные ячейкам."""
+        if not self._palette_unassigned:
+            return
+        if isinstance(palette_ids, np.ndarray):
+            self._palette_unassigned.difference_update(np.unique(palette_ids).tolist())
+        else:
+            self._palette_unassigned.discard(palette_ids)
+
+    def _check_palette_id(self, palette_id: int):
+        if not (palette_id == self.EMPTY_TILE or 0 <= palette_id < len(self.palette)):
+            raise IndexError(f"Индекс палитры {palette_id} вне диапазона (размер палитры {len(self.palette)}).")
+
+    @traced("BattleMap.compact_palette", "battle_map")
+    def compact_palette(self):
+        """
+        Удаляет из палитры текстуры, не используемые ни одной ячейкой,
+        и перенумеровывает индексы в `tile_indices`.
+        """
+        used = np.zeros(len(self.palette), dtype=bool)
+        filled = self.tile_indices[self.tile_indices != self.EMPTY_TILE]
+        used[filled] = True
+        if used.all():
+            return
+        remap = np.full(len(self.palette), self.EMPTY_TILE, dtype=np.int32)
+        remap[used] = np.arange(int(used.sum()), dtype=np.int32)
+        self.palette = [texture for texture, keep in zip(self.palette, used) if keep]
+        self._palette_lookup = {id(texture): i for i, texture in enumerate(self.palette)}
+        self._palette_unassigned = set()
+        self._palette_free = []
+        self._palette_reclaim_at = max(self.PALETTE_RECLAIM_MIN, 2 * len(self.palette))
+        mask = self.tile_indices != self.EMPTY_TILE
+        self.tile_indices[mask] = remap[self.tile_indices[mask]]
+
+    # --- Заполнение и изменение ячеек ---
+
+    @traced("BattleMap.fill_with_default_tiles", "battle_map")
+    def fill_with_default_tiles(self, pillow_image: Image.Image, shared_texture: bool = True):
         """
         Заполняет всю карту тайлами, используя предоставленное изображение.
-        Для каждого тайла создается копия изображения.
+
+        По умолчанию изображение один раз приводится к RGBA 70x70
+        (`MapTileSprite.prepare_texture`) и добавляется в палитру; все ячейки
+        ссылаются на эту общую неизменяемую текстуру. Замена изображения отдельного
+        тайла (сеттер `image`, `detach_texture()` или `set_tile`) не затрагивает
+        остальные ячейки.
 
         Args:
             pillow_image (Image.Image): Изображение для тайлов.
+            shared_texture (bool, optional): Если False, для каждого тайла создается
+                                             собственный спрайт с копией изображения (старое поведение).
+                                             По умолчанию True.
 
         Raises:
             TypeError: Если pillow_image не является объектом PIL.Image.Image.
@@ -60,23 +211,131 @@ class BattleMap:
         if not isinstance(pillow_image, Image.Image):
             raise TypeError("Изображение для тайла должно быть объектом PIL.Image.Image.")
 
+        if shared_texture:
+            palette_id = self.add_palette_texture(pillow_image)
+            self.fill_region(0, 0, self.map_height_tiles, self.map_width_tiles, palette_id)
+            return
+
         for r in range(self.map_height_tiles):
             for c in range(self.map_width_tiles):
-                # Копируем изображение, чтобы каждый тайл имел свой независимый экземпляр
-                # Это особенно важно, если изображение может быть модифицировано после создания спрайта
-                # (хотя MapTileSprite его все равно ресайзит, но это хорошая практика)
-                tile_img_copy = pillow_image.copy()
-                self.tiles[r][c] = MapTileSprite(
-                        pillow_image=tile_img_copy,
+                tile = MapTileSprite(
+                        pillow_image=pillow_image,
                         x=c * self.tile_pixel_width,
                         y=r * self.tile_pixel_height,
                         name=f"map_tile_{r}_{c}"
                         )
+                # Каждый тайл получает свой независимый экземпляр текстуры,
+                # который можно изменять на месте
+                tile.detach_texture()
+                self.set_tile(r, c, tile)
+
+    def _release_cell_sprites(self, rows: np.ndarray, cols: np.ndarray):
+        """Отвязывает спрайты (явные и созданные по запросу) от перечисленных ячеек."""
+        if not self._explicit_tiles and not self._materialized_tiles:
+            return
+        affected = np.zeros(self.tile_indices.shape, dtype=bool)
+        affected[rows, cols] = True
+        for storage in (self._explicit_tiles, self._materialized_tiles):
+            for cell in [cell for cell in list(storage.keys()) if affected[cell]]:
+                sprite = storage.pop(cell, None)
+                if sprite is not None:
+                    sprite._unbind_from_map(self)
+
+    @traced("BattleMap.fill_region", "battle_map")
+    def fill_region(self, row_start: int, col_start: int, row_end: int, col_end: int, palette_id: int):
+        """
+        Заполняет прямоугольную область ячеек одной текстурой палитры.
+        Границы задаются как в срезах: [row_start, row_end) x [col_start, col_end)
+        и обрезаются по размерам карты.
+
+        Args:
+            palette_id (int): Индекс палитры или `EMPTY_TILE` для очистки области.
+
+        Raises:
+            IndexError: Если palette_id вне палитры.
+        """
+        self._check_palette_id(palette_id)
+        row_start, row_end = max(0, row_start), min(self.map_height_tiles, row_end)
+        col_start, col_end = max(0, col_start), min(self.map_width_tiles, col_end)
+        if row_start >= row_end or col_start >= col_end:
+            return
+        rows, cols = np.mgrid[row_start:row_end, col_start:col_end]
+        self._release_cell_sprites(rows.ravel(), cols.ravel())
+        self.tile_indices[row_start:row_end, col_start:col_end] = palette_id
+        self._mark_assigned(palette_id)
+        self._record_change(row_start, col_start, row_end, col_end)
+
+    @traced("BattleMap.set_cells", "battle_map")
+    def set_cells(self, rows: Sequence[int] | np.ndarray, cols: Sequence[int] | np.ndarray,
+                  palette_ids: int | Sequence[int] | np.ndarray):
+        """
+        Векторно устанавливает текстуры палитры для набора ячеек.
+
+        Args:
+            rows: Индексы строк.
+            cols: Индексы столбцов (той же длины, что и rows).
+            palette_ids: Один индекс палитры для всех ячеек или массив индексов той же длины.
+
+        Raises:
+            IndexError: Если ячейки выходят за пределы карты или индексы палитры некорректны.
+            ValueError: Если длины массивов не совпадают.
+        """
+        rows = np.asarray(rows, dtype=np.intp).ravel()
+        cols = np.asarray(cols, dtype=np.intp).ravel()
+        ids = np.asarray(palette_ids, dtype=np.int32)
+        if rows.shape != cols.shape or (ids.ndim and ids.shape != rows.shape):
+            raise ValueError("Длины массивов rows, cols и palette_ids должны совпадать.")
+        if rows.size == 0:
+            return
+        if rows.min() < 0 or rows.max() >= self.map_height_tiles or \
+                cols.min() < 0 or cols.max() >= self.map_width_tiles:
+            raise IndexError("Координаты ячеек выходят за пределы карты.")
+        if ids.min() < self.EMPTY_TILE or ids.max() >= len(self.palette):
+            raise IndexError(f"Индексы палитры вне диапазона (размер палитры {len(self.palette)}).")
+        self._release_cell_sprites(rows, cols)
+        self.tile_indices[rows, cols] = ids
+        self._mark_assigned(ids)
+        if rows.size <= 64:
+            for r, c in zip(rows.tolist(), cols.tolist()):
+                self._record_change(r, c, r + 1, c + 1)
+        else:
+            self._record_change(int(rows.min()), int(cols.min()), int(rows.max()) + 1, int(cols.max()) + 1)
+
+    def cells_with_palette_id(self, palette_id: int) -> np.ndarray:
+        """
+        Возвращает координаты всех ячеек с указанной текстурой палитры.
+
+        Returns:
+            np.ndarray: Массив формы (N, 2) с парами (row, col).
+        """
+        return np.argwhere(self.tile_indices == palette_id)
+
+    def used_textures(self) -> List[Image.Image]:
+        """
+        Возвращает уникальные текстуры, отображаемые хотя бы в одной ячейке
+        (текстуры палитры и текущие изображения явно установленных спрайтов).
+        """
+        used_ids = np.unique(self.tile_indices[self.tile_indices != self.EMPTY_TILE])
+        textures: Dict[int, Image.Image] = {id(self.palette[i]): self.palette[i] for i in used_ids.tolist()}
+        for tile in self._explicit_tiles.values():
+            textures[id(tile.image)] = tile.image
+        return list(textures.values())
+
+    def explicit_tile_cells(self) -> List[Tuple[int, int]]:
+        """Возвращает ячейки (row, col) со спрайтами, установленными явно через `set_tile`."""
+        return sorted(self._explicit_tiles)
+
+    def palette_usage(self) -> np.ndarray:
+        """Возвращает количество ячеек, использующих каждую текстуру палитры."""
+        filled = self.tile_indices[self.tile_indices != self.EMPTY_TILE]
+        return np.bincount(filled, minlength=len(self.palette))
 
+    @traced("BattleMap.set_tile", "battle_map")
     def set_tile(self, row: int, col: int, tile_sprite: MapTileSprite):
         """
         Устанавливает указанный `MapTileSprite` в ячейку карты (row, col).
         Позиция спрайта будет скорректирована, если она не соответствует ячейке.
+        Спрайт удерживается картой, а его текстура добавляется в палитру.
 
         Args:
             row (int): Индекс строки.
@@ -100,26 +359,177 @@ class BattleMap:
         if tile_sprite.x != expected_x or tile_sprite.y != expected_y:
             tile_sprite.set_position(expected_x, expected_y)
 
-        self.tiles[row][col] = tile_sprite
+        cell = (row, col)
+        old_cell = tile_sprite._map_cell if tile_sprite._battle_map is self else None
+        if old_cell is not None and old_cell != cell and self._explicit_tiles.get(old_cell) is tile_sprite:
+            # Спрайт переносится из другой ячейки: старая ячейка сохраняет текстуру из палитры
+            del self._explicit_tiles[old_cell]
+        if self._explicit_tiles.get(cell) is not tile_sprite:
+            self._release_cell_sprites(np.array([row]), np.array([col]))
+        tile_sprite._bind_to_map(self, cell)
+        self._explicit_tiles[cell] = tile_sprite
+        palette_id = self._intern_texture(tile_sprite.image)
+        self.tile_indices[row, col] = palette_id
+        self._mark_assigned(palette_id)
+        self._record_change(row, col, row + 1, col + 1)
+
+    def _on_tile_image_changed(self, tile_sprite: MapTileSprite, cell: Tuple[int, int]):
+        """
+        Вызывается спрайтом ячейки после замены его изображения.
+        Спрайт становится явным (удерживается картой), палитра обновляется.
+        """
+        if self._explicit_tiles.get(cell) is not tile_sprite and \
+                self._materialized_tiles.get(cell) is not tile_sprite:
+            tile_sprite._unbind_from_map(self)
+            return
+        self._materialized_tiles.pop(cell, None)
+        self._explicit_tiles[cell] = tile_sprite
+        palette_id = self._intern_texture(tile_sprite.image)
+        self.tile_indices[cell] = palette_id
+        self._mark_assigned(palette_id)
+        self._record_change(cell[0], cell[1], cell[0] + 1, cell[1] + 1)
+
+    # --- Журнал изменений ---
+
+    def _record_change(self, row_start: int, col_start: int, row_end: int, col_end: int):
+        self.revision += 1
+        self._change_log.append((self.revision, row_start, col_start, row_end, col_end))
+
+    def changes_since(self, revision: int) -> Optional[List[Tuple[int, int, int, int]]]:
+        """
+        Возвращает области ячеек (row_start, col_start, row_end, col_end), измененные
+        после указанной ревизии. Границы - как в срезах.
+
+        Returns:
+            Optional[List[Tuple[int, int, int, int]]]: Список областей (пустой, если изменений нет)
+                или None, если журнал уже не покрывает эту ревизию и нужно
+                перечитать карту целиком.
+        """
+        if revision >= self.revision:
+            return []
+        if not self._change_log or self._change_log[0][0] > revision + 1:
+            return None
+        return [entry[1:] for entry in self._change_log if entry[0] > revision]
 
     def get_tile(self, row: int, col: int) -> Optional[MapTileSprite]:
         """
         Возвращает `MapTileSprite` из указанной ячейки (row, col) или None,
         если ячейка пуста или выходит за пределы карты.
+        Для ячеек, заполненных из палитры, спрайт создается по запросу и ссылается
+        на общую текстуру; пока на него есть ссылки, повторные вызовы возвращают тот же объект.
+        """
+        if not (0 <= row < self.map_height_tiles and 0 <= col < self.map_width_tiles):
+            return None
+        cell = (row, col)
+        tile = self._explicit_tiles.get(cell)
+        if tile is not None:
+            return tile
+        palette_id = int(self.tile_indices[row, col])
+        if palette_id == self.EMPTY_TILE:
+            return None
+        tile = self._materialized_tiles.get(cell)
+        if tile is None:
+            tile = MapTileSprite(
+                    pillow_image=self.palette[palette_id],
+                    x=col * self.tile_pixel_width,
+                    y=row * self.tile_pixel_height,
+                    name=f"map_tile_{row}_{col}",
+                    shared_texture=True
+                    )
+            tile._bind_to_map(self, cell)
+            self._materialized_tiles[cell] = tile
+        return tile
+
+    def get_cell_texture(self, row: int, col: int) -> Optional[Image.Image]:
+        """
+        Возвращает текстуру ячейки без создания спрайта или None для пустой ячейки.
         """
         if not (0 <= row < self.map_height_tiles and 0 <= col < self.map_width_tiles):
             return None
-        return self.tiles[row][col]
+        tile = self._explicit_tiles.get((row, col))
+        if tile is not None:
+            return tile.image
+        palette_id = int(self.tile_indices[row, col])
+        return None if palette_id == self.EMPTY_TILE else self.palette[palette_id]
+
+    @property
+    def tiles(self) -> List[List[Optional[MapTileSprite]]]:
+        """
+        Сетка спрайтов в виде списка списков [row][col] (совместимость со старым API).
+        Создает спрайты для всех заполненных ячеек. Это снимок: изменения самого списка
+        на карту не влияют - используйте `set_tile` или `set_cells`.
+        """
+        return [[self.get_tile(r, c) for c in range(self.map_width_tiles)]
+                for r in range(self.map_height_tiles)]
+
+    @tiles.setter
+    def tiles(self, value):
+        raise AttributeError("Сетку tiles нельзя присвоить: используйте set_tile, set_cells или fill_region.")
+
+    def _check_cell(self, row: int, col: int):
+        if not (0 <= row < self.map_height_tiles and 0 <= col < self.map_width_tiles):
+            raise IndexError(
+                    f"Координаты тайла ({row}, {col}) выходят за пределы карты "
+                    f"({self.map_height_tiles}x{self.map_width_tiles})."
+                    )
+
+    def set_blocking(self, row: int, col: int, blocked: bool = True):
+        """
+        Помечает ячейку (row, col) как блокирующую обзор (стена) или снимает пометку.
+
+        Raises:
+            IndexError: Если row или col выходят за пределы карты.
+        """
+        self._check_cell(row, col)
+        self.blocking[row, col] = blocked
+
+    @traced("BattleMap.set_blocking_region", "battle_map")
+    def set_blocking_region(self, row_start: int, col_start: int, row_end: int, col_end: int, blocked: bool = True):
+        """
+        Помечает прямоугольную область ячеек как блокирующую или свободную.
+        Границы задаются как в срезах: [row_start, row_end) x [col_start, col_end)
+        и обрезаются по размерам карты.
+        """
+        row_start, row_end = max(0, row_start), min(self.map_height_tiles, row_end)
+        col_start, col_end = max(0, col_start), min(self.map_width_tiles, col_end)
+        if row_start < row_end and col_start < col_end:
+            self.blocking[row_start:row_end, col_start:col_end] = blocked
+
+    @traced("BattleMap.set_blocking_mask", "battle_map")
+    def set_blocking_mask(self, mask: np.ndarray):
+        """
+        Заменяет всю битовую карту блокирующих ячеек.
+
+        Args:
+            mask (np.ndarray): Массив формы (map_height_tiles, map_width_tiles),
+                               приводится к bool.
+
+        Raises:
+            ValueError: Если форма массива не совпадает с размером карты.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        if mask.shape != self.blocking.shape:
+            raise ValueError(
+                    f"Форма маски {mask.shape} не совпадает с размером карты {self.blocking.shape}."
+                    )
+        self.blocking[...] = mask
+
+    def is_blocking(self, row: int, col: int) -> bool:
+        """
+        Возвращает True, если ячейка блокирует обзор.
+        Ячейки за пределами карты считаются блокирующими.
+        """
+        if not (0 <= row < self.map_height_tiles and 0 <= col < self.map_width_tiles):
+            return True
+        return bool(self.blocking[row, col])
 
     def get_all_tiles(self) -> List[MapTileSprite]:
-        """Возвращает плоский список всех не-None `MapTileSprite` на карте."""
-        all_map_tiles: List[MapTileSprite] = []
-        for r_idx in range(self.map_height_tiles):
-            for c_idx in range(self.map_width_tiles):
-                tile = self.tiles[r_idx][c_idx]
-                if tile is not None:
-                    all_map_tiles.append(tile)
-        return all_map_tiles
+        """
+        Возвращает плоский список всех не-None `MapTileSprite` на карте (построчно).
+        Спрайты для ячеек из палитры создаются по запросу.
+        """
+        filled = np.argwhere(self.tile_indices != self.EMPTY_TILE)
+        return [self.get_tile(int(r_idx), int(c_idx)) for r_idx, c_idx in filled]
 
     @property
     def total_pixel_width(self) -> int:
@@ -0,0 +1,245 @@
+"""
+Модуль определяет TokenOccupancyIndex - индекс занятости ячеек сетки токенами.
+"""
+import itertools
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from battlemap.sprites.map_tile import MapTileSprite
+from battlemap.sprites.token_tile import TokenObserver, TokenTileSprite
+from battlemap.types.battle_map import BattleMap
+
+Cell = Tuple[int, int]  # (grid_col, grid_row)
+
+
+class TokenOccupancyIndex(TokenObserver):
+    """
+    Пространственный индекс токенов по ячейкам сетки.
+
+    Для каждого токена хранится его footprint - все ячейки, которые пересекает
+    прямоугольник токена (x, y, logical_pixel_width, logical_pixel_height), с учетом
+    многоклеточных `TokenSize`. Индекс подписывается на токены как `TokenObserver`
+    и обновляется автоматически при `set_position`, `move`, `set_grid_position`
+    и изменении размера.
+
+    Координаты ячеек задаются как (grid_col, grid_row), как в `set_grid_position`.
+    Более поздние добавленные токены считаются лежащими выше (как порядок отрисовки).
+
+    Атрибуты:
+        battle_map (Optional[BattleMap]): Карта для проверки границ при размещении.
+        tile_pixel_width (int): Ширина ячейки в пикселях.
+        tile_pixel_height (int): Высота ячейки в пикселях.
+    """
+
+    def __init__(
+            self,
+            battle_map: Optional[BattleMap] = None,
+            tile_pixel_width: int = MapTileSprite.TILE_WIDTH,
+            tile_pixel_height: int = MapTileSprite.TILE_HEIGHT
+            ):
+        """
+        Инициализирует TokenOccupancyIndex.
+
+        Args:
+            battle_map (Optional[BattleMap], optional): Карта; если передана, размеры
+                ячеек берутся из нее, а `can_place` проверяет границы. По умолчанию None.
+            tile_pixel_width (int, optional): Ширина ячейки, если карта не передана.
+            tile_pixel_height (int, optional): Высота ячейки, если карта не передана.
+
+        Raises:
+            ValueError: Если размеры ячейки не положительные.
+        """
+        if battle_map is not None:
+            tile_pixel_width = battle_map.tile_pixel_width
+            tile_pixel_height = battle_map.tile_pixel_height
+        if tile_pixel_width <= 0 or tile_pixel_height <= 0:
+            raise ValueError("Размеры ячейки индекса должны быть положительными.")
+
+        self.battle_map: Optional[BattleMap] = battle_map
+        self.tile_pixel_width: int = tile_pixel_width
+        self.tile_pixel_height: int = tile_pixel_height
+
+        self._cells: Dict[Cell, List[TokenTileSprite]] = {}
+        # id(токена) -> (токен, занятые ячейки, порядковый номер для определения верхнего)
+        self._entries: Dict[int, Tuple[TokenTileSprite, Tuple[Cell, ...], int]] = {}
+        self._order = itertools.count()
+
+    # --- Расчет footprint ---
+
+    def _cell_span(self, x: int, y: int, width: int, height: int) -> Tuple[int, int, int, int]:
+        """Диапазон ячеек [col_start, col_end) x [row_start, row_end) для прямоугольника в пикселях."""
+        col_start = x // self.tile_pixel_width
+        row_start = y // self.tile_pixel_height
+        col_end = (x + max(width, 1) - 1) // self.tile_pixel_width + 1
+        row_end = (y + max(height, 1) - 1) // self.tile_pixel_height + 1
+        return col_start, row_start, col_end, row_end
+
+    def _footprint(self, token: TokenTileSprite) -> Tuple[Cell, ...]:
+        col_start, row_start, col_end, row_end = self._cell_span(
+                token.x, token.y, token.logical_pixel_width, token.logical_pixel_height
+                )
+        return tuple((c, r) for r in range(row_start, row_end) for c in range(col_start, col_end))
+
+    def _grid_footprint(self, token: TokenTileSprite, grid_col: int, grid_row: int) -> Tuple[Cell, ...]:
+        size = token.token_size_enum
+        return tuple((c, r)
+                     for r in range(grid_row, grid_row + size.tiles_height)
+                     for c in range(grid_col, grid_col + size.tiles_width))
+
+    # --- Изменение индекса ---
+
+    def _place(self, token: TokenTileSprite, order: int):
+        footprint = self._footprint(token)
+        for cell in footprint:
+            self._cells.setdefault(cell, []).append(token)
+        self._entries[id(token)] = (token, footprint, order)
+
+    def _unplace(self, token: TokenTileSprite) -> Optional[int]:
+        entry = self._entries.pop(id(token), None)
+        if entry is None:
+            return None
+        _, footprint, order = entry
+        for cell in footprint:
+            occupants = self._cells.get(cell)
+            if occupants is None:
+                continue
+            occupants.remove(token)
+            if not occupants:
+                del self._cells[cell]
+        return order
+
+    def add(self, token: TokenTileSprite):
+        """
+        Добавляет токен в индекс (поверх ранее добавленных) и подписывается на его перемещения.
+        Повторное добавление поднимает токен наверх.
+
+        Raises:
+            TypeError: Если token не является экземпляром TokenTileSprite.
+        """
+        if not isinstance(token, TokenTileSprite):
+            raise TypeError("В индекс можно добавлять только экземпляры TokenTileSprite.")
+        self._unplace(token)
+        self._place(token, next(self._order))
+        token.add_observer(self)
+
+    def remove(self, token: TokenTileSprite):
+        """Удаляет токен из индекса и отписывается от него. Отсутствующий токен игнорируется."""
+        if self._unplace(token) is not None:
+            token.remove_observer(self)
+
+    def clear(self):
+        """Удаляет все токены из индекса."""
+        for token, _, _ in list(self._entries.values()):
+            token.remove_observer(self)
+        self._entries.clear()
+        self._cells.clear()
+
+    def on_tokens_moved(self, tokens: Sequence[TokenTileSprite]):
+        """Пересчитывает footprint переместившихся токенов (вызывается самими токенами)."""
+        for token in tokens:
+            entry = self._entries.get(id(token))
+            if entry is None or entry[0] is not token:
+                continue
+            new_footprint = self._footprint(token)
+            if new_footprint == entry[1]:
+                continue
+            order = self._unplace(token)
+            self._place(token, order)
+
+    def __contains__(self, token: TokenTileSprite) -> bool:
+        entry = self._entries.get(id(token))
+        return entry is not None and entry[0] is token
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- Запросы ---
+
+    def _sorted_top_first(self, tokens: Iterable[TokenTileSprite]) -> List[TokenTileSprite]:
+        return sorted(tokens, key=lambda t: self._entries[id(t)][2], reverse=True)
+
+    def tokens_at_cell(self, grid_col: int, grid_row: int) -> List[TokenTileSprite]:
+        """Возвращает токены, footprint которых включает ячейку, сверху вниз."""
+        return self._sorted_top_first(self._cells.get((grid_col, grid_row), ()))
+
+    def token_at_point(self, x: float, y: float, include_hidden: bool = False) -> Optional[TokenTileSprite]:
+        """
+        Возвращает верхний токен, прямоугольник которого содержит точку (x, y)
+        в пиксельных координатах мира, или None.
+
+        Args:
+            x (float): X-координата точки.
+            y (float): Y-координата точки.
+            include_hidden (bool, optional): Учитывать невидимые токены. По умолчанию False.
+        """
+        cell = (int(x // self.tile_pixel_width), int(y // self.tile_pixel_height))
+        for token in self._sorted_top_first(self._cells.get(cell, ())):
+            if not include_hidden and not token.visible:
+                continue
+            if token.x <= x < token.x + token.logical_pixel_width and \
+                    token.y <= y < token.y + token.logical_pixel_height:
+                return token
+        return None
+
+    def tokens_in_region(
+            self, col_start: int, row_start: int, col_end: int, row_end: int
+            ) -> List[TokenTileSprite]:
+        """
+        Возвращает токены, пересекающие область ячеек [col_start, col_end) x [row_start, row_end),
+        сверху вниз, без повторов.
+        """
+        found: Dict[int, TokenTileSprite] = {}
+        area = (col_end - col_start) * (row_end - row_start)
+        if area <= 0:
+            return []
+        if area > len(self._cells):
+            # Область больше числа занятых ячеек - дешевле пройти по занятым
+            for (c, r), occupants in self._cells.items():
+                if col_start <= c < col_end and row_start <= r < row_end:
+                    for token in occupants:
+                        found[id(token)] = token
+        else:
+            for r in range(row_start, row_end):
+                for c in range(col_start, col_end):
+                    for token in self._cells.get((c, r), ()):
+                        found[id(token)] = token
+        return self._sorted_top_first(found.values())
+
+    def overlapping(self, token: TokenTileSprite) -> List[TokenTileSprite]:
+        """Возвращает другие токены, занимающие хотя бы одну ячейку footprint токена."""
+        footprint = self._entries[id(token)][1] if token in self else self._footprint(token)
+        found: Dict[int, TokenTileSprite] = {}
+        for cell in footprint:
+            for other in self._cells.get(cell, ()):
+                if other is not token:
+                    found[id(other)] = other
+        return self._sorted_top_first(found.values())
+
+    def conflicts_at(self, token: TokenTileSprite, grid_col: int, grid_row: int) -> List[TokenTileSprite]:
+        """
+        Возвращает токены, с которыми столкнется `token`, если поставить его
+        левым верхним углом в ячейку (grid_col, grid_row). Сам токен не учитывается.
+        """
+        found: Dict[int, TokenTileSprite] = {}
+        for cell in self._grid_footprint(token, grid_col, grid_row):
+            for other in self._cells.get(cell, ()):
+                if other is not token:
+                    found[id(other)] = other
+        return self._sorted_top_first(found.values())
+
+    def can_place(self, token: TokenTileSprite, grid_col: int, grid_row: int) -> bool:
+        """
+        Проверяет, можно ли поставить токен в ячейку (grid_col, grid_row):
+        footprint не выходит за границы карты (если она задана) и не пересекается
+        с другими токенами.
+        """
+        if self.battle_map is not None:
+            size = token.token_size_enum
+            if grid_col < 0 or grid_row < 0 or \
+                    grid_col + size.tiles_width > self.battle_map.map_width_tiles or \
+                    grid_row + size.tiles_height > self.battle_map.map_height_tiles:
+                return False
+        return not self.conflicts_at(token, grid_col, grid_row)
+
+    def __repr__(self) -> str:
+        return (f"<TokenOccupancyIndex(tokens={len(self._entries)}, occupied_cells={len(self._cells)}, "
+                f"tile_size_px={self.tile_pixel_width}x{self.tile_pixel_height})>")
@@ -1,8 +1,9 @@
 """
 Модуль определяет класс игрового Токена и связанные типы ID.
 """
-from typing import List, NewType, Optional, Sequence # Добавил Sequence для owner_ids
+from typing import Dict, Iterable, Iterator, List, NewType, Optional, Sequence, Tuple # Добавил Sequence для owner_ids
 from PIL import Image
+from battlemap.sprites.lazy_texture import LazyTexture
 from battlemap.sprites.token_tile import TokenSize, TokenTileSprite
 
 TokenId = NewType("TokenId", int)
@@ -14,27 +15,41 @@ class Token(TokenTileSprite):
     Наследуется от TokenTileSprite, получая его свойства управления текстурой
     и логическим размером.
 
+    Токены могут образовывать группы: дочерние токены (ездовые животные, фамильяры,
+    переносимые предметы) следуют за родителем. Для каждого ребенка хранится смещение
+    относительно родителя; перемещение родителя (`move`, `set_position`,
+    `set_grid_position`, сеттеры x/y, `SpriteArrayStore.move_many`) сдвигает все
+    поддерево, а наблюдатели получают одно пакетное уведомление на группу.
+    Перемещение самого ребенка меняет его смещение относительно родителя.
+
+    Владельцы хранятся в упорядоченном множестве (O(1) проверка и изменение); об их
+    изменении наблюдатели (например, `TokenRegistry`) узнают через
+    `TokenObserver.on_token_owners_changed`.
+
     Атрибуты:
-        token_id (TokenId): Уникальный идентификатор токена.
-        owner_ids (List[OwnerId]): Список идентификаторов владельцев токена.
+        token_id (TokenId): Уникальный идентификатор токена (только чтение).
+        owner_ids (List[OwnerId]): Список идентификаторов владельцев токена (копия).
     """
-    # TODO: Нужны child токены, следующие за родителем
+    __slots__ = ("_token_id", "_owners", "_parent", "_children", "_child_offset")
+
     def __init__(
             self,
-            pillow_image: Image.Image,
+            pillow_image: Image.Image | LazyTexture,
             token_size: TokenSize,
             token_id: TokenId,
             owner_ids: Optional[Sequence[OwnerId]] = None, # Используем Sequence для большей гибкости
             initially_visible: bool = True,
             x: int = 0,
             y: int = 0,
-            name: str = "token" # Имя по умолчанию, может быть переопределено
+            name: str = "token", # Имя по умолчанию, может быть переопределено
+            shared_texture: bool = False
             ):
         """
         Инициализирует объект Token.
 
         Args:
-            pillow_image (Image.Image): Изображение для текстуры токена.
+            pillow_image (Image.Image | LazyTexture): Изображение для текстуры токена
+                                                      или ленивая текстура.
             token_size (TokenSize): Логический размер токена на карте.
             token_id (TokenId): Уникальный ID токена.
             owner_ids (Optional[Sequence[OwnerId]], optional): Список ID владельцев.
@@ -44,29 +59,177 @@ class Token(TokenTileSprite):
             y (int, optional): Начальная Y-координата. По умолчанию 0.
             name (str, optional): Имя токена. Если "token", будет сгенерировано имя
                                   на основе ID. По умолчанию "token".
+            shared_texture (bool, optional): Использовать подготовленную текстуру без копирования.
+                                             По умолчанию False.
         """
         # Генерируем более осмысленное имя по умолчанию, если стандартное
         resolved_name = name
         if name == "token" or not name: # Если имя не задано или стандартное
             resolved_name = f"Token_{token_id}"
 
-        super().__init__(pillow_image, token_size, initially_visible, x, y, resolved_name)
+        self._parent: Optional[Token] = None
+        self._children: List[Token] = []
+        self._child_offset: Tuple[int, int] = (0, 0)
+
+        super().__init__(pillow_image, token_size, initially_visible, x, y, resolved_name,
+                         shared_texture=shared_texture)
+
+        self._token_id: TokenId = token_id
+        # Упорядоченное множество владельцев: dict сохраняет порядок добавления
+        self._owners: Dict[OwnerId, None] = dict.fromkeys(owner_ids) if owner_ids is not None else {}
+
+    @property
+    def token_id(self) -> TokenId:
+        """Уникальный идентификатор токена."""
+        return self._token_id
+
+    @property
+    def owner_ids(self) -> List[OwnerId]:
+        """Список ID владельцев в порядке добавления (копия; изменяйте через add_owner/remove_owner)."""
+        return list(self._owners)
 
-        self.token_id: TokenId = token_id
-        self.owner_ids: List[OwnerId] = list(owner_ids) if owner_ids is not None else []
+    @owner_ids.setter
+    def owner_ids(self, owner_ids: Iterable[OwnerId]):
+        new_owners = dict.fromkeys(owner_ids)
+        added = [o for o in new_owners if o not in self._owners]
+        removed = [o for o in self._owners if o not in new_owners]
+        self._owners = new_owners
+        self._owners_changed(added, removed)
+
+    def has_owner(self, owner_id: OwnerId) -> bool:
+        """Проверяет, является ли owner_id владельцем токена (O(1))."""
+        return owner_id in self._owners
 
     def add_owner(self, owner_id: OwnerId):
         """Добавляет ID владельца в список, если его там еще нет."""
-        if owner_id not in self.owner_ids:
-            self.owner_ids.append(owner_id)
+        if owner_id not in self._owners:
+            self._owners[owner_id] = None
+            self._owners_changed((owner_id,), ())
 
     def remove_owner(self, owner_id: OwnerId):
         """Удаляет ID владельца из списка, если он там есть."""
-        try:
-            self.owner_ids.remove(owner_id)
-        except ValueError:
-            # Владелец не найден, можно проигнорировать или залогировать
-            pass
+        if owner_id in self._owners:
+            del self._owners[owner_id]
+            self._owners_changed((), (owner_id,))
+
+    def _owners_changed(self, added: Sequence[OwnerId], removed: Sequence[OwnerId]):
+        if not added and not removed:
+            return
+        for observer in tuple(self._observers):
+            observer.on_token_owners_changed(self, added, removed)
+
+    # --- Группы токенов ---
+
+    @property
+    def parent(self) -> Optional["Token"]:
+        """Родительский токен или None."""
+        return self._parent
+
+    @property
+    def children(self) -> Tuple["Token", ...]:
+        """Непосредственные дочерние токены."""
+        return tuple(self._children)
+
+    @property
+    def child_offset(self) -> Tuple[int, int]:
+        """Смещение (dx, dy) токена относительно родителя (для токена без родителя - (0, 0))."""
+        return self._child_offset
+
+    def descendants(self) -> Iterator["Token"]:
+        """Обходит все поддерево дочерних токенов (в глубину, без самого токена)."""
+        stack = list(reversed(self._children))
+        while stack:
+            child = stack.pop()
+            yield child
+            stack.extend(reversed(child._children))
+
+    def attach_child(self, child: "Token", offset: Optional[Tuple[int, int]] = None):
+        """
+        Делает токен дочерним. Если токен уже принадлежит другому родителю, он отсоединяется от него.
+
+        Args:
+            child (Token): Дочерний токен.
+            offset (Optional[Tuple[int, int]], optional): Смещение ребенка относительно родителя
+                в пикселях. Если задано, ребенок сразу переносится в эту позицию; по умолчанию
+                None - сохраняется текущее взаимное расположение.
+
+        Raises:
+            TypeError: Если child не является экземпляром Token.
+            ValueError: Если child - сам токен или его предок (получился бы цикл).
+        """
+        if not isinstance(child, Token):
+            raise TypeError("Дочерним может быть только экземпляр Token.")
+        ancestor: Optional[Token] = self
+        while ancestor is not None:
+            if ancestor is child:
+                raise ValueError(f"Токен '{child.name}' не может быть потомком самого себя.")
+            ancestor = ancestor._parent
+        if child._parent is not None:
+            child._parent.detach_child(child)
+        child._parent = self
+        self._children.append(child)
+        if offset is None:
+            child._update_child_offset()
+        else:
+            child.set_position(self.x + offset[0], self.y + offset[1])
+
+    def detach_child(self, child: "Token"):
+        """Отсоединяет дочерний токен (он остается на месте). Чужой токен игнорируется."""
+        if child._parent is not self:
+            return
+        self._children.remove(child)
+        child._parent = None
+        child._child_offset = (0, 0)
+
+    def _update_child_offset(self):
+        parent = self._parent
+        self._child_offset = (self.x - parent.x, self.y - parent.y)
+
+    def _propagate_to_descendants(self) -> List["Token"]:
+        """Переносит поддерево по кэшированным смещениям (без уведомлений); возвращает потомков."""
+        moved: List[Token] = []
+        stack = [self]
+        while stack:
+            parent = stack.pop()
+            parent_x, parent_y = parent.x, parent.y
+            for child in parent._children:
+                offset_x, offset_y = child._child_offset
+                child._write_position(parent_x + offset_x, parent_y + offset_y)
+                moved.append(child)
+                if child._children:
+                    stack.append(child)
+        return moved
+
+    def _position_changed(self):
+        if self._parent is not None:
+            self._update_child_offset()
+        if not self._children:
+            super()._position_changed()
+            return
+        # Одно пакетное уведомление на всю группу вместо отдельного на каждый токен
+        super()._positions_changed([self, *self._propagate_to_descendants()])
+
+    @classmethod
+    def _positions_changed(cls, sprites):
+        group_ids = {id(sprite) for sprite in sprites}
+        moved = {id(sprite): sprite for sprite in sprites}
+
+        def ancestor_in_group(token: Token) -> bool:
+            ancestor = token._parent
+            while ancestor is not None:
+                if id(ancestor) in group_ids:
+                    return True
+                ancestor = ancestor._parent
+            return False
+
+        roots = [token for token in sprites if isinstance(token, Token) and not ancestor_in_group(token)]
+        for token in roots:
+            if token._parent is not None:
+                token._update_child_offset()
+        for token in roots:
+            for descendant in token._propagate_to_descendants():
+                moved[id(descendant)] = descendant
+        super()._positions_changed(list(moved.values()))
 
     def __repr__(self) -> str:
         """Возвращает строковое представление объекта Token."""
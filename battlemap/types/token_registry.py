@@ -0,0 +1,171 @@
+"""
+Модуль определяет TokenRegistry - реестр токенов с индексами по ID, владельцу и ячейке.
+"""
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from battlemap.sprites.map_tile import MapTileSprite
+from battlemap.sprites.token_tile import TokenObserver, TokenTileSprite
+from battlemap.types.battle_map import BattleMap
+from battlemap.types.occupancy import TokenOccupancyIndex
+from battlemap.types.token import OwnerId, Token, TokenId
+
+
+class TokenRegistry(TokenObserver):
+    """
+    Центральный реестр токенов сцены.
+
+    Индексы:
+        - по `TokenId` - O(1) поиск токена;
+        - по `OwnerId` - все токены, которыми управляет игрок (в порядке регистрации);
+        - по ячейке сетки - через встроенный `TokenOccupancyIndex` (`occupancy`).
+
+    Реестр подписывается на токены как `TokenObserver`: индекс владельцев
+    обновляется при `add_owner`/`remove_owner`, индекс ячеек - при перемещениях.
+
+    Атрибуты:
+        occupancy (TokenOccupancyIndex): Индекс занятости ячеек зарегистрированными токенами.
+    """
+
+    def __init__(
+            self,
+            battle_map: Optional[BattleMap] = None,
+            tile_pixel_width: int = MapTileSprite.TILE_WIDTH,
+            tile_pixel_height: int = MapTileSprite.TILE_HEIGHT
+            ):
+        """
+        Инициализирует TokenRegistry.
+
+        Args:
+            battle_map (Optional[BattleMap], optional): Карта для индекса ячеек. По умолчанию None.
+            tile_pixel_width (int, optional): Ширина ячейки, если карта не передана.
+            tile_pixel_height (int, optional): Высота ячейки, если карта не передана.
+        """
+        self._by_id: Dict[TokenId, Token] = {}
+        self._by_owner: Dict[OwnerId, Dict[TokenId, Token]] = {}
+        self._max_id: int = 0
+        self.occupancy: TokenOccupancyIndex = TokenOccupancyIndex(battle_map, tile_pixel_width, tile_pixel_height)
+
+    def set_battle_map(self, battle_map: Optional[BattleMap]):
+        """Перестраивает индекс ячеек под новую карту (размеры ячеек и границы)."""
+        old_index = self.occupancy
+        self.occupancy = TokenOccupancyIndex(
+                battle_map, old_index.tile_pixel_width, old_index.tile_pixel_height
+                )
+        old_index.clear()
+        for token in self._by_id.values():
+            self.occupancy.add(token)
+
+    # --- Регистрация ---
+
+    def add(self, token: Token):
+        """
+        Регистрирует токен. Повторная регистрация того же токена игнорируется.
+
+        Raises:
+            TypeError: Если token не является экземпляром Token.
+            ValueError: Если в реестре уже есть другой токен с таким же ID.
+        """
+        if not isinstance(token, Token):
+            raise TypeError("В реестр можно добавлять только экземпляры Token.")
+        existing = self._by_id.get(token.token_id)
+        if existing is token:
+            return
+        if existing is not None:
+            raise ValueError(f"Токен с ID {token.token_id} уже зарегистрирован ('{existing.name}').")
+        self._by_id[token.token_id] = token
+        self._max_id = max(self._max_id, int(token.token_id))
+        for owner_id in token.owner_ids:
+            self._by_owner.setdefault(owner_id, {})[token.token_id] = token
+        self.occupancy.add(token)
+        token.add_observer(self)
+
+    def remove(self, token: Token | TokenId) -> Optional[Token]:
+        """
+        Удаляет токен (или токен с указанным ID) из реестра.
+
+        Returns:
+            Optional[Token]: Удаленный токен или None, если его не было.
+        """
+        token_id = token.token_id if isinstance(token, Token) else token
+        removed = self._by_id.get(token_id)
+        if removed is None or (isinstance(token, Token) and removed is not token):
+            return None
+        del self._by_id[token_id]
+        for owner_id in removed.owner_ids:
+            self._unindex_owner(owner_id, removed)
+        self.occupancy.remove(removed)
+        removed.remove_observer(self)
+        return removed
+
+    def clear(self):
+        """Удаляет все токены из реестра."""
+        for token in self._by_id.values():
+            token.remove_observer(self)
+        self.occupancy.clear()
+        self._by_id.clear()
+        self._by_owner.clear()
+        self._max_id = 0
+
+    def next_id(self) -> TokenId:
+        """Возвращает свободный ID для нового токена (больше всех выданных)."""
+        return TokenId(self._max_id + 1)
+
+    # --- Запросы ---
+
+    def get(self, token_id: TokenId) -> Optional[Token]:
+        """Возвращает токен по ID или None."""
+        return self._by_id.get(token_id)
+
+    def __getitem__(self, token_id: TokenId) -> Token:
+        return self._by_id[token_id]
+
+    def __contains__(self, item: Token | TokenId) -> bool:
+        if isinstance(item, Token):
+            return self._by_id.get(item.token_id) is item
+        return item in self._by_id
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[Token]:
+        return iter(list(self._by_id.values()))
+
+    def tokens_by_owner(self, owner_id: OwnerId) -> List[Token]:
+        """Возвращает токены, которыми владеет owner_id, в порядке регистрации."""
+        owned = self._by_owner.get(owner_id)
+        return list(owned.values()) if owned else []
+
+    def owners(self) -> List[OwnerId]:
+        """Возвращает владельцев, у которых есть хотя бы один токен."""
+        return list(self._by_owner)
+
+    def tokens_at_cell(self, grid_col: int, grid_row: int) -> List[Token]:
+        """Возвращает токены, занимающие ячейку, сверху вниз."""
+        return self.occupancy.tokens_at_cell(grid_col, grid_row)
+
+    def token_at_point(self, x: float, y: float, include_hidden: bool = False) -> Optional[Token]:
+        """Возвращает верхний токен в точке (x, y) мира или None (см. `TokenOccupancyIndex`)."""
+        return self.occupancy.token_at_point(x, y, include_hidden)
+
+    # --- Наблюдатель ---
+
+    def _unindex_owner(self, owner_id: OwnerId, token: Token):
+        owned = self._by_owner.get(owner_id)
+        if owned is not None and owned.get(token.token_id) is token:
+            del owned[token.token_id]
+            if not owned:
+                del self._by_owner[owner_id]
+
+    def on_token_owners_changed(
+            self, token: TokenTileSprite, added: Sequence[OwnerId], removed: Sequence[OwnerId]
+            ):
+        """Обновляет индекс владельцев (вызывается самими токенами)."""
+        if token not in self:
+            return
+        for owner_id in removed:
+            self._unindex_owner(owner_id, token)
+        for owner_id in added:
+            self._by_owner.setdefault(owner_id, {})[token.token_id] = token
+
+    def __repr__(self) -> str:
+        return f"<TokenRegistry(tokens={len(self._by_id)}, owners={len(self._by_owner)})>"
@@ -0,0 +1,317 @@
+"""
+Модуль определяет VisionEngine - векторизованный расчет области видимости токенов
+на BattleMap с учетом блокирующих ячеек (стен).
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from battlemap.types.battle_map import BattleMap
+from battlemap.types.token import Token, TokenId
+
+# Ограничение на количество элементов в промежуточных массивах (зрители x ячейки x выборки),
+# чтобы пакетный расчет для большого числа токенов не требовал гигабайты памяти.
+_MAX_BATCH_ELEMENTS: int = 4_000_000
+
+
+class _RayTemplate:
+    """
+    Заранее рассчитанные лучи для одного сочетания радиуса и размера токена.
+
+    Все смещения заданы относительно базовой ячейки зрителя (ячейки, в которой
+    лежит центр его footprint), поэтому шаблон общий для всех токенов одного размера.
+    """
+
+    def __init__(self, radius: int, tiles_width: int, tiles_height: int):
+        # Центр footprint относительно базовой ячейки: 0.5 для нечетного размера, 0.0 для четного
+        self._frac_row: float = (tiles_height / 2) % 1.0
+        self._frac_col: float = (tiles_width / 2) % 1.0
+        self.base_row_offset: int = tiles_height // 2
+        self.base_col_offset: int = tiles_width // 2
+        self._footprint: Tuple[int, int, int, int] = (
+            -self.base_row_offset, tiles_height - 1 - self.base_row_offset,
+            -self.base_col_offset, tiles_width - 1 - self.base_col_offset,
+            )
+
+        span = radius + 1
+        d_rows, d_cols = np.mgrid[-span:span + 1, -span:span + 1]
+        v_rows = d_rows + 0.5 - self._frac_row
+        v_cols = d_cols + 0.5 - self._frac_col
+        in_radius = (v_rows ** 2 + v_cols ** 2) <= (radius + 0.5) ** 2
+
+        self.offsets: np.ndarray = np.stack([d_rows[in_radius], d_cols[in_radius]], axis=1)  # (K, 2)
+        self._v_rows: np.ndarray = v_rows[in_radius]
+        self._v_cols: np.ndarray = v_cols[in_radius]
+
+        # Две выборки на ячейку пути - достаточно, чтобы не "проскакивать" углы стен
+        samples = 2 * span + 1
+        self._t: np.ndarray = (np.arange(samples) + 0.5) / samples  # (S,)
+
+        # Небольшие шаблоны хранят выборки целиком; большие (обзор на всю карту)
+        # рассчитывают их по частям, чтобы память оставалась в пределах _MAX_BATCH_ELEMENTS
+        self._samples: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        if self.cells_count * self.samples_count <= _MAX_BATCH_ELEMENTS:
+            self._samples = self._compute_samples(slice(None))
+
+    def _compute_samples(self, cells: slice | np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        sample_rows = np.floor(self._frac_row + self._v_rows[cells, None] * self._t[None, :]).astype(np.int32)  # (K, S)
+        sample_cols = np.floor(self._frac_col + self._v_cols[cells, None] * self._t[None, :]).astype(np.int32)
+
+        # Сама ячейка-цель и ячейки footprint зрителя не перекрывают обзор
+        offsets = self.offsets[cells]
+        is_target = (sample_rows == offsets[:, 0:1]) & (sample_cols == offsets[:, 1:2])
+        fp_row_min, fp_row_max, fp_col_min, fp_col_max = self._footprint
+        in_footprint = (sample_rows >= fp_row_min) & (sample_rows <= fp_row_max) & \
+                       (sample_cols >= fp_col_min) & (sample_cols <= fp_col_max)
+        return sample_rows, sample_cols, ~(is_target | in_footprint)
+
+    def samples(self, cells: slice | np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Возвращает выборки лучей для части ячеек шаблона: строки и столбцы выборок
+        относительно базовой ячейки и маску выборок, которые могут перекрыть обзор (все формы (K, S)).
+        """
+        if self._samples is not None:
+            return tuple(array[cells] for array in self._samples)
+        return self._compute_samples(cells)
+
+    @property
+    def cells_count(self) -> int:
+        return self.offsets.shape[0]
+
+    @property
+    def samples_count(self) -> int:
+        return self._t.shape[0]
+
+
+class VisionEngine:
+    """
+    Рассчитывает маски видимости (какие ячейки видит токен) для многих токенов сразу.
+
+    Видимость определяется лучами из центра footprint токена в центры ячеек в пределах
+    радиуса обзора: ячейка видна, если на пути луча нет блокирующих ячеек
+    (`BattleMap.blocking`). Сами стены видимы. Расчет векторизован с NumPy и
+    выполняется пакетами по токенам одного размера.
+
+    Результаты кэшируются: `update` пересчитывает только токены, у которых
+    изменились позиция, размер или радиус, либо рядом с которыми (в пределах радиуса)
+    изменились блокирующие ячейки.
+
+    Атрибуты:
+        battle_map (BattleMap): Карта, на которой рассчитывается обзор.
+        default_radius (Optional[int]): Радиус обзора в тайлах по умолчанию.
+                                        None - без ограничения (вся карта).
+    """
+
+    def __init__(self, battle_map: BattleMap, default_radius: Optional[int] = None):
+        """
+        Инициализирует VisionEngine.
+
+        Args:
+            battle_map (BattleMap): Карта с битовой картой блокирующих ячеек.
+            default_radius (Optional[int], optional): Радиус обзора в тайлах. По умолчанию None.
+
+        Raises:
+            ValueError: Если default_radius не положительное целое число.
+        """
+        if default_radius is not None and not (isinstance(default_radius, int) and default_radius > 0):
+            raise ValueError("Радиус обзора должен быть положительным целым числом или None.")
+        self.battle_map: BattleMap = battle_map
+        self.default_radius: Optional[int] = default_radius
+
+        self._templates: Dict[Tuple[int, int, int], _RayTemplate] = {}
+        self._radii: Dict[TokenId, int] = {}
+        # token_id -> (base_row, base_col, tiles_width, tiles_height, radius)
+        self._viewer_state: Dict[TokenId, Tuple[int, int, int, int, int]] = {}
+        self._masks: Dict[TokenId, np.ndarray] = {}
+        self._blocking_snapshot: np.ndarray = battle_map.blocking.copy()
+
+    def set_radius(self, token_id: TokenId, radius: Optional[int]):
+        """Задает индивидуальный радиус обзора токена (None - вернуть радиус по умолчанию)."""
+        if radius is None:
+            self._radii.pop(token_id, None)
+        elif not (isinstance(radius, int) and radius > 0):
+            raise ValueError("Радиус обзора должен быть положительным целым числом или None.")
+        else:
+            self._radii[token_id] = radius
+
+    def _resolve_radius(self, token_id: TokenId) -> int:
+        radius = self._radii.get(token_id, self.default_radius)
+        if radius is None:
+            # Без ограничения: круг должен накрыть всю карту из любого угла (диагональ карты)
+            radius = math.ceil(math.hypot(self.battle_map.map_width_tiles, self.battle_map.map_height_tiles))
+        return radius
+
+    def _get_template(self, radius: int, tiles_width: int, tiles_height: int) -> _RayTemplate:
+        key = (radius, tiles_width, tiles_height)
+        template = self._templates.get(key)
+        if template is None:
+            template = _RayTemplate(radius, tiles_width, tiles_height)
+            self._templates[key] = template
+        return template
+
+    def _viewer_state_for(self, token: Token) -> Tuple[int, int, int, int, int]:
+        bm = self.battle_map
+        col, row = token.get_grid_position(bm.tile_pixel_width, bm.tile_pixel_height)
+        size = token.token_size_enum
+        base_row = min(max(row + size.tiles_height // 2, 0), bm.map_height_tiles - 1)
+        base_col = min(max(col + size.tiles_width // 2, 0), bm.map_width_tiles - 1)
+        return base_row, base_col, size.tiles_width, size.tiles_height, self._resolve_radius(token.token_id)
+
+    def _compute_group(self, template: _RayTemplate, bases: np.ndarray) -> np.ndarray:
+        """
+        Рассчитывает маски для группы зрителей с общим шаблоном лучей.
+
+        Args:
+            template (_RayTemplate): Шаблон лучей.
+            bases (np.ndarray): Базовые ячейки зрителей, форма (V, 2).
+
+        Returns:
+            np.ndarray: Маски видимости формы (V, map_height_tiles, map_width_tiles).
+        """
+        bm = self.battle_map
+        height, width = bm.map_height_tiles, bm.map_width_tiles
+        blocking = bm.blocking
+        viewers = bases.shape[0]
+        masks = np.zeros((viewers, height, width), dtype=bool)
+
+        # Большой шаблон (например, обзор на всю карту) делится и по ячейкам, а не только по зрителям
+        cells_batch = min(max(1, _MAX_BATCH_ELEMENTS // template.samples_count), template.cells_count)
+        batch = max(1, _MAX_BATCH_ELEMENTS // (cells_batch * template.samples_count))
+        for start in range(0, viewers, batch):
+            chunk = bases[start:start + batch]  # (B, 2)
+            base_rows = chunk[:, 0, None]
+            base_cols = chunk[:, 1, None]
+            for cells_start in range(0, template.cells_count, cells_batch):
+                cells = np.arange(cells_start, min(cells_start + cells_batch, template.cells_count))
+                target_rows = base_rows + template.offsets[None, cells, 0]  # (B, K)
+                target_cols = base_cols + template.offsets[None, cells, 1]
+                in_map = (target_rows >= 0) & (target_rows < height) & (target_cols >= 0) & (target_cols < width)
+                # Ячейки шаблона вне карты для всех зрителей пакета лучами не проверяются
+                inside = np.nonzero(in_map.any(axis=0))[0]
+                if inside.size == 0:
+                    continue
+                target_rows, target_cols, in_map = target_rows[:, inside], target_cols[:, inside], in_map[:, inside]
+                template_rows, template_cols, sample_valid = template.samples(cells[inside])
+
+                sample_rows = np.clip(base_rows[:, :, None] + template_rows[None], 0, height - 1)  # (B, K, S)
+                sample_cols = np.clip(base_cols[:, :, None] + template_cols[None], 0, width - 1)
+                blocked = (blocking[sample_rows, sample_cols] & sample_valid[None]).any(axis=2)  # (B, K)
+
+                visible = in_map & ~blocked
+                viewer_idx, cell_idx = np.nonzero(visible)
+                masks[start + viewer_idx, target_rows[viewer_idx, cell_idx], target_cols[viewer_idx, cell_idx]] = True
+        return masks
+
+    def update(self, tokens: Iterable[Token]) -> Dict[TokenId, np.ndarray]:
+        """
+        Актуализирует маски видимости для переданных токенов.
+
+        Пересчитываются только токены, у которых изменились позиция/размер/радиус
+        или рядом с которыми изменились блокирующие ячейки с прошлого вызова.
+        Кэш токенов, не переданных в этот вызов, удаляется.
+
+        Args:
+            tokens (Iterable[Token]): Токены-зрители.
+
+        Returns:
+            Dict[TokenId, np.ndarray]: Маски видимости (bool, форма карты [row, col])
+                                       для каждого переданного токена.
+        """
+        bm = self.battle_map
+        if self._blocking_snapshot.shape != bm.blocking.shape:
+            # Карта пересоздана с другим размером - кэш недействителен целиком
+            self.invalidate()
+
+        changed_cells = np.argwhere(bm.blocking != self._blocking_snapshot)  # (N, 2)
+
+        current_states: Dict[TokenId, Tuple[int, int, int, int, int]] = {}
+        for token in tokens:
+            current_states[token.token_id] = self._viewer_state_for(token)
+
+        dirty_ids: List[TokenId] = []
+        for token_id, state in current_states.items():
+            if self._viewer_state.get(token_id) != state or token_id not in self._masks:
+                dirty_ids.append(token_id)
+                continue
+            if changed_cells.size:
+                base_row, base_col, _, _, radius = state
+                reach = radius + 2  # Радиус + половина максимального footprint с запасом
+                if np.any((np.abs(changed_cells[:, 0] - base_row) <= reach) &
+                          (np.abs(changed_cells[:, 1] - base_col) <= reach)):
+                    dirty_ids.append(token_id)
+
+        groups: Dict[Tuple[int, int, int], List[TokenId]] = {}
+        for token_id in dirty_ids:
+            base_row, base_col, tiles_w, tiles_h, radius = current_states[token_id]
+            groups.setdefault((radius, tiles_w, tiles_h), []).append(token_id)
+
+        for (radius, tiles_w, tiles_h), ids in groups.items():
+            template = self._get_template(radius, tiles_w, tiles_h)
+            bases = np.array([current_states[tid][:2] for tid in ids], dtype=np.int32)
+            masks = self._compute_group(template, bases)
+            for i, token_id in enumerate(ids):
+                self._masks[token_id] = masks[i]
+
+        self._viewer_state = current_states
+        self._masks = {token_id: self._masks[token_id] for token_id in current_states}
+        self._blocking_snapshot = bm.blocking.copy()
+        return dict(self._masks)
+
+    def get_mask(self, token_id: TokenId) -> Optional[np.ndarray]:
+        """Возвращает последнюю рассчитанную маску видимости токена или None."""
+        return self._masks.get(token_id)
+
+    def combined_mask(self, token_ids: Iterable[TokenId]) -> np.ndarray:
+        """
+        Объединяет маски видимости нескольких токенов (например, всех токенов игрока).
+        Токены без рассчитанной маски игнорируются.
+        """
+        bm = self.battle_map
+        combined = np.zeros((bm.map_height_tiles, bm.map_width_tiles), dtype=bool)
+        for token_id in token_ids:
+            mask = self._masks.get(token_id)
+            if mask is not None:
+                combined |= mask
+        return combined
+
+    def is_token_visible(self, mask: np.ndarray, token: Token) -> bool:
+        """
+        Проверяет, видна ли хотя бы одна ячейка footprint токена в маске видимости.
+        Используется, чтобы скрывать чужие токены в видах игроков.
+        """
+        bm = self.battle_map
+        col, row = token.get_grid_position(bm.tile_pixel_width, bm.tile_pixel_height)
+        size = token.token_size_enum
+        row_start, col_start = max(row, 0), max(col, 0)
+        row_end = min(row + size.tiles_height, bm.map_height_tiles)
+        col_end = min(col + size.tiles_width, bm.map_width_tiles)
+        if row_start >= row_end or col_start >= col_end:
+            return False
+        return bool(mask[row_start:row_end, col_start:col_end].any())
+
+    def visible_tokens(self, viewer_ids: Iterable[TokenId], candidates: Iterable[Token]) -> List[Token]:
+        """
+        Возвращает токены из `candidates`, видимые хотя бы одному из зрителей `viewer_ids`.
+        Собственные токены зрителей всегда считаются видимыми.
+        """
+        viewer_ids = set(viewer_ids)
+        mask = self.combined_mask(viewer_ids)
+        return [token for token in candidates
+                if token.token_id in viewer_ids or self.is_token_visible(mask, token)]
+
+    def invalidate(self, token_id: Optional[TokenId] = None):
+        """
+        Сбрасывает кэш масок: для одного токена или полностью (token_id=None).
+        """
+        if token_id is None:
+            self._masks.clear()
+            self._viewer_state.clear()
+            self._blocking_snapshot = self.battle_map.blocking.copy()
+        else:
+            self._masks.pop(token_id, None)
+            self._viewer_state.pop(token_id, None)
+
+    def __repr__(self) -> str:
+        return (f"<VisionEngine(map={self.battle_map.map_width_tiles}x{self.battle_map.map_height_tiles}, "
+                f"default_radius={self.default_radius}, cached={len(self._masks)})>")
@@ -1,24 +1,38 @@
 # /project/debug_ui.py
 import math
 import tkinter as tk
+from collections import OrderedDict
 from tkinter import filedialog, ttk
 
 from PIL import Image, ImageTk
 
+from battlemap.io.image_loader import load_image
 from battlemap.render.arrow import create_arrow_image
+from battlemap.render.quality import RenderQuality
 # Импорты из библиотеки
 from battlemap.render.sprite import SpriteRenderer
+from battlemap.render.worker import RenderWorker
 from battlemap.sprites.base_sprite import BaseSprite  # Для фона карты
 from battlemap.sprites.map_tile import MapTileSprite  # Для TILE_WIDTH/HEIGHT
-from battlemap.sprites.token_tile import TokenSize
+from battlemap.sprites.token_tile import TokenSize, TokenTileSprite
 from battlemap.types.battle_map import BattleMap  # Импортируем BattleMap
-from battlemap.types.token import Token, TokenId
+from battlemap.types.token import Token
+from battlemap.types.token_registry import TokenRegistry
 
 
 class DebugUI:
     # Константы рендерера для ограничения размера карты
     MAX_RENDER_WIDTH = SpriteRenderer.MAX_RENDER_WIDTH
     MAX_RENDER_HEIGHT = SpriteRenderer.MAX_RENDER_HEIGHT
+    # Пауза после последнего интерактивного кадра, после которой рисуется финальный кадр
+    FINAL_RENDER_DELAY_MS = 250
+    # Рендер идет в фоновом потоке; готовые кадры забираются из главного цикла Tk
+    RENDER_MAX_FPS = 30.0
+    RESULT_POLL_MS = 15
+    # Максимум закэшированных PhotoImage токенов (ключ - текстура, размер и масштаб)
+    TOKEN_PHOTO_CACHE_SIZE = 256
+    # Запас кэша отображения за краями видимой области (доля ее ширины/высоты с каждой стороны)
+    DISPLAY_CACHE_MARGIN = 0.5
 
     def __init__(self, renderer: SpriteRenderer):
         self.renderer = renderer
@@ -30,6 +44,7 @@ class DebugUI:
         self.map_background_sprite: BaseSprite | None = None
         self.battle_map_instance: BattleMap | None = None  # Логическая сетка карты
         self.loaded_tokens: list[Token] = []
+        self.token_registry = TokenRegistry()  # ID, владельцы и занятость ячеек для hit-test
 
         # --- Состояние вида и интеракций (без изменений) ---
         self.display_scale = 1.0
@@ -40,6 +55,14 @@ class DebugUI:
         self.panning_canvas = False
         self.last_mouse_x_canvas = 0
         self.last_mouse_y_canvas = 0
+        # Качество: во время перетаскивания/панорамирования/зума - черновое, затем финальное
+        self.interactive_quality = RenderQuality.DRAFT
+        self.final_quality = RenderQuality.FINAL
+        self._final_render_after_id: str | None = None
+        # Фоновый рендер: события ввода только отправляют снимок сцены, не дожидаясь кадра
+        self.render_worker = RenderWorker(self._render_frame, max_fps=self.RENDER_MAX_FPS)
+        self.render_worker.start()
+        self.tk_root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # --- Tkinter Vars ---
         self.token_size_var = tk.StringVar(value=TokenSize.SIZE_1x1.name)
@@ -49,6 +72,22 @@ class DebugUI:
         self.token_grid_row_var = tk.StringVar()
         self.snap_to_grid_var = tk.BooleanVar(value=True)
         self.draw_grid_var = tk.BooleanVar(value=True)
+        # Удерживаемый режим: статичные слои - одно изображение холста,
+        # токены и стрелка - отдельные элементы холста с кэшированными PhotoImage
+        self.retained_mode_var = tk.BooleanVar(value=True)
+        self._static_version = 0  # Увеличивается при смене статичного содержимого (фон, размер сцены)
+        self._scene_version = 0  # Увеличивается при любой смене состава или положения спрайтов сцены
+        # Кэш отображения: показанный на холсте кадр (и последний запрошенный) - ключ содержимого,
+        # масштаб, качество и область мира с запасом за краями вида
+        self._display_cache: dict | None = None
+        self._requested_display: dict | None = None
+        # Последний рендер мира (используется только фоновым потоком): панорамирование за пределы
+        # кэша отображения обходится обрезкой и масштабированием без повторного рендера
+        self._world_render_cache: tuple[tuple, Image.Image] | None = None
+        self._token_items: dict[Token, tuple[int, tuple]] = {}  # Токен -> (ID элемента, ключ PhotoImage)
+        self._token_photos: OrderedDict[tuple, tuple[Image.Image, ImageTk.PhotoImage]] = OrderedDict()
+        self._arrow_item: int | None = None
+        self._arrow_photo: ImageTk.PhotoImage | None = None
 
         # --- GUI Layout ---
         main_frame = ttk.Frame(self.tk_root, padding="10")
@@ -95,6 +134,13 @@ class DebugUI:
                 command=self.display_rendered_image
                 )
         self.grid_check.pack(anchor=tk.W, pady=(5, 0))
+        retained_check = ttk.Checkbutton(
+                map_frame,
+                text="Токены отдельными элементами",
+                variable=self.retained_mode_var,
+                command=self._on_display_mode_changed
+                )
+        retained_check.pack(anchor=tk.W)
 
         ttk.Separator(left_panel, orient=tk.HORIZONTAL).pack(fill=tk.X, pady=10)
 
@@ -173,6 +219,7 @@ class DebugUI:
 
         self.reset_and_setup()  # Вызываем обновленный сброс
         self.display_rendered_image()
+        self.tk_root.after(self.RESULT_POLL_MS, self._poll_render_results)
 
     def _ensure_temp_arrow_layer(self):
         """Гарантирует наличие временного слоя для стрелки."""
@@ -185,6 +232,8 @@ class DebugUI:
         self.map_background_sprite = None
         self.battle_map_instance = None  # Сбрасываем и логическую карту
         self.loaded_tokens = []
+        self.token_registry.clear()
+        self.token_registry.set_battle_map(None)
 
         self.map_label.config(text="Фон не загружен")
         self.map_info_label.config(text="Размер сетки: -")  # Сбрасываем инфо о сетке
@@ -195,6 +244,8 @@ class DebugUI:
         self.display_scale = 1.0
         self.canvas_view_x = 0.0
         self.canvas_view_y = 0.0
+        self._clear_retained_items()
+        self._static_version += 1
 
         # Сброс рендерера к дефолтным размерам и слоям
         self.renderer.reset(width=600, height=400, background_color=(30, 20, 20, 255))
@@ -214,19 +265,13 @@ class DebugUI:
                 )
         if filepath:
             try:
-                original_map_image = Image.open(filepath).convert("RGBA")
-
-                img_w, img_h = original_map_image.size
-                # Используем MAX_RENDER_WIDTH/HEIGHT из рендерера для ограничения
-                scale_factor = 1.0
-                if img_w > SpriteRenderer.MAX_RENDER_WIDTH or img_h > SpriteRenderer.MAX_RENDER_HEIGHT:
-                    scale_w = SpriteRenderer.MAX_RENDER_WIDTH / img_w
-                    scale_h = SpriteRenderer.MAX_RENDER_HEIGHT / img_h
-                    scale_factor = min(scale_w, scale_h)
-
-                processed_map_image = original_map_image.resize(
-                        (int(img_w * scale_factor), int(img_h * scale_factor)), Image.Resampling.LANCZOS
-                        ) if scale_factor < 1.0 else original_map_image
+                # Большие карты декодируются сразу уменьшенными до MAX_RENDER_WIDTH/HEIGHT рендерера
+                # (повторная загрузка того же файла берется из кэша загрузчика)
+                processed_map_image = load_image(
+                        filepath,
+                        max_size=(SpriteRenderer.MAX_RENDER_WIDTH, SpriteRenderer.MAX_RENDER_HEIGHT),
+                        resample=self.final_quality.resample
+                        )
 
                 # 1. Создаем BaseSprite для фона
                 self.map_background_sprite = BaseSprite(processed_map_image, x=0, y=0, name="loaded_map_background")
@@ -249,6 +294,7 @@ class DebugUI:
                             # default_tile_image=None - нам не нужны его тайлы для рендера
                             )
                     self.map_info_label.config(text=f"Размер сетки: {grid_w}x{grid_h}")
+                    self.token_registry.set_battle_map(self.battle_map_instance)
                 else:
                     self.battle_map_instance = None  # Слишком маленькая карта для сетки
                     self.map_info_label.config(text="Размер сетки: - (карта мала)")
@@ -261,6 +307,7 @@ class DebugUI:
                         )  # Фон рендерера может быть прозрачным
                 self.renderer.add_layer("map_background_layer", z_index=0)
                 self.renderer.add_layer("tokens_layer", z_index=10)
+                self._static_version += 1
 
                 # 4. Сбрасываем вид и перерисовываем
                 self.display_scale = 1.0
@@ -284,9 +331,11 @@ class DebugUI:
                 )
         if filepath:
             try:
-                token_pil_image = Image.open(filepath)
+                # Арт токена декодируется сразу в наибольшем подготовленном размере: из него
+                # токен уменьшением получает текстуры всех размеров (без апскейла с 70x70)
+                token_pil_image = load_image(filepath, exact_size=max(TokenTileSprite.PREPARED_SIZES))
                 token_size = TokenSize[self.token_size_var.get()]
-                token_id = TokenId(len(self.loaded_tokens) + 1)
+                token_id = self.token_registry.next_id()
                 name_stem = filepath.split('/')[-1].rsplit('.', 1)[0][:20]
                 new_token = Token(token_pil_image, token_size, token_id, name=f"{name_stem}_{token_id}")
 
@@ -309,6 +358,7 @@ class DebugUI:
                     new_token.set_position(10, 10)
 
                 self.loaded_tokens.append(new_token)
+                self.token_registry.add(new_token)
                 self.tokens_listbox.insert(tk.END, new_token.name)
                 self.tokens_listbox.selection_clear(0, tk.END)
                 self.tokens_listbox.selection_set(tk.END)
@@ -322,16 +372,17 @@ class DebugUI:
         if not self.selected_token:
             return
         try:
-            self.loaded_tokens.remove(self.selected_token)
-            listbox_items = self.tokens_listbox.get(0, tk.END)
-            if self.selected_token.name in listbox_items:
-                self.tokens_listbox.delete(listbox_items.index(self.selected_token.name))
+            index = self.loaded_tokens.index(self.selected_token)
+            del self.loaded_tokens[index]
+            self.token_registry.remove(self.selected_token)
+            self.tokens_listbox.delete(index)
             self.update_selected_token_display(None)
             self.prepare_and_render_scene()
         except ValueError:
             pass
 
-    def prepare_and_render_scene(self, include_preview_arrow: bool = True):
+    def prepare_and_render_scene(self, include_preview_arrow: bool = True, interactive: bool = False):
+        self._scene_version += 1
         self.renderer.clear_all_layers_sprites()
 
         # Добавляем фон, если он есть
@@ -354,57 +405,265 @@ class DebugUI:
             except ValueError:
                 pass  # Слой мог исчезнуть, _ensure_temp_arrow_layer должен помочь
 
-        self.display_rendered_image()
+        self.display_rendered_image(interactive=interactive)
 
     def clear_all_action(self):
         self.reset_and_setup()
         self.prepare_and_render_scene()
 
-    def display_rendered_image(self):
-        # ... (Без изменений в логике рендеринга и отображения) ...
+    def _schedule_final_render(self):
+        """Откладывает финальный кадр до окончания взаимодействия (каждый вызов сдвигает его)."""
+        if self._final_render_after_id is not None:
+            self.tk_root.after_cancel(self._final_render_after_id)
+        self._final_render_after_id = self.tk_root.after(self.FINAL_RENDER_DELAY_MS, self._final_render)
+
+    def _final_render(self):
+        self._final_render_after_id = None
+        self.display_rendered_image()
+
+    def display_rendered_image(self, interactive: bool = False):
+        """
+        Выводит сцену на холст. Если показанный кадр (кэш отображения) уже покрывает
+        видимую область при текущем масштабе и содержимом, ничего не рендерится.
+        Иначе снимок сцены отправляется в фоновый поток; кадр появится на холсте
+        после `_poll_render_results`. Вызов не блокируется на рендере, а запросы,
+        пришедшие быстрее, чем рисуются кадры, объединяются (рисуется только последний).
+        При interactive=True кадр рисуется с черновым качеством, а финальный кадр
+        планируется автоматически после паузы во взаимодействии.
+        """
         if not self.renderer or not self.tk_canvas.winfo_exists():
             return
+        if interactive:
+            quality = self.interactive_quality
+            self._schedule_final_render()
+        else:
+            quality = self.final_quality
+            if self._final_render_after_id is not None:
+                self.tk_root.after_cancel(self._final_render_after_id)
+                self._final_render_after_id = None
+        canvas_width = self.tk_canvas.winfo_width()
+        canvas_height = self.tk_canvas.winfo_height()
+        if canvas_width < 1 or canvas_height < 1:
+            return
+        retained = self.retained_mode_var.get()
+        if retained:
+            # Токены и стрелка - отдельные элементы; в кадр попадает только статичная часть
+            self._sync_retained_items()
+            content_key = ("retained", self._static_version)
+        else:
+            content_key = ("flat", self._static_version, self._scene_version)
+        display_key = (content_key, self.draw_grid_var.get(), self.display_scale)
+
+        view_w = canvas_width / self.display_scale
+        view_h = canvas_height / self.display_scale
+        viewport = (self.canvas_view_x, self.canvas_view_y, self.canvas_view_x + view_w, self.canvas_view_y + view_h)
+        if (self._display_covers(self._display_cache, display_key, quality, viewport) or
+                self._display_covers(self._requested_display, display_key, quality, viewport)):
+            return
+
+        margin_x = view_w * self.DISPLAY_CACHE_MARGIN
+        margin_y = view_h * self.DISPLAY_CACHE_MARGIN
+        region = (viewport[0] - margin_x, viewport[1] - margin_y, viewport[2] + margin_x, viewport[3] + margin_y)
+        self._requested_display = {"key": display_key, "quality": quality, "region": region}
+        if retained:
+            scene = self.renderer.snapshot(exclude_layers=("tokens_layer", self.temp_arrow_layer))
+        else:
+            scene = self.renderer.snapshot()
+        self.render_worker.submit({
+            "scene": scene,
+            "retained": retained,
+            "key": display_key,
+            "draw_grid": self.draw_grid_var.get(),
+            "quality": quality,
+            "display_scale": self.display_scale,
+            "region": region,
+            })
+
+    def _display_covers(self, cache: dict | None, display_key: tuple, quality: RenderQuality, viewport: tuple) -> bool:
+        """
+        Проверяет, что кадр кэша отображения годится для вида: то же содержимое и масштаб,
+        не худшее качество и область кадра (в пределах мира) содержит видимую область.
+        """
+        if cache is None or cache["key"] != display_key:
+            return False
+        if cache["quality"] is not quality and cache["quality"] is not self.final_quality:
+            return False
+        world_w, world_h = self.renderer.width, self.renderer.height
+        view_x1, view_y1 = max(0.0, viewport[0]), max(0.0, viewport[1])
+        view_x2, view_y2 = min(world_w, viewport[2]), min(world_h, viewport[3])
+        if view_x1 >= view_x2 or view_y1 >= view_y2:
+            return True  # Вид целиком вне мира - показывать нечего
+        cache_x1, cache_y1, cache_x2, cache_y2 = cache["region"]
+        return (max(0.0, cache_x1) <= view_x1 and max(0.0, cache_y1) <= view_y1 and
+                min(world_w, cache_x2) >= view_x2 and min(world_h, cache_y2) >= view_y2)
+
+    def _render_frame(self, request: dict) -> dict:
+        """
+        Готовит кадр для холста (выполняется в фоновом потоке): рендерит снимок сцены
+        (или берет последний рендер мира, если содержимое и качество не изменились),
+        обрезает запрошенную область и масштабирует ее.
+
+        Returns:
+            dict: Поля запроса ("retained", "key", "quality", "region"), изображение
+                  ("image", None - область пуста) и мировые координаты его левого верхнего угла ("origin").
+        """
+        scene: SpriteRenderer = request["scene"]
+        quality: RenderQuality = request["quality"]
+        display_scale: float = request["display_scale"]
+        region_x1, region_y1, region_x2, region_y2 = request["region"]
+        world_key = (request["key"][0], request["draw_grid"], quality)
+        try:
+            if self._world_render_cache is not None and self._world_render_cache[0] == world_key:
+                full_rendered_image = self._world_render_cache[1]
+            else:
+                full_rendered_image = scene.render(draw_grid=request["draw_grid"], quality=quality)
+                self._world_render_cache = (world_key, full_rendered_image)
+        finally:
+            scene.release_textures()
+        frame = {
+            "retained": request["retained"], "key": request["key"], "quality": quality,
+            "region": request["region"], "image": None, "origin": (0, 0),
+            }
+        world_img_w, world_img_h = full_rendered_image.size
+        if world_img_w == 0 or world_img_h == 0:
+            return frame
+        crop_x1 = max(0, math.floor(region_x1))
+        crop_y1 = max(0, math.floor(region_y1))
+        crop_x2 = min(world_img_w, math.ceil(region_x2))
+        crop_y2 = min(world_img_h, math.ceil(region_y2))
+        if crop_x1 >= crop_x2 or crop_y1 >= crop_y2:
+            return frame
+        visible_part_world_img = full_rendered_image.crop((crop_x1, crop_y1, crop_x2, crop_y2))
+        display_part_w = int(visible_part_world_img.width * display_scale)
+        display_part_h = int(visible_part_world_img.height * display_scale)
+        if display_part_w <= 0 or display_part_h <= 0:
+            return frame
+        resampling_filter = quality.display_resample(display_scale)
+        frame["image"] = visible_part_world_img.resize(
+                (display_part_w, display_part_h),
+                resampling_filter
+                ) if (
+                display_part_w != visible_part_world_img.width or display_part_h != visible_part_world_img.height) else visible_part_world_img
+        frame["origin"] = (crop_x1, crop_y1)
+        return frame
+
+    def _poll_render_results(self):
+        """Забирает готовый кадр фонового рендера и выводит его (PhotoImage создается только в потоке Tk)."""
+        if not self.render_worker.running:
+            return
         try:
-            full_rendered_image = self.renderer.render(draw_grid=self.draw_grid_var.get())
-            canvas_width = self.tk_canvas.winfo_width()
-            canvas_height = self.tk_canvas.winfo_height()
-            if canvas_width < 1 or canvas_height < 1:
-                return
-            world_img_w, world_img_h = full_rendered_image.size
-            if world_img_w == 0 or world_img_h == 0:
-                self.tk_canvas.delete("all"); return
-            view_world_x1 = self.canvas_view_x
-            view_world_y1 = self.canvas_view_y
-            view_world_x2 = self.canvas_view_x + (canvas_width / self.display_scale)
-            view_world_y2 = self.canvas_view_y + (canvas_height / self.display_scale)
-            crop_x1 = max(0, math.floor(view_world_x1))
-            crop_y1 = max(0, math.floor(view_world_y1))
-            crop_x2 = min(world_img_w, math.ceil(view_world_x2))
-            crop_y2 = min(world_img_h, math.ceil(view_world_y2))
-            if crop_x1 >= crop_x2 or crop_y1 >= crop_y2:
-                self.tk_canvas.delete("all"); return
-            visible_part_world_img = full_rendered_image.crop((crop_x1, crop_y1, crop_x2, crop_y2))
-            display_part_w = int(visible_part_world_img.width * self.display_scale)
-            display_part_h = int(visible_part_world_img.height * self.display_scale)
-            if display_part_w <= 0 or display_part_h <= 0:
-                self.tk_canvas.delete("all"); return
-            resampling_filter = Image.Resampling.BILINEAR
-            if self.display_scale < 0.75:
-                resampling_filter = Image.Resampling.NEAREST
-            image_for_canvas_display = visible_part_world_img.resize(
-                    (display_part_w, display_part_h),
-                    resampling_filter
-                    ) if (
-                    display_part_w != visible_part_world_img.width or display_part_h != visible_part_world_img.height) else visible_part_world_img
-            self.tk_image_ref = ImageTk.PhotoImage(image_for_canvas_display)
-            self.tk_canvas.delete("all")
-            draw_on_canvas_x = int(-view_world_x1 * self.display_scale) if view_world_x1 < 0 else 0
-            draw_on_canvas_y = int(-view_world_y1 * self.display_scale) if view_world_y1 < 0 else 0
-            self.tk_canvas.create_image(draw_on_canvas_x, draw_on_canvas_y, anchor=tk.NW, image=self.tk_image_ref)
+            result = self.render_worker.poll()
+            if result is not None and self.tk_canvas.winfo_exists():
+                _, frame = result
+                if frame["retained"] == self.retained_mode_var.get():
+                    self._display_cache = {"key": frame["key"], "quality": frame["quality"], "region": frame["region"]}
+                    self.tk_canvas.delete("static")
+                    if frame["image"] is not None:
+                        # Позиция считается от текущего вида: при панорамировании, пока кадр рисовался,
+                        # он встает на свое место в мире, а не туда, где был вид при отправке
+                        origin_x, origin_y = frame["origin"]
+                        self.tk_image_ref = ImageTk.PhotoImage(frame["image"])
+                        self.tk_canvas.create_image(
+                                round((origin_x - self.canvas_view_x) * self.display_scale),
+                                round((origin_y - self.canvas_view_y) * self.display_scale),
+                                anchor=tk.NW, image=self.tk_image_ref, tags=("static",)
+                                )
+                        self.tk_canvas.tag_lower("static")
         except Exception as e:
             print(f"DebugUI: Ошибка display_rendered_image: {e}")
             import traceback
-            traceback.print_exc()
+            traceback.print_exception(e)
+        self.tk_root.after(self.RESULT_POLL_MS, self._poll_render_results)
+
+    # --- Удерживаемый режим: отдельные элементы холста для токенов и стрелки ---
+
+    def _world_to_canvas(self, world_x: float, world_y: float) -> tuple[float, float]:
+        return (world_x - self.canvas_view_x) * self.display_scale, (world_y - self.canvas_view_y) * self.display_scale
+
+    def _token_photo(self, token: Token, size: tuple[int, int], key: tuple) -> ImageTk.PhotoImage:
+        """Возвращает PhotoImage токена в размере size из LRU-кэша (ресайз и загрузка в Tk - один раз)."""
+        cached = self._token_photos.get(key)
+        if cached is not None:
+            self._token_photos.move_to_end(key)
+            return cached[1]
+        texture = token.image
+        # Подготовленная текстура токена нужного (или ближайшего большего) размера - без апскейла 70x70
+        photo = ImageTk.PhotoImage(token.texture_for_size(size, self.final_quality.resample))
+        # Текстура хранится вместе с PhotoImage, чтобы ее id в ключе не был переиспользован
+        self._token_photos[key] = (texture, photo)
+        while len(self._token_photos) > self.TOKEN_PHOTO_CACHE_SIZE:
+            self._token_photos.popitem(last=False)
+        return photo
+
+    def _update_token_item(self, token: Token):
+        """Создает элемент холста токена или обновляет его позицию (и картинку при смене размера или масштаба)."""
+        texture = token.image
+        width, height = token.logical_pixel_width, token.logical_pixel_height
+        photo_key = (id(texture), width, height, self.display_scale)
+        entry = self._token_items.get(token)
+        if entry is None or entry[1] != photo_key:
+            size = (max(1, round(width * self.display_scale)), max(1, round(height * self.display_scale)))
+            photo = self._token_photo(token, size, photo_key)
+            if entry is None:
+                item_id = self.tk_canvas.create_image(0, 0, anchor=tk.NW, image=photo, tags=("retained",))
+            else:
+                item_id = entry[0]
+                self.tk_canvas.itemconfigure(item_id, image=photo)
+            self._token_items[token] = (item_id, photo_key)
+        item_id = self._token_items[token][0]
+        self.tk_canvas.coords(item_id, *self._world_to_canvas(token.x, token.y))
+        self.tk_canvas.itemconfigure(item_id, state=tk.NORMAL if token.visible else tk.HIDDEN)
+
+    def _update_arrow_item(self):
+        """Показывает стрелку предпросмотра отдельным элементом поверх токенов."""
+        sprite = self.preview_arrow_sprite
+        if sprite is None:
+            if self._arrow_item is not None:
+                self.tk_canvas.delete(self._arrow_item)
+                self._arrow_item = None
+                self._arrow_photo = None
+            return
+        image = sprite.image
+        if self.display_scale != 1.0:
+            size = (max(1, round(image.width * self.display_scale)), max(1, round(image.height * self.display_scale)))
+            image = image.resize(size, self.interactive_quality.resample)
+        self._arrow_photo = ImageTk.PhotoImage(image)
+        if self._arrow_item is None:
+            self._arrow_item = self.tk_canvas.create_image(
+                    0, 0, anchor=tk.NW, image=self._arrow_photo, tags=("retained",)
+                    )
+        else:
+            self.tk_canvas.itemconfigure(self._arrow_item, image=self._arrow_photo)
+        self.tk_canvas.coords(self._arrow_item, *self._world_to_canvas(sprite.x, sprite.y))
+        self.tk_canvas.tag_raise(self._arrow_item)
+
+    def _sync_retained_items(self):
+        """Приводит элементы холста в соответствие со списком токенов: создает, удаляет, упорядочивает."""
+        for token in [t for t in self._token_items if t not in self.loaded_tokens]:
+            item_id, _ = self._token_items.pop(token)
+            self.tk_canvas.delete(item_id)
+        for token in self.loaded_tokens:
+            self._update_token_item(token)
+            self.tk_canvas.tag_raise(self._token_items[token][0])
+        self._update_arrow_item()
+
+    def _clear_retained_items(self):
+        self.tk_canvas.delete("retained")
+        self._token_items.clear()
+        self._token_photos.clear()
+        self._arrow_item = None
+        self._arrow_photo = None
+
+    def _on_display_mode_changed(self):
+        self._clear_retained_items()
+        self.tk_canvas.delete("static")
+        self._display_cache = None
+        self._requested_display = None
+        self.prepare_and_render_scene()
+
+    def on_close(self):
+        self.render_worker.stop()
+        self.tk_root.destroy()
 
     def canvas_to_world_coords(self, canvas_x: int, canvas_y: int) -> tuple[float, float]:
         return (canvas_x / self.display_scale) + self.canvas_view_x, (
@@ -413,14 +672,7 @@ class DebugUI:
     def on_mouse_left_press(self, event):
         self.last_mouse_x_canvas, self.last_mouse_y_canvas = event.x, event.y
         world_x, world_y = self.canvas_to_world_coords(event.x, event.y)
-        clicked_token_found: Token | None = None
-        for token_obj in reversed(self.loaded_tokens):
-            if not token_obj.visible:
-                continue
-            if token_obj.x <= world_x < (token_obj.x + token_obj.logical_pixel_width) and \
-                    token_obj.y <= world_y < (token_obj.y + token_obj.logical_pixel_height):
-                clicked_token_found = token_obj
-                break
+        clicked_token_found: Token | None = self.token_registry.token_at_point(world_x, world_y)
         self.update_selected_token_display(clicked_token_found)
         if self.selected_token:
             self.dragging_token = True
@@ -492,7 +744,12 @@ class DebugUI:
             self.selected_token.move(round(dx_world), round(dy_world))
             self.last_mouse_x_canvas, self.last_mouse_y_canvas = event.x, event.y
             self.update_selected_token_display(self.selected_token)
-            self.prepare_and_render_scene(include_preview_arrow=True)
+            if self.retained_mode_var.get():
+                # Фон не меняется: двигаем элемент токена и обновляем стрелку
+                self._update_token_item(self.selected_token)
+                self._update_arrow_item()
+            else:
+                self.prepare_and_render_scene(include_preview_arrow=True, interactive=True)
 
     def on_mouse_left_release(self, event):
         arrow_needs_redraw = False
@@ -532,6 +789,8 @@ class DebugUI:
 
                 elif arrow_needs_redraw:  # Если не было привязки, но стрелка была
                     self.prepare_and_render_scene(include_preview_arrow=False)  # Рисуем без стрелки
+        if self.retained_mode_var.get():
+            self._update_arrow_item()
 
     def on_mouse_middle_press(self, event):
         self.last_mouse_x_canvas, self.last_mouse_y_canvas = event.x, event.y;
@@ -547,7 +806,10 @@ class DebugUI:
             self.canvas_view_x -= dx_canvas / self.display_scale
             self.canvas_view_y -= dy_canvas / self.display_scale
             self.last_mouse_x_canvas, self.last_mouse_y_canvas = event.x, event.y
-            self.display_rendered_image()
+            # Сдвигаем уже показанный кадр (с запасом за краями вида); новый рендер
+            # понадобится, только если вид выйдет за пределы кэша отображения
+            self.tk_canvas.move("all", dx_canvas, dy_canvas)
+            self.display_rendered_image(interactive=True)
 
     def on_mouse_middle_release(self, event):
         self.panning_canvas = False
@@ -563,7 +825,7 @@ class DebugUI:
             return
         self.canvas_view_x = world_pivot_x_before - (pivot_x_canvas / self.display_scale)
         self.canvas_view_y = world_pivot_y_before - (pivot_y_canvas / self.display_scale)
-        self.display_rendered_image()
+        self.display_rendered_image(interactive=True)
 
     def on_mouse_wheel_windows_linux(self, event):
         self._zoom(1.1 if event.delta > 0 else (1 / 1.1), event.x, event.y)
@@ -660,4 +922,7 @@ class DebugUI:
             print("DebugUI: Экземпляр BattleMap отсутствует.")
 
     def run(self):
-        self.tk_root.mainloop()
+        try:
+            self.tk_root.mainloop()
+        finally:
+            self.render_worker.stop()
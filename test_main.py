@@ -12,7 +12,9 @@ from battlemap.render.arrow import create_arrow_image
 from battlemap.sprites.base_sprite import BaseSprite
 from battlemap.sprites.map_tile import MapTileSprite  # Для размеров тайла
 from battlemap.sprites.token_tile import TokenSize
+from battlemap.types.battle_map import BattleMap
 from battlemap.types.token import Token, TokenId
+from battlemap.io.scene_file import Scene, save_scene, load_scene
 
 # --- Параметры ---
 BG_IMAGE_PATH = "C:\\Users\\Pugemon\\Downloads\\Telegram Desktop\\Road Chase Scene - Spring - Day.webp"  # <--- ЗАМЕНИТЕ на путь к вашему фону
@@ -22,6 +24,7 @@ TOKEN_IMAGE_PATH = "C:\\Users\\Pugemon\\Downloads\\Telegram Desktop\\Human_Commo
 OUTPUT_DIR = "render_output"  # Папка для сохранения результатов
 ARROW_OUTPUT_FILE = "render_with_arrow.png"
 MOVED_OUTPUT_FILE = "render_after_move.png"
+SCENE_OUTPUT_FILE = "scene.bms"
 
 # Параметры токена и движения
 TOKEN_LOGICAL_SIZE = TokenSize.SIZE_3x3  # Логический размер токена
@@ -180,6 +183,20 @@ def main():
     except Exception as e:
         print(f"Ошибка сохранения изображения с перемещенным токеном: {e}")
 
+    # --- Сохранение и загрузка сцены ---
+    # Тайлы с собственными копиями одной текстуры: в файле это разные элементы палитры
+    # с одинаковым содержимым, после загрузки - один общий элемент
+    battle_map = BattleMap(3, 3)
+    battle_map.fill_with_default_tiles(token_texture_img, shared_texture=False)
+    save_path_scene = os.path.join(OUTPUT_DIR, SCENE_OUTPUT_FILE)
+    save_scene(save_path_scene, Scene(battle_map, [token]))
+    loaded_map = load_scene(save_path_scene).battle_map
+    same_tiles = all(
+            loaded_map.get_cell_texture(r, c).tobytes() == battle_map.get_cell_texture(r, c).tobytes()
+            for r in range(battle_map.map_height_tiles) for c in range(battle_map.map_width_tiles)
+            )
+    print(f"Сцена сохранена и загружена: {save_path_scene}, палитра {len(battle_map.palette)} -> "
+          f"{len(loaded_map.palette)}, тайлы {'совпадают' if same_tiles else 'НЕ совпадают'}")
 
     print("Готово.")
 